@@ -0,0 +1,78 @@
+"""Compares the memory used by AST nodes against plain dict-backed dataclasses.
+
+Run with `poetry run python benchmarks/ast_memory.py [repetitions]`.
+"""
+
+import dataclasses
+import sys
+import tracemalloc
+from typing import Any
+
+import compiler.custom_ast as ast
+from compiler.parser import parse
+from compiler.stats import count_nodes
+from compiler.tokenizer import tokenize_stream
+
+PROGRAM_PART = """
+    var x = 1;
+    while x < 1000 do {
+        if x % 3 == 0 then f(x, true) else g(-x * 2 + 1);
+        x = x + 1;
+    };
+"""
+
+# Plain dataclasses with the same fields as the AST nodes, i.e. what the nodes
+# looked like before they got `__slots__` and shared operators and literals.
+PLAIN_CLASSES: dict[type, type] = {
+    node_type: dataclasses.make_dataclass(
+        node_type.__name__, ast.field_names(node_type)
+    )
+    for node_type in [
+        ast.Literal,
+        ast.Identifier,
+        ast.Operator,
+        ast.FunctionCall,
+        ast.UnaryOp,
+        ast.BinaryOp,
+        ast.TernaryOp,
+        ast.WhileStatement,
+        ast.Block,
+        ast.Variable,
+    ]
+}
+
+
+def to_plain(node: Any) -> Any:
+    if isinstance(node, list):
+        return [to_plain(item) for item in node]
+    if isinstance(node, ast.Expression):
+        plain_type = PLAIN_CLASSES[type(node)]
+        return plain_type(
+            *[to_plain(getattr(node, name)) for name in ast.field_names(type(node))]
+        )
+    return node
+
+
+def measure(build: Any) -> tuple[Any, int]:
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def main() -> None:
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    tokens = tokenize_stream("{" + PROGRAM_PART * repetitions + "}")
+    tree, slotted_size = measure(lambda: parse(tokens, engine="pratt"))
+    plain_tree, plain_size = measure(lambda: to_plain(tree))
+    nodes = count_nodes(tree)
+    print(f"nodes:             {nodes}")
+    print(f"slotted AST:       {slotted_size / nodes:6.1f} bytes/node")
+    print(f"dict-backed AST:   {plain_size / nodes:6.1f} bytes/node")
+    print(f"saving:            {1 - slotted_size / plain_size:6.1%}")
+    del plain_tree
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Compares compiled programs with and without register allocation.
+
+Run with `poetry run python benchmarks/codegen.py [iterations]`. Needs GNU
+`as` and `ld`.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from compiler.assembly import assemble_and_link, render
+from compiler.codegen import generate_assembly
+from compiler.ir import lower
+from compiler.parser import parse
+from compiler.tokenizer import tokenize_stream
+
+PROGRAM = """
+{
+    var i = 0;
+    var total = 0;
+    while i < ITERATIONS do {
+        var j = 0;
+        while j < 10 do {
+            if (i + j) % 3 == 0 then {
+                total = total + i * j;
+            } else {
+                total = total - 1;
+            };
+            j = j + 1;
+        };
+        var k = i * 3 + 1;
+        if k > 1000 and i != 7 then total = total + k - i;
+        i = i + 1;
+    };
+    total
+}
+"""
+
+
+def run_compiled(executable: bytes) -> tuple[str, float]:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "program")
+        with open(path, "wb") as f:
+            f.write(executable)
+        os.chmod(path, 0o755)
+        start = time.perf_counter()
+        output = subprocess.run([path], capture_output=True, text=True, check=True).stdout
+        return output.strip(), time.perf_counter() - start
+
+
+def main() -> None:
+    iterations = sys.argv[1] if len(sys.argv) > 1 else "5000000"
+    program = lower(parse(tokenize_stream(PROGRAM.replace("ITERATIONS", iterations))))
+    stack_output, stack_seconds = run_compiled(
+        assemble_and_link(render(generate_assembly(program, use_registers=False)))
+    )
+    output, seconds = run_compiled(assemble_and_link(render(generate_assembly(program))))
+    assert output == stack_output
+    print(f"result:     {output}")
+    print(f"stack only: {stack_seconds:8.3f} s")
+    print(f"registers:  {seconds:8.3f} s")
+    print(f"speedup:    {stack_seconds / seconds:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Seeded generator of synthetic but realistic programs for benchmarks.
+
+Run with `poetry run python benchmarks/generate.py SIZE [SEED] > program.src`,
+where SIZE is a byte count with an optional KB/MB/GB suffix.
+"""
+
+import random
+import re
+import sys
+
+NAMES = ["x", "y", "i", "n", "total", "count", "result", "tmp", "acc", "limit"]
+FUNCTIONS = ["print_int", "f", "g", "compute", "read_int", "max", "min"]
+OPERATORS = ["+", "-", "*", "%", "+", "-", "*", "+", "<", "<=", ">", ">=", "==", "!="]
+COMMENTS = [
+    "# update the running total",
+    "// TODO: handle overflow",
+    "# loop until the limit is reached",
+    "// helper call",
+]
+
+
+class ProgramGenerator:
+    def __init__(self, seed: int = 0) -> None:
+        self.random = random.Random(seed)
+
+    def name(self) -> str:
+        return self.random.choice(NAMES)
+
+    def atom(self, depth: int) -> str:
+        r = self.random.random()
+        if r < 0.4:
+            return self.name()
+        if r < 0.7:
+            return str(self.random.randrange(1000))
+        if r < 0.8 and depth < 3:
+            return "(" + self.expression(depth + 1) + ")"
+        if r < 0.9 and depth < 3:
+            args = ", ".join(self.expression(depth + 1) for _ in range(self.random.randint(0, 3)))
+            return f"{self.random.choice(FUNCTIONS)}({args})"
+        if r < 0.95:
+            return self.random.choice(["true", "false"])
+        return self.random.choice(["-", "not "]) + self.name()
+
+    def expression(self, depth: int = 0) -> str:
+        # Mostly short expressions with the occasional long operator chain.
+        if depth == 0:
+            length = self.random.choice([1, 1, 2, 2, 3, 4, 8, 16])
+        else:
+            length = self.random.randint(1, 3)
+        parts = [self.atom(depth)]
+        for _ in range(length - 1):
+            parts.append(self.random.choice(OPERATORS))
+            parts.append(self.atom(depth))
+        return " ".join(parts)
+
+    def statements(self, indent: int, depth: int, count: int) -> list[str]:
+        return [self.statement(indent, depth) for _ in range(count)]
+
+    def block(self, indent: int, depth: int) -> str:
+        padding = "    " * indent
+        body = self.statements(indent + 1, depth + 1, self.random.randint(1, 5))
+        return "{\n" + "".join(f"{line};\n" for line in body) + padding + "}"
+
+    def statement(self, indent: int, depth: int) -> str:
+        padding = "    " * indent
+        r = self.random.random()
+        comment = ""
+        if self.random.random() < 0.1:
+            comment = padding + self.random.choice(COMMENTS) + "\n"
+        if r < 0.2:
+            line = f"var {self.name()} = {self.expression()}"
+        elif r < 0.45:
+            line = f"{self.name()} = {self.expression()}"
+        elif r < 0.6:
+            args = ", ".join(self.expression(1) for _ in range(self.random.randint(1, 2)))
+            line = f"{self.random.choice(FUNCTIONS)}({args})"
+        elif r < 0.75 and depth < 3:
+            line = f"while {self.name()} < {self.expression(1)} do {self.block(indent, depth)}"
+        elif r < 0.95 and depth < 3:
+            line = f"if {self.expression(1)} then {self.block(indent, depth)}"
+            if self.random.random() < 0.5:
+                line += f" else {self.block(indent, depth)}"
+        else:
+            line = self.expression()
+        return comment + padding + line
+
+    def program(self, size: int) -> str:
+        """A block of top-level statements of at least `size` bytes."""
+        parts = ["{\n"]
+        length = 2
+        while length < size:
+            statement = self.statement(1, 0) + ";\n"
+            parts.append(statement)
+            length += len(statement)
+        parts.append("    result\n}\n")
+        return "".join(parts)
+
+
+def generate_program(size: int, seed: int = 0) -> str:
+    return ProgramGenerator(seed).program(size)
+
+
+def parse_size(text: str) -> int:
+    m = re.fullmatch(r"(\d+)\s*([KMG]?)B?", text.upper())
+    if m is None:
+        raise ValueError(f"Invalid size: {text}")
+    return int(m[1]) * 1024 ** " KMG".index(m[2] or " ")
+
+
+def main() -> None:
+    size = parse_size(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    sys.stdout.write(generate_program(size, seed))
+
+
+if __name__ == "__main__":
+    main()
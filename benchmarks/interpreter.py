@@ -0,0 +1,118 @@
+"""Compares the closure-compiling interpreter and the IR virtual machine with a
+naive tree walker.
+
+Run with `poetry run python benchmarks/interpreter.py [iterations]`.
+"""
+
+import sys
+import time
+from typing import Any
+
+import compiler.custom_ast as ast
+from compiler.interpreter import BINARY_OPERATORS, compile_closures
+from compiler.ir import lower
+from compiler.parser import parse
+from compiler.tokenizer import tokenize_stream
+from compiler.vm import run_ir
+
+PROGRAM = """
+{
+    var i = 0;
+    var total = 0;
+    while i < ITERATIONS do {
+        var j = 0;
+        while j < 10 do {
+            if (i + j) % 3 == 0 then {
+                total = total + i * j;
+            } else {
+                total = total - 1;
+            };
+            j = j + 1;
+        };
+        i = i + 1;
+    };
+    total
+}
+"""
+
+
+class Scope:
+    def __init__(self, parent: "Scope | None") -> None:
+        self.values: dict[str, Any] = {}
+        self.parent = parent
+
+    def find(self, name: str) -> "Scope":
+        scope: Scope | None = self
+        while scope is not None:
+            if name in scope.values:
+                return scope
+            scope = scope.parent
+        raise Exception(f"Undefined variable {name}")
+
+
+def walk(node: ast.Expression, scope: Scope) -> Any:
+    """The interpreter textbooks start with: dispatch on the node type and
+    look variables up by name on every visit."""
+    if isinstance(node, ast.Literal):
+        return node.value
+    if isinstance(node, ast.Identifier):
+        return scope.find(node.name).values[node.name]
+    if isinstance(node, ast.BinaryOp):
+        assert isinstance(node.op, ast.Operator)
+        symbol = node.op.symbol
+        if symbol == "=":
+            assert isinstance(node.left, ast.Identifier)
+            value = walk(node.right, scope)
+            scope.find(node.left.name).values[node.left.name] = value
+            return value
+        if symbol == "and":
+            return walk(node.left, scope) and walk(node.right, scope)
+        if symbol == "or":
+            return walk(node.left, scope) or walk(node.right, scope)
+        return BINARY_OPERATORS[symbol](walk(node.left, scope), walk(node.right, scope))
+    if isinstance(node, ast.UnaryOp):
+        value = walk(node.right, scope)
+        return not value if node.op.symbol == "not" else -value
+    if isinstance(node, ast.TernaryOp):
+        if walk(node.cond, scope):
+            return walk(node.then_, scope)
+        return walk(node.else_, scope) if node.else_ is not None else None
+    if isinstance(node, ast.WhileStatement):
+        while walk(node.cond, scope):
+            walk(node.body, scope)
+        return None
+    if isinstance(node, ast.Block):
+        inner = Scope(scope)
+        for statement in node.statements:
+            walk(statement, inner)
+        return walk(node.result_expression, inner)
+    if isinstance(node, ast.Variable):
+        scope.values[node.identifier.name] = walk(node.initializer, scope)
+        return None
+    raise Exception(f"Cannot interpret {type(node).__name__}")
+
+
+def timed(run: Any) -> tuple[Any, float]:
+    start = time.perf_counter()
+    result = run()
+    return result, time.perf_counter() - start
+
+
+def main() -> None:
+    iterations = sys.argv[1] if len(sys.argv) > 1 else "20000"
+    tree = parse(tokenize_stream(PROGRAM.replace("ITERATIONS", iterations)))
+    naive_result, naive_seconds = timed(lambda: walk(tree, Scope(None)))
+    program, build_seconds = timed(lambda: compile_closures(tree))
+    closure_result, closure_seconds = timed(program)
+    vm_result, vm_seconds = timed(lambda: run_ir(lower(tree)))
+    assert naive_result == closure_result == vm_result
+    print(f"result:            {closure_result}")
+    print(f"naive tree walker: {naive_seconds:8.3f} s")
+    print(f"closures:          {closure_seconds:8.3f} s (+ {build_seconds * 1000:.2f} ms to build)")
+    print(f"ir vm:             {vm_seconds:8.3f} s (lowering and translation included)")
+    print(f"speedup:           {naive_seconds / closure_seconds:8.1f}x closures, "
+          f"{naive_seconds / vm_seconds:.1f}x ir vm")
+
+
+if __name__ == "__main__":
+    main()
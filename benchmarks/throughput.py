@@ -0,0 +1,159 @@
+"""Measures tokenizer and parser throughput on generated programs.
+
+Run with `poetry run python benchmarks/throughput.py [options]`. For each size
+the same seeded program is tokenized with `tokenizer()`, parsed from a token
+stream with `parse()`, and run through the streaming front end the `compile`
+command uses (bytes to `tokenize_stream()` to `parse()`). Reported per phase:
+best time, tokens/s, nodes/s and peak traced memory.
+
+Results are compared against `baseline.json` next to this file and the run
+fails if a throughput drops, or peak memory grows, by more than the tolerance.
+Refresh the baseline with `--update-baseline` on a quiet machine.
+"""
+
+import argparse
+import gc
+import io
+import json
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from generate import generate_program, parse_size
+from compiler.parser import parse
+from compiler.stats import count_nodes
+from compiler.tokenizer import tokenize_stream, tokenizer
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+DEFAULT_SIZES = ["1KB", "64KB", "1MB"]
+
+
+def phases(source: str, engine: str) -> dict[str, Callable[[], Any]]:
+    stream = tokenize_stream(source)
+    data = source.encode()
+    return {
+        "tokenizer": lambda: tokenizer(source),
+        "parse": lambda: parse(stream, engine=engine),
+        "pipeline": lambda: parse(tokenize_stream(io.BytesIO(data)), engine=engine),
+    }
+
+
+def best_time(run: Callable[[], Any], budget: float) -> float:
+    """Best of at least three runs, repeated until `budget` seconds are used."""
+    best = float("inf")
+    runs = 0
+    deadline = time.perf_counter() + budget
+    while runs < 3 or time.perf_counter() < deadline:
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+        runs += 1
+    return best
+
+
+def peak_memory(run: Callable[[], Any]) -> int:
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(
+    size: int, seed: int, engine: str, budget: float, memory: bool
+) -> dict[str, dict[str, float]]:
+    source = generate_program(size, seed)
+    token_count = len(tokenize_stream(source))
+    node_count = count_nodes(parse(tokenize_stream(source), engine=engine))
+    results: dict[str, dict[str, float]] = {}
+    for phase, run in phases(source, engine).items():
+        seconds = best_time(run, budget)
+        result = {
+            "seconds": seconds,
+            "tokens_per_second": token_count / seconds,
+        }
+        if phase != "tokenizer":
+            result["nodes_per_second"] = node_count / seconds
+        if memory:
+            result["peak_bytes"] = peak_memory(run)
+        results[phase] = result
+    return results
+
+
+def compare(
+    results: dict[str, Any], baseline: dict[str, Any], tolerance: float
+) -> list[str]:
+    regressions = []
+    for size, phase_results in results.items():
+        for phase, metrics in phase_results.items():
+            expected = baseline.get(size, {}).get(phase, {})
+            for metric, value in metrics.items():
+                if metric not in expected or metric == "seconds":
+                    continue
+                old = expected[metric]
+                if metric.endswith("_per_second") and value < old * (1 - tolerance):
+                    regressions.append(f"{size} {phase} {metric}: {value:,.0f} < {old:,.0f}")
+                if metric == "peak_bytes" and value > old * (1 + tolerance):
+                    regressions.append(f"{size} {phase} {metric}: {value:,.0f} > {old:,.0f}")
+    return regressions
+
+
+def main() -> int:
+    arguments = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arguments.add_argument("--sizes", default=",".join(DEFAULT_SIZES),
+                           help="comma separated sizes, e.g. 1KB,1MB,100MB")
+    arguments.add_argument("--seed", type=int, default=0)
+    arguments.add_argument("--engine", default="recursive")
+    arguments.add_argument("--budget", type=float, default=1.0,
+                           help="seconds to spend repeating each phase (default 1)")
+    arguments.add_argument("--no-memory", action="store_true",
+                           help="skip the peak memory runs")
+    arguments.add_argument("--tolerance", type=float, default=0.3,
+                           help="allowed relative regression (default 0.3)")
+    arguments.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    arguments.add_argument("--update-baseline", action="store_true")
+    arguments.add_argument("--output", type=Path, help="also write results as JSON")
+    args = arguments.parse_args()
+
+    results: dict[str, Any] = {}
+    for size in args.sizes.split(","):
+        results[size] = measure(
+            parse_size(size), args.seed, args.engine, args.budget, not args.no_memory
+        )
+        for phase, metrics in results[size].items():
+            line = (
+                f"{size:>6} {phase:<10} {metrics['seconds']:9.4f} s"
+                f" {metrics['tokens_per_second']:12,.0f} tokens/s"
+            )
+            if "nodes_per_second" in metrics:
+                line += f" {metrics['nodes_per_second']:12,.0f} nodes/s"
+            if "peak_bytes" in metrics:
+                line += f" {metrics['peak_bytes'] / 1024 / 1024:9.1f} MiB peak"
+            print(line)
+
+    report = {"python": sys.version.split()[0], "engine": args.engine, "results": results}
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}, nothing to compare against")
+        return 0
+    baseline = json.loads(args.baseline.read_text())
+    if baseline.get("engine") != args.engine:
+        print(f"Baseline was measured with the {baseline.get('engine')} engine")
+    regressions = compare(results, baseline["results"], args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
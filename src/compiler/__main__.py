@@ -1,30 +1,207 @@
-from base64 import b64encode
+import asyncio
+from collections.abc import AsyncIterator, Iterable, Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+import io
 import json
+import mmap
+import os
 import re
+import socket
 import sys
+import time
 from socketserver import ForkingTCPServer, StreamRequestHandler
-from traceback import format_exception
-from typing import Any
+from typing import Any, BinaryIO
+
+from compiler.async_server import AsyncCompileServer, serve_async
+from compiler.batch import check_sources, compile_batch
+from compiler.commands import handle_command
+from compiler.build import build, format_summary
+from compiler.codegen import generate_program
+from compiler.compile_cache import CompileCache
+from compiler.custom_ast import NONE_LITERAL, Expression
+from compiler.elf import build_executable, prebuilt_runtime
+from compiler.interpreter import compile_closures, print_bool, print_int
+from compiler.ir import IrProgram, lower
+from compiler.optimizer import simplify
+from compiler.parallel_parser import parallel_parse
+from compiler.stats import CompileStats, count_nodes, phase
+from compiler.tokenizer import LineCache, Source, Token, tokenize_stream
+from compiler.vm import run_ir
+from compiler.worker_pool import run_worker_pool
+
+
+# Tokens of the lines seen by earlier compiles in this process, see
+# `use_line_cache`.
+line_cache: LineCache | None = None
+
+
+def use_line_cache(cache: LineCache | None) -> None:
+    """Makes `call_compiler` tokenize through `cache`, so a long-running
+    server does not tokenize lines it has seen before again."""
+    global line_cache
+    line_cache = cache
+
+
+# Processes that parse large programs, see `use_parse_jobs`.
+parse_jobs: int | None = 1
+
+
+def use_parse_jobs(jobs: int | None) -> None:
+    """Makes large programs parse in a pool of `jobs` processes, or one per
+    CPU if None. See `parallel_parse`."""
+    global parse_jobs
+    parse_jobs = jobs
 
 
 def call_compiler(source_code: str) -> bytes:
-    # *** TODO ***
-    # Call your compiler here and return the compiled executable.
-    # Raise an exception on compilation error.
-    # *** TODO ***
-    raise NotImplementedError("Compiler not implemented")
+    return compile_source(source_code, line_cache=line_cache)
+
+
+def compile_source(
+    source: Source,
+    use_registers: bool = True,
+    use_toolchain: bool = False,
+    line_cache: LineCache | None = None,
+) -> bytes:
+    with phase("tokenize") as tokenize_phase:
+        tokens = tokenize_stream(source, line_cache=line_cache)
+    if tokenize_phase.enabled:
+        tokenize_phase.counts["tokens"] = len(tokens)
+    return compile_tokens(tokens, use_registers, use_toolchain)
+
+
+def parse_source(source: Source) -> Expression | None:
+    with phase("tokenize"):
+        tokens = tokenize_stream(source)
+    with phase("parse"):
+        tree = parallel_parse(tokens, jobs=parse_jobs)
+    return None if tree is None else optimize(tree)
+
+
+def run_source(source: Source, use_vm: bool = False) -> None:
+    """Runs a program with the interpreter, or with the IR virtual machine if
+    `use_vm` is set. Like a compiled program, prints the value of the program
+    if it is an integer or a boolean."""
+    tree = parse_source(source)
+    if tree is None:
+        return
+    if use_vm:
+        ir = lower_tree(tree)
+        with phase("run"):
+            result = run_ir(ir)
+    else:
+        with phase("closures"):
+            program = compile_closures(tree)
+        with phase("run"):
+            result = program()
+    if isinstance(result, bool):
+        print_bool(result)
+    elif isinstance(result, int):
+        print_int(result)
+
+
+def optimize(tree: Expression) -> Expression:
+    with phase("simplify") as simplify_phase:
+        tree, removed_nodes = simplify(tree)
+    if simplify_phase.enabled:
+        simplify_phase.counts["removed_nodes"] = removed_nodes
+    return tree
+
+
+def compile_tokens(
+    tokens: Iterable[Token], use_registers: bool = True, use_toolchain: bool = False
+) -> bytes:
+    """Compiles a program to an executable. With `use_registers` false, every
+    value is kept on the stack instead of in registers. With `use_toolchain`,
+    the executable is built with GNU `as` and `ld` instead of in-process."""
+    with phase("parse") as parse_phase:
+        tree = parallel_parse(
+            tokens if isinstance(tokens, Sequence) else list(tokens), jobs=parse_jobs
+        )
+    if parse_phase.enabled and tree is not None:
+        parse_phase.counts["nodes"] = count_nodes(tree)
+    tree = NONE_LITERAL if tree is None else optimize(tree)
+    ir = lower_tree(tree)
+    with phase("codegen") as codegen_phase:
+        instructions = generate_program(ir, use_registers)
+    if codegen_phase.enabled:
+        codegen_phase.counts["instructions"] = len(instructions)
+    with phase("assemble"):
+        return build_executable(instructions, use_toolchain)
+
+
+def lower_tree(tree: Expression) -> IrProgram:
+    with phase("lower") as lower_phase:
+        ir = lower(tree)
+    if lower_phase.enabled:
+        lower_phase.counts["instructions"] = len(ir)
+    return ir
 
 
 def main() -> int:
     # === Option parsing ===
     command: str | None = None
-    input_file: str | None = None
+    input_files: list[str] = []
     output_file: str | None = None
+    output_dir: str | None = None
     host = "127.0.0.1"
     port = 3000
+    cache_dir: str | None = None
+    cache_size = 64 * 1024 * 1024
+    line_cache_size = 1 << 16
+    line_cache_bytes = 16 << 20
+    use_worker_pool = False
+    workers: int | None = None
+    max_requests = 1000
+    use_async = False
+    max_concurrency = 64
+    max_connection_concurrency = 8
+    jobs: int | None = None
+    print_stats = False
+    use_vm = False
+    use_registers = True
+    use_toolchain = False
     for arg in sys.argv[1:]:
         if (m := re.fullmatch(r'--output=(.+)', arg)) is not None:
             output_file = m[1]
+        elif (m := re.fullmatch(r'--output-dir=(.+)', arg)) is not None:
+            output_dir = m[1]
+        elif (m := re.fullmatch(r'--cache-dir=(.+)', arg)) is not None:
+            cache_dir = m[1]
+        elif (m := re.fullmatch(r'--cache-size=(\d+)', arg)) is not None:
+            cache_size = int(m[1])
+        elif (m := re.fullmatch(r'--line-cache-size=(\d+)', arg)) is not None:
+            line_cache_size = int(m[1])
+        elif (m := re.fullmatch(r'--line-cache-bytes=(\d+)', arg)) is not None:
+            line_cache_bytes = int(m[1])
+        elif arg == '--pool':
+            use_worker_pool = True
+        elif (m := re.fullmatch(r'--workers=(\d+)', arg)) is not None:
+            use_worker_pool = True
+            workers = int(m[1])
+        elif (m := re.fullmatch(r'--max-requests=(\d+)', arg)) is not None:
+            # Zero means workers are never recycled.
+            max_requests = int(m[1])
+        elif (m := re.fullmatch(r'--jobs=(\d+)', arg)) is not None:
+            jobs = int(m[1])
+        elif (m := re.fullmatch(r'--parse-jobs=(\d+)', arg)) is not None:
+            # Zero means one process per CPU.
+            use_parse_jobs(int(m[1]) or None)
+        elif arg == '--stats':
+            print_stats = True
+        elif arg == '--stack-only':
+            use_registers = False
+        elif arg == '--toolchain':
+            use_toolchain = True
+        elif arg == '--vm':
+            use_vm = True
+        elif arg == '--async':
+            use_async = True
+        elif (m := re.fullmatch(r'--max-concurrency=(\d+)', arg)) is not None:
+            max_concurrency = int(m[1])
+        elif (m := re.fullmatch(r'--max-connection-concurrency=(\d+)', arg)) is not None:
+            max_connection_concurrency = int(m[1])
         elif (m := re.fullmatch(r'--host=(.+)', arg)) is not None:
             host = m[1]
         elif (m := re.fullmatch(r'--port=(.+)', arg)) is not None:
@@ -33,12 +210,14 @@ def main() -> int:
             raise Exception(f"Unknown argument: {arg}")
         elif command is None:
             command = arg
-        elif input_file is None:
-            input_file = arg
         else:
-            raise Exception("Multiple input files not supported")
+            input_files.append(arg)
 
-    valid_commands = ['compile', 'serve']
+    input_file = input_files[0] if input_files else None
+    if len(input_files) > 1 and (command != 'compile' or output_dir is None):
+        raise Exception("Multiple inputs require compile --output-dir=...")
+
+    valid_commands = ['compile', 'compile_batch', 'interpret', 'run', 'ir', 'serve']
     if command is None:
         print(f"Error: command argument missing. Valid commands: {', '.join(valid_commands)}", file=sys.stderr)
         return 1
@@ -47,53 +226,173 @@ def main() -> int:
         print(f"Error: unknown command: {command}", file=sys.stderr)
         return 1
 
-    def read_source_code() -> str:
-        if input_file is not None:
-            with open(input_file) as f:
-                return f.read()
-        else:
-            return sys.stdin.read()
+    @contextmanager
+    def open_source() -> Iterator[BinaryIO | mmap.mmap]:
+        # Large inputs are mapped or streamed through the tokenizer instead of
+        # being read into memory as a whole.
+        if input_file is None:
+            yield sys.stdin.buffer
+            return
+        with open(input_file, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield io.BytesIO()
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as source:
+                yield source
+
+    cache = CompileCache(cache_size, cache_dir)
 
     # === Command implementations ===
 
-    if command == 'compile':
-        source_code = read_source_code()
+    if command == 'compile' and output_dir is not None:
+        # Inputs may be files, glob patterns or directories.
+        start = time.perf_counter()
+        results = build(input_files, output_dir, call_compiler, jobs)
+        print(format_summary(results, time.perf_counter() - start))
+        return 1 if any(result.status == "failed" for result in results) else 0
+    elif command == 'compile':
         if output_file is None:
             raise Exception("Output file flag --output=... required")
-        executable = call_compiler(source_code)
+        with (
+            open_source() as source,
+            CompileStats(trace_memory=True) if print_stats else nullcontext() as stats,
+        ):
+            try:
+                if cache_dir is None or not use_registers or use_toolchain:
+                    executable = compile_source(source, use_registers, use_toolchain)
+                else:
+                    executable = compile_cached(source, cache)
+            finally:
+                if stats is not None:
+                    print(stats.format(), file=sys.stderr)
         with open(output_file, 'wb') as f:
             f.write(executable)
+    elif command in ('interpret', 'run'):
+        with (
+            open_source() as source,
+            CompileStats(trace_memory=True) if print_stats else nullcontext() as stats,
+        ):
+            try:
+                run_source(source, use_vm)
+            finally:
+                if stats is not None:
+                    print(stats.format(), file=sys.stderr)
+    elif command == 'ir':
+        with open_source() as source:
+            tree = parse_source(source)
+        if tree is not None:
+            print(lower(tree).dump(), end='')
+    elif command == 'compile_batch':
+        # Input is a JSON list of source codes. Results are written as JSON
+        # lines in the order they finish, like the server's compile_batch.
+        with open_source() as source:
+            sources = check_sources(json.loads(source.read()))
+        with open(output_file, 'w') if output_file is not None else nullcontext(sys.stdout) as out:
+            for item in compile_batch(sources, call_compiler, cache, jobs):
+                print(json.dumps(item), file=out, flush=True)
     elif command == 'serve':
+        # Encoded before worker processes are forked, so they all share it.
+        prebuilt_runtime()
+        # Created before forking too, so the hit counters are shared. Each
+        # worker fills its own entries, so the cache is only used by the
+        # long-running workers of --pool and --async. The default server
+        # forks a process per connection, which would fill a copy and exit.
+        if line_cache_size > 0 and (use_worker_pool or use_async):
+            use_line_cache(LineCache(line_cache_size, line_cache_bytes))
+        if use_async:
+            # --workers sets the number of compiler processes.
+            with ProcessPoolExecutor(workers) as executor:
+                server = AsyncCompileServer(
+                    cache,
+                    call_compiler,
+                    executor,
+                    max_concurrency,
+                    max_connection_concurrency,
+                    line_cache,
+                )
+                print(f"Starting asyncio server at {host}:{port}")
+                try:
+                    asyncio.run(serve_async(server, host, port))
+                except KeyboardInterrupt:
+                    pass
+            return 0
+        if use_worker_pool:
+            with socket.create_server((host, port), backlog=128) as listener:
+                print(f"Starting worker pool server at {host}:{port}")
+                run_worker_pool(
+                    listener,
+                    lambda request: handle_request(request, cache),
+                    workers,
+                    max_requests,
+                )
+            return 0
         try:
-            run_server(host, port)
+            run_server(host, port, cache)
         except KeyboardInterrupt:
             pass
     return 0
 
 
-def run_server(host: str, port: int) -> None:
+def compile_cached(source: BinaryIO | mmap.mmap, cache: CompileCache) -> bytes:
+    data = source if isinstance(source, mmap.mmap) else source.read()
+    key = cache.key(data)
+    executable = cache.get(key)
+    if executable is None:
+        executable = compile_source(data if isinstance(data, mmap.mmap) else io.BytesIO(data))
+        cache.put(key, executable)
+    return executable
+
+
+class BlockingCompileService:
+    """`CompileService` of the forking and worker pool servers, which compile
+    in the process handling the request."""
+
+    def __init__(self, cache: CompileCache) -> None:
+        self.cache = cache
+        self.line_cache = line_cache
+
+    async def compile_cached(self, source_code: str) -> tuple[bytes, dict[str, Any]]:
+        stats = CompileStats()
+        with stats:
+            executable = self.cache.get_or_compile(source_code, call_compiler)
+        return executable, stats.to_dict()
+
+    async def compile_batch(self, codes: Sequence[str]) -> AsyncIterator[dict[str, Any]]:
+        for item in compile_batch(codes, call_compiler, self.cache):
+            yield item
+
+
+def handle_request(request: bytes, cache: CompileCache) -> Iterator[bytes]:
+    """Answers a request with `handle_command`. The messages for the sources
+    of a `compile_batch` are sent as JSON lines as soon as they are compiled,
+    and the final message without a newline."""
+    messages = handle_command(request, BlockingCompileService(cache))
+    # The service blocks instead of awaiting, so the loop only steps through
+    # the messages.
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                message = loop.run_until_complete(anext(messages))
+            except StopAsyncIteration:
+                return
+            if "index" in message:
+                yield (json.dumps(message) + "\n").encode()
+            else:
+                yield json.dumps(message).encode()
+    finally:
+        loop.close()
+
+
+def run_server(host: str, port: int, cache: CompileCache) -> None:
     class Server(ForkingTCPServer):
         allow_reuse_address = True
         request_queue_size = 32
 
     class Handler(StreamRequestHandler):
         def handle(self) -> None:
-            result: dict[str, Any] = {}
-            try:
-                input_str = self.rfile.read().decode()
-                input = json.loads(input_str)
-                if input["command"] == "compile":
-                    source_code = input["code"]
-                    executable = call_compiler(source_code)
-                    result["program"] = b64encode(executable).decode()
-                elif input["command"] == "ping":
-                    pass
-                else:
-                    result["error"] = "Unknown command: " + input['command']
-            except Exception as e:
-                result["error"] = "".join(format_exception(e))
-            result_str = json.dumps(result)
-            self.request.sendall(str.encode(result_str))
+            for chunk in handle_request(self.rfile.read(), cache):
+                self.request.sendall(chunk)
 
     print(f"Starting TCP server at {host}:{port}")
     with Server((host, port), Handler) as server:
@@ -0,0 +1,76 @@
+import os
+import subprocess
+import tempfile
+from collections.abc import Iterable
+from typing import NamedTuple
+
+
+class Mem(NamedTuple):
+    """A memory operand `offset(base)`."""
+
+    base: str
+    offset: int = 0
+
+
+# Operands are register names such as "%rax", immediates as ints, memory
+# operands, or label names, which are the strings without a "%".
+Operand = str | int | Mem
+# An instruction is a mnemonic in AT&T form followed by its operands in AT&T
+# order, source first. Labels are defined with the pseudo-instruction
+# `(LABEL, name)`.
+Instruction = tuple[str, *tuple[Operand, ...]]
+
+LABEL = "label"
+
+# Argument registers of the System V calling convention, in order.
+ARGUMENT_REGISTERS = ("%rdi", "%rsi", "%rdx", "%rcx", "%r8", "%r9")
+ENTRY_POINT = "_start"
+
+
+def fits_imm32(value: int) -> bool:
+    return -(2**31) <= value < 2**31
+
+
+def format_operand(operand: Operand) -> str:
+    if isinstance(operand, Mem):
+        return f"{operand.offset}({operand.base})" if operand.offset else f"({operand.base})"
+    if isinstance(operand, int):
+        return f"${operand}"
+    return operand
+
+
+def render(instructions: Iterable[Instruction]) -> str:
+    """GNU assembler source for `instructions`."""
+    lines = ["    .global " + ENTRY_POINT, "    .text"]
+    for mnemonic, *operands in instructions:
+        if mnemonic == LABEL:
+            lines.append(f"{operands[0]}:")
+        elif operands:
+            lines.append(f"    {mnemonic} {', '.join(format_operand(o) for o in operands)}")
+        else:
+            lines.append(f"    {mnemonic}")
+    return "\n".join(lines) + "\n"
+
+
+def assemble_and_link(assembly: str) -> bytes:
+    """Builds a static executable from assembler source with the GNU `as` and
+    `ld` found on the PATH and returns it."""
+    with tempfile.TemporaryDirectory(prefix="compiler-") as directory:
+        source = os.path.join(directory, "program.s")
+        obj = os.path.join(directory, "program.o")
+        executable = os.path.join(directory, "program")
+        with open(source, "w") as f:
+            f.write(assembly)
+        run_tool(["as", "--64", "-o", obj, source])
+        run_tool(["ld", "-static", "-o", executable, obj])
+        with open(executable, "rb") as f:
+            return f.read()
+
+
+def run_tool(command: list[str]) -> None:
+    try:
+        result = subprocess.run(command, capture_output=True, text=True)
+    except FileNotFoundError:
+        raise Exception(f"{command[0]} not found, GNU binutils are needed to compile")
+    if result.returncode != 0:
+        raise Exception(f"{command[0]} failed: {result.stderr.strip()}")
@@ -0,0 +1,187 @@
+import asyncio
+import json
+import struct
+from collections.abc import AsyncIterator, Callable, Sequence
+from concurrent.futures import Executor
+from traceback import format_exception
+from typing import Any
+
+from compiler.batch import batch_item
+from compiler.commands import handle_command
+from compiler.compile_cache import CompileCache
+from compiler.stats import run_with_stats
+from compiler.tokenizer import LineCache
+
+# Every message is a JSON object preceded by its length in bytes as a
+# 4-byte big-endian unsigned integer.
+FRAME_HEADER = struct.Struct(">I")
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+
+class FrameError(Exception):
+    pass
+
+
+async def read_frame(reader: asyncio.StreamReader) -> bytes | None:
+    """Reads one frame, or returns None if the connection was closed between
+    frames."""
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise FrameError("Connection closed in the middle of a frame header")
+        return None
+    (length,) = FRAME_HEADER.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise FrameError(f"Frame of {length} bytes exceeds the limit of {MAX_FRAME_SIZE}")
+    try:
+        return await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        raise FrameError("Connection closed in the middle of a frame")
+
+
+def encode_frame(message: dict[str, Any]) -> bytes:
+    body = json.dumps(message).encode()
+    return FRAME_HEADER.pack(len(body)) + body
+
+
+class Response:
+    """Messages answering one request, ended by None."""
+
+    def __init__(self) -> None:
+        self.messages: asyncio.Queue[dict[str, Any] | None] = asyncio.Queue()
+        # Kept so the task is not garbage collected while it runs.
+        self.task: asyncio.Task[None] | None = None
+
+
+class AsyncCompileServer:
+    """Compile server speaking length-prefixed JSON on persistent connections.
+
+    A client may send any number of requests on one connection without
+    waiting for the responses. Requests are handled concurrently and the
+    responses are sent in request order; a request's `"id"`, if present, is
+    copied into its response. `compile_batch` is answered with one message
+    per source in completion order, followed by a message without an
+    `"index"`.
+
+    Compilation runs in `executor`, and the disk tier of the cache in the
+    loop's default executor, so the event loop keeps serving other
+    connections. At most `max_concurrency` compilations are submitted at once
+    over all connections, and a connection stops being read while it has
+    `max_connection_concurrency` requests in progress. `line_cache` is only
+    used to report its statistics with the compile cache's."""
+
+    def __init__(
+        self,
+        cache: CompileCache,
+        compile: Callable[[str], bytes],
+        executor: Executor,
+        max_concurrency: int = 64,
+        max_connection_concurrency: int = 8,
+        line_cache: LineCache | None = None,
+    ) -> None:
+        self.cache = cache
+        self.line_cache = line_cache
+        self.compile = compile
+        self.executor = executor
+        self.max_connection_concurrency = max_connection_concurrency
+        self.compile_slots = asyncio.Semaphore(max_concurrency)
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        request_slots = asyncio.Semaphore(self.max_connection_concurrency)
+        responses: asyncio.Queue[Response | None] = asyncio.Queue()
+        sender = asyncio.create_task(self.send_responses(writer, responses, request_slots))
+        try:
+            while True:
+                await request_slots.acquire()
+                response = Response()
+                try:
+                    request = await read_frame(reader)
+                except FrameError as e:
+                    # The stream cannot be resynchronized after a bad frame.
+                    response.messages.put_nowait({"error": str(e)})
+                    response.messages.put_nowait(None)
+                    await responses.put(response)
+                    break
+                if request is None:
+                    break
+                response.task = asyncio.create_task(self.respond(request, response.messages))
+                await responses.put(response)
+        except ConnectionError:
+            pass
+        finally:
+            await responses.put(None)
+            await sender
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def send_responses(
+        self,
+        writer: asyncio.StreamWriter,
+        responses: asyncio.Queue[Response | None],
+        request_slots: asyncio.Semaphore,
+    ) -> None:
+        broken = False
+        while (response := await responses.get()) is not None:
+            while (message := await response.messages.get()) is not None:
+                if broken:
+                    continue
+                try:
+                    writer.write(encode_frame(message))
+                    await writer.drain()
+                except ConnectionError:
+                    # Keep consuming so the reader is not left waiting for slots.
+                    broken = True
+            request_slots.release()
+
+    async def respond(
+        self, request: bytes, messages: asyncio.Queue[dict[str, Any] | None]
+    ) -> None:
+        async for message in handle_command(request, self):
+            await messages.put(message)
+        await messages.put(None)
+
+    async def compile_batch(self, codes: Sequence[str]) -> AsyncIterator[dict[str, Any]]:
+        """Yields a message for each source as soon as it is compiled."""
+
+        async def compile_item(index: int, source_code: str) -> dict[str, Any]:
+            try:
+                executable, _ = await self.compile_cached(source_code)
+            except Exception as e:
+                return batch_item(index, None, "".join(format_exception(e)))
+            return batch_item(index, executable, None)
+
+        items = [compile_item(i, code) for i, code in enumerate(codes)]
+        for item in asyncio.as_completed(items):
+            yield await item
+
+    async def compile_cached(self, source_code: str) -> tuple[bytes, dict[str, Any]]:
+        """Returns the executable and the statistics of its compilation, which
+        are empty if it came from the cache."""
+        loop = asyncio.get_running_loop()
+        key = self.cache.key(source_code)
+        cached = self.cache.get_memory(key)
+        if cached is None:
+            cached = await loop.run_in_executor(None, self.cache.get_disk, key)
+            if cached is not None:
+                self.cache.remember(key, cached)
+        if cached is not None:
+            return cached, {}
+        async with self.compile_slots:
+            executable, stats = await loop.run_in_executor(
+                self.executor, run_with_stats, self.compile, source_code
+            )
+        self.cache.remember(key, executable)
+        await loop.run_in_executor(None, self.cache.put_disk, key, executable)
+        return executable, stats
+
+
+async def serve_async(server: AsyncCompileServer, host: str, port: int) -> None:
+    tcp_server = await asyncio.start_server(server.handle_connection, host, port)
+    async with tcp_server:
+        await tcp_server.serve_forever()
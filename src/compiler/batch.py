@@ -0,0 +1,66 @@
+from base64 import b64encode
+from collections.abc import Callable, Iterator, Sequence
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from traceback import format_exception
+from typing import Any
+
+from compiler.compile_cache import CompileCache
+
+
+def check_sources(sources: Any) -> Sequence[str]:
+    if not isinstance(sources, list) or not all(isinstance(s, str) for s in sources):
+        raise Exception("Expected a list of source code strings")
+    return sources
+
+
+def run_compile(
+    compile: Callable[[str], bytes], source_code: str
+) -> tuple[bytes | None, str | None]:
+    # Formatted in the worker, so errors read the same as from a single compile.
+    try:
+        return compile(source_code), None
+    except Exception as e:
+        return None, "".join(format_exception(e))
+
+
+def batch_item(index: int, executable: bytes | None, error: str | None) -> dict[str, Any]:
+    if error is not None:
+        return {"index": index, "error": error}
+    assert executable is not None
+    return {"index": index, "program": b64encode(executable).decode()}
+
+
+def compile_batch(
+    sources: Sequence[str],
+    compile: Callable[[str], bytes],
+    cache: CompileCache | None = None,
+    jobs: int | None = None,
+) -> Iterator[dict[str, Any]]:
+    """Compiles `sources` in parallel in a pool of `jobs` processes.
+
+    Yields `{"index": i, "program": ...}` or `{"index": i, "error": ...}` for
+    each source as soon as it is done, so results come in completion order.
+    Sources found in `cache` are not sent to the pool."""
+    check_sources(sources)
+    executor = ProcessPoolExecutor(jobs)
+    try:
+        futures: dict[Future[tuple[bytes | None, str | None]], tuple[int, str | None]] = {}
+        for index, source_code in enumerate(sources):
+            key = None
+            if cache is not None:
+                key = cache.key(source_code)
+                executable = cache.get(key)
+                if executable is not None:
+                    yield batch_item(index, executable, None)
+                    continue
+            future = executor.submit(run_compile, compile, source_code)
+            futures[future] = (index, key)
+        for future in as_completed(futures):
+            index, key = futures[future]
+            executable, error = future.result()
+            if cache is not None and key is not None and executable is not None:
+                cache.put(key, executable)
+            yield batch_item(index, executable, error)
+    finally:
+        # Stop compiling if the consumer goes away early.
+        executor.shutdown(cancel_futures=True)
@@ -0,0 +1,185 @@
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections.abc import Callable, Sequence
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from traceback import format_exception_only
+from typing import Any
+
+from compiler.compile_cache import compiler_version
+
+MANIFEST_NAME = ".compile-manifest.json"
+
+
+@dataclass
+class BuildResult:
+    input: Path
+    output: Path
+    status: str  # "compiled", "unchanged" or "failed"
+    seconds: float = 0.0
+    error: str | None = None
+
+
+def expand_inputs(inputs: Sequence[str]) -> list[tuple[Path, Path]]:
+    """Resolves files, glob patterns and directories to pairs of an input file
+    and its output path relative to the output directory.
+
+    Files in a directory keep their path relative to it; other files are
+    placed directly in the output directory. Outputs are named after the
+    input without its suffix."""
+    pairs: list[tuple[Path, Path]] = []
+    for input in inputs:
+        path = Path(input)
+        if path.is_dir():
+            for file in sorted(path.rglob("*")):
+                relative = file.relative_to(path)
+                if file.is_file() and not any(p.startswith(".") for p in relative.parts):
+                    pairs.append((file, relative.with_suffix("")))
+        elif any(c in input for c in "*?["):
+            for name in sorted(glob.glob(input, recursive=True)):
+                file = Path(name)
+                if file.is_file():
+                    pairs.append((file, Path(file.stem)))
+        elif path.is_file():
+            pairs.append((path, Path(path.stem)))
+        else:
+            raise Exception(f"No such input file or directory: {input}")
+
+    inputs_by_output: dict[Path, Path] = {}
+    for file, output in pairs:
+        other = inputs_by_output.setdefault(output, file)
+        if other != file:
+            raise Exception(f"Inputs {other} and {file} would both be compiled to {output}")
+    return list(dict.fromkeys(pairs))
+
+
+def file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def compile_file(
+    compile: Callable[[str], bytes], input: Path, output: Path
+) -> tuple[float, str | None]:
+    """Compiles one file in a worker process. Returns the time it took and
+    the error message if compilation failed."""
+    start = time.perf_counter()
+    try:
+        executable = compile(input.read_text())
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_bytes(executable)
+    except Exception as e:
+        return time.perf_counter() - start, "".join(format_exception_only(e)).strip()
+    return time.perf_counter() - start, None
+
+
+def build(
+    inputs: Sequence[str],
+    output_dir: str,
+    compile: Callable[[str], bytes],
+    jobs: int | None = None,
+) -> list[BuildResult]:
+    """Compiles `inputs` into `output_dir` in a pool of `jobs` processes.
+
+    A manifest in the output directory records the modification time, size
+    and hash of every input that compiled successfully. Inputs whose
+    modification time and size, or failing that hash, match the manifest and
+    whose output still exists are not compiled again."""
+    output_root = Path(output_dir)
+    output_root.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_root / MANIFEST_NAME
+    manifest = read_manifest(manifest_path)
+
+    results: list[BuildResult] = []
+    futures: dict[Future[tuple[float, str | None]], tuple[BuildResult, dict[str, Any]]] = {}
+    with ProcessPoolExecutor(jobs) as executor:
+        for input, relative_output in expand_inputs(inputs):
+            output = output_root / relative_output
+            result = BuildResult(input, output, "compiled")
+            results.append(result)
+            stat = input.stat()
+            key = str(input.resolve())
+            entry: dict[str, Any] = {
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "output": str(relative_output),
+            }
+            previous = manifest.get(key, {})
+            built = (
+                previous.get("output") == entry["output"]
+                and output.exists()
+            )
+            if built and all(previous.get(k) == v for k, v in entry.items()):
+                result.status = "unchanged"
+                continue
+            # Touched files whose content did not change are not recompiled.
+            entry["sha256"] = file_hash(input)
+            if built and previous.get("sha256") == entry["sha256"]:
+                result.status = "unchanged"
+                manifest[key] = entry
+                continue
+            future = executor.submit(compile_file, compile, input, output)
+            futures[future] = (result, entry)
+
+        for future, (result, entry) in futures.items():
+            result.seconds, result.error = future.result()
+            key = str(result.input.resolve())
+            if result.error is None:
+                manifest[key] = entry
+            else:
+                result.status = "failed"
+                manifest.pop(key, None)
+
+    write_manifest(manifest_path, manifest)
+    return results
+
+
+def read_manifest(path: Path) -> dict[str, dict[str, Any]]:
+    try:
+        data = json.loads(path.read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+    if data.get("compiler") != compiler_version():
+        return {}
+    inputs: dict[str, dict[str, Any]] = data.get("inputs", {})
+    return inputs
+
+
+def write_manifest(path: Path, inputs: dict[str, dict[str, Any]]) -> None:
+    data = {"compiler": compiler_version(), "inputs": inputs}
+    fd, temporary_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=1)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+
+def format_summary(results: Sequence[BuildResult], wall_seconds: float, slowest: int = 5) -> str:
+    counts = {status: 0 for status in ["compiled", "unchanged", "failed"]}
+    for result in results:
+        counts[result.status] += 1
+    compile_seconds = sum(result.seconds for result in results)
+    lines = [
+        f"{counts['compiled']} compiled, {counts['unchanged']} unchanged, "
+        f"{counts['failed']} failed in {wall_seconds:.3f} s "
+        f"({compile_seconds:.3f} s spent compiling)"
+    ]
+    for result in results:
+        if result.error is not None:
+            lines.append(f"{result.input}: {result.error}")
+    timed = sorted((r for r in results if r.status != "unchanged"), key=lambda r: -r.seconds)
+    if timed[:slowest]:
+        lines.append("Slowest:")
+        lines.extend(f"  {r.seconds:8.3f} s  {r.input}" for r in timed[:slowest])
+    return "\n".join(lines)
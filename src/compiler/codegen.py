@@ -0,0 +1,217 @@
+from compiler.assembly import ARGUMENT_REGISTERS, LABEL, Instruction, Mem, Operand
+from compiler.ir import BOOL, INT, IrProgram, Op
+from compiler.regalloc import Allocation, allocate_registers, stack_allocation
+from compiler.runtime import EPILOGUE, PROGRAM_FUNCTION, RUNTIME, prologue
+
+CONDITION_CODES = {
+    Op.EQ: "e",
+    Op.NE: "ne",
+    Op.LT: "l",
+    Op.LE: "le",
+    Op.GT: "g",
+    Op.GE: "ge",
+}
+NEGATED_CONDITION_CODES = {"e": "ne", "ne": "e", "l": "ge", "le": "g", "g": "le", "ge": "l"}
+ARITHMETIC_MNEMONICS = {Op.ADD: "addq", Op.SUB: "subq", Op.MUL: "imulq"}
+COMMUTATIVE_OPS = frozenset([Op.ADD, Op.MUL])
+
+
+class CodeGenerator:
+    """Translates an `IrProgram` into x86-64 instructions.
+
+    Each IR instruction becomes a short sequence working directly on the
+    locations of its registers, with `%rax`, `%rcx` and `%rdx` as scratch
+    registers where x86 needs one. The program is a function called by the
+    runtime's entry point, and prints its value if it is an Int or a Bool."""
+
+    def __init__(self, program: IrProgram, allocation: Allocation) -> None:
+        self.program = program
+        self.allocation = allocation
+        self.locations = allocation.locations
+        self.instructions: list[Instruction] = []
+
+    def emit(self, mnemonic: str, *operands: Operand) -> None:
+        self.instructions.append((mnemonic, *operands))
+
+    def move(self, source: Operand, destination: Operand) -> None:
+        if source == destination:
+            return
+        if isinstance(source, Mem) and isinstance(destination, Mem):
+            self.emit("movq", source, "%rax")
+            source = "%rax"
+        self.emit("movq", source, destination)
+
+    def constant(self, index: int) -> int:
+        """The constant as a signed 64-bit value. Constants folded by the
+        optimizer can be out of range, and wrap like the arithmetic does."""
+        value = int(self.program.constants[index] or 0)
+        return (value + 2**63) % 2**64 - 2**63
+
+    def generate(self) -> list[Instruction]:
+        program = self.program
+        labels = {target: f".L{n}" for n, target in enumerate(program.jump_targets())}
+        reads = program.read_counts()
+
+        self.emit(LABEL, PROGRAM_FUNCTION)
+        self.instructions += prologue(self.allocation.frame_size)
+        for saved, slot in self.allocation.callee_saved.items():
+            self.emit("movq", saved, slot)
+        for register, constant in program.constant_registers:
+            if not isinstance(self.locations[register], int):
+                self.emit("movabsq", self.constant(constant), "%rax")
+                self.move("%rax", self.locations[register])
+
+        skip = False
+        for i in range(len(program)):
+            if i in labels:
+                self.emit(LABEL, labels[i])
+            if skip:
+                skip = False
+                continue
+            op, dst, a, b = program.instruction(i)
+            if (
+                op in CONDITION_CODES
+                and i + 1 < len(program)
+                and i + 1 not in labels
+                and program.ops[i + 1] == Op.JUMP_IF_FALSE
+                and program.srcs_a[i + 1] == dst
+                and reads[dst] == 1
+            ):
+                # The comparison only decides the jump, so the flags are used
+                # directly instead of materializing a Bool.
+                self.compare(a, b)
+                condition = NEGATED_CONDITION_CODES[CONDITION_CODES[op]]
+                self.emit(f"j{condition}", labels[program.srcs_b[i + 1]])
+                skip = True
+            else:
+                self.generate_instruction(i, op, dst, a, b, labels)
+        return self.instructions
+
+    def compare(self, a: int, b: int) -> None:
+        left, right = self.locations[a], self.locations[b]
+        if isinstance(left, int) or (isinstance(left, Mem) and isinstance(right, Mem)):
+            self.emit("movq", left, "%rax")
+            left = "%rax"
+        self.emit("cmpq", right, left)
+
+    def arithmetic(self, op: Op, dst: int, a: int, b: int) -> None:
+        mnemonic = ARITHMETIC_MNEMONICS[op]
+        result, left, right = self.locations[dst], self.locations[a], self.locations[b]
+        if isinstance(result, str) and result != right:
+            self.move(left, result)
+            self.emit(mnemonic, right, result)
+        elif isinstance(result, str) and op in COMMUTATIVE_OPS:
+            self.emit(mnemonic, left, result)
+        else:
+            self.emit("movq", left, "%rax")
+            self.emit(mnemonic, right, "%rax")
+            self.emit("movq", "%rax", result)
+
+    def unary(self, mnemonic: str, operand: Operand | None, dst: int, a: int) -> None:
+        result = self.locations[dst]
+        if isinstance(result, str) or result == self.locations[a]:
+            self.move(self.locations[a], result)
+            target = result
+        else:
+            self.emit("movq", self.locations[a], "%rax")
+            target = "%rax"
+        if operand is None:
+            self.emit(mnemonic, target)
+        else:
+            self.emit(mnemonic, operand, target)
+        self.move(target, result)
+
+    def call(self, index: int, dst: int, function: int, arguments: int) -> None:
+        saved = self.allocation.saved_across_calls.get(index, [])
+        for register, slot in saved:
+            self.emit("movq", register, slot)
+        args = [self.locations[arg] for arg in self.program.arguments[arguments]]
+        if len(args) > len(ARGUMENT_REGISTERS):
+            raise Exception("Too many arguments")
+        if len(args) == 1:
+            self.move(args[0], ARGUMENT_REGISTERS[0])
+        else:
+            # An argument may be in another argument's register, so they
+            # all go through the stack.
+            for arg in args:
+                self.emit("pushq", arg)
+            for register in reversed(ARGUMENT_REGISTERS[: len(args)]):
+                self.emit("popq", register)
+        self.emit("call", self.program.functions[function])
+        self.move("%rax", self.locations[dst])
+        for register, slot in saved:
+            self.emit("movq", slot, register)
+
+    def generate_instruction(
+        self, index: int, op: Op, dst: int, a: int, b: int, labels: dict[int, str]
+    ) -> None:
+        locations = self.locations
+        if op == Op.COPY:
+            self.move(locations[a], locations[dst])
+        elif op == Op.CONST:
+            self.emit("movabsq", self.constant(a), "%rax")
+            self.move("%rax", locations[dst])
+        elif op in ARITHMETIC_MNEMONICS:
+            self.arithmetic(op, dst, a, b)
+        elif op == Op.DIV or op == Op.MOD:
+            # idiv truncates towards zero, like the language's / and %.
+            self.emit("movq", locations[a], "%rax")
+            self.emit("cqto")
+            divisor = locations[b]
+            if isinstance(divisor, int):
+                self.emit("movq", divisor, "%rcx")
+                divisor = "%rcx"
+            self.emit("idivq", divisor)
+            self.move("%rax" if op == Op.DIV else "%rdx", locations[dst])
+        elif op in CONDITION_CODES:
+            self.compare(a, b)
+            self.emit(f"set{CONDITION_CODES[op]}", "%al")
+            result = locations[dst]
+            if isinstance(result, str):
+                self.emit("movzbq", "%al", result)
+            else:
+                self.emit("movzbq", "%al", "%rax")
+                self.emit("movq", "%rax", result)
+        elif op == Op.NEG:
+            self.unary("negq", None, dst, a)
+        elif op == Op.NOT:
+            self.unary("xorq", 1, dst, a)
+        elif op == Op.JUMP:
+            self.emit("jmp", labels[a])
+        elif op == Op.JUMP_IF_FALSE or op == Op.JUMP_IF_TRUE:
+            condition = locations[a]
+            if isinstance(condition, int):
+                if bool(condition) == (op == Op.JUMP_IF_TRUE):
+                    self.emit("jmp", labels[b])
+                return
+            if isinstance(condition, str):
+                self.emit("testq", condition, condition)
+            else:
+                self.emit("cmpq", 0, condition)
+            self.emit("je" if op == Op.JUMP_IF_FALSE else "jne", labels[b])
+        elif op == Op.CALL:
+            self.call(index, dst, a, b)
+        elif op == Op.RETURN:
+            result_type = self.program.result_type
+            if result_type == INT or result_type == BOOL:
+                self.move(locations[a], "%rdi")
+                self.emit("call", "print_int" if result_type == INT else "print_bool")
+            for register, slot in self.allocation.callee_saved.items():
+                self.emit("movq", slot, register)
+            self.instructions += EPILOGUE
+        else:
+            raise Exception(f"Cannot generate code for {op.name}")
+
+
+def generate_program(program: IrProgram, use_registers: bool = True) -> list[Instruction]:
+    """The instructions of the function running `program`, without the runtime.
+
+    With `use_registers` false, every value is kept on the stack, which is
+    the baseline to compare register allocation against."""
+    allocation = allocate_registers(program) if use_registers else stack_allocation(program)
+    return CodeGenerator(program, allocation).generate()
+
+
+def generate_assembly(program: IrProgram, use_registers: bool = True) -> list[Instruction]:
+    """The instructions of a complete executable running `program`."""
+    return [*generate_program(program, use_registers), *RUNTIME]
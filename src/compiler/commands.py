@@ -0,0 +1,59 @@
+import json
+from base64 import b64encode
+from collections.abc import AsyncIterator, Sequence
+from traceback import format_exception
+from typing import Any, Protocol
+
+from compiler.batch import check_sources
+from compiler.compile_cache import CompileCache
+from compiler.tokenizer import LineCache
+
+
+class CompileService(Protocol):
+    """What a server provides to `handle_command`."""
+
+    cache: CompileCache
+    line_cache: LineCache | None
+
+    async def compile_cached(self, source_code: str) -> tuple[bytes, dict[str, Any]]:
+        """Returns the executable, from the cache if it is there, and the
+        statistics of its compilation."""
+        ...
+
+    def compile_batch(self, codes: Sequence[str]) -> AsyncIterator[dict[str, Any]]:
+        """Yields `batch.compile_batch` items in completion order."""
+        ...
+
+
+async def handle_command(
+    request: bytes, service: CompileService
+) -> AsyncIterator[dict[str, Any]]:
+    """Answers one JSON request of the compile servers.
+
+    Yields the messages of the response. Every command ends with one message
+    without an `"index"`, which holds the result or an `"error"`;
+    `compile_batch` sends a message per source before it. A request's
+    `"id"`, if present, is copied into all of them."""
+    result: dict[str, Any] = {}
+    try:
+        input = json.loads(request.decode())
+        if "id" in input:
+            result["id"] = input["id"]
+        if input["command"] == "compile":
+            executable, stats = await service.compile_cached(input["code"])
+            result["program"] = b64encode(executable).decode()
+            result["stats"] = stats
+        elif input["command"] == "compile_batch":
+            async for item in service.compile_batch(check_sources(input["codes"])):
+                yield {**result, **item}
+        elif input["command"] == "ping":
+            pass
+        elif input["command"] == "cache_stats":
+            result["cache"] = service.cache.stats()
+            if service.line_cache is not None:
+                result["line_cache"] = service.line_cache.stats()
+        else:
+            result["error"] = "Unknown command: " + input['command']
+    except Exception as e:
+        result["error"] = "".join(format_exception(e))
+    yield result
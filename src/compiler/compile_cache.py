@@ -0,0 +1,167 @@
+import hashlib
+import json
+import mmap
+import multiprocessing
+import os
+import tempfile
+from collections import OrderedDict
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+_compiler_version: str | None = None
+
+
+def compiler_version() -> str:
+    """Hash of the compiler's own source files.
+
+    Part of every cache key, so changing the compiler invalidates old entries."""
+    global _compiler_version
+    if _compiler_version is None:
+        digest = hashlib.sha256()
+        for path in sorted(Path(__file__).parent.glob("*.py")):
+            if not path.name.startswith("test_"):
+                digest.update(path.name.encode())
+                digest.update(path.read_bytes())
+        _compiler_version = digest.hexdigest()
+    return _compiler_version
+
+
+# Indices into the shared counter array.
+MEMORY_HITS = 0
+DISK_HITS = 1
+MISSES = 2
+
+
+class CompileCache:
+    """Content-addressed cache of compiled executables.
+
+    Entries are keyed by a hash of the source code, the compiler version and the
+    compile options. Lookups go through an in-memory LRU tier limited to
+    `max_memory_bytes` and then, if `directory` is given, an on-disk tier.
+    Disk entries are written to a temporary file and renamed into place, so
+    processes sharing the directory never see partially written entries.
+
+    The hit and miss counters live in shared memory, so they count the lookups
+    of all worker processes forked after the cache was created."""
+
+    def __init__(
+        self, max_memory_bytes: int = 64 * 1024 * 1024, directory: str | None = None
+    ) -> None:
+        self.max_memory_bytes = max_memory_bytes
+        self.directory = Path(directory) if directory is not None else None
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self.entries: OrderedDict[str, bytes] = OrderedDict()
+        self.memory_bytes = 0
+        self.counters = multiprocessing.Array("q", 3)
+
+    def key(
+        self, source: str | bytes | mmap.mmap, options: dict[str, Any] | None = None
+    ) -> str:
+        digest = hashlib.sha256()
+        digest.update(compiler_version().encode())
+        digest.update(json.dumps(options or {}, sort_keys=True).encode())
+        digest.update(b"\0")
+        digest.update(source.encode() if isinstance(source, str) else source)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> bytes | None:
+        value = self.get_memory(key)
+        if value is None:
+            value = self.get_disk(key)
+            if value is not None:
+                self.remember(key, value)
+        return value
+
+    def get_memory(self, key: str) -> bytes | None:
+        """Looks `key` up in the memory tier only. A miss is counted by
+        `get_disk`, which should be tried next."""
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+            self._count(MEMORY_HITS)
+        return value
+
+    def get_disk(self, key: str) -> bytes | None:
+        """Looks `key` up in the disk tier only, without adding it to the
+        memory tier. Does not touch the memory tier, so it can run in another
+        thread."""
+        if self.directory is not None:
+            try:
+                value = self._entry_path(key).read_bytes()
+            except FileNotFoundError:
+                pass
+            else:
+                self._count(DISK_HITS)
+                return value
+        self._count(MISSES)
+        return None
+
+    def put(self, key: str, value: bytes) -> None:
+        self.remember(key, value)
+        self.put_disk(key, value)
+
+    def put_disk(self, key: str, value: bytes) -> None:
+        """Writes an entry to the disk tier only. Like `get_disk`, it can run
+        in another thread."""
+        if self.directory is None:
+            return
+        path = self._entry_path(key)
+        path.parent.mkdir(exist_ok=True)
+        fd, temporary_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(value)
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+    def get_or_compile(
+        self,
+        source: str,
+        compile: Callable[[str], bytes],
+        options: dict[str, Any] | None = None,
+    ) -> bytes:
+        """Returns the cached executable for `source` or compiles and caches it.
+
+        Compilation errors are raised and not cached."""
+        key = self.key(source, options)
+        value = self.get(key)
+        if value is None:
+            value = compile(source)
+            self.put(key, value)
+        return value
+
+    def stats(self) -> dict[str, int]:
+        with self.counters.get_lock():
+            memory_hits, disk_hits, misses = self.counters[:]
+        return {
+            "memory_hits": memory_hits,
+            "disk_hits": disk_hits,
+            "misses": misses,
+            "memory_entries": len(self.entries),
+            "memory_bytes": self.memory_bytes,
+        }
+
+    def _count(self, counter: int) -> None:
+        with self.counters.get_lock():
+            self.counters[counter] += 1
+
+    def remember(self, key: str, value: bytes) -> None:
+        """Adds an entry to the memory tier only."""
+        if len(value) > self.max_memory_bytes:
+            return
+        old_value = self.entries.pop(key, None)
+        if old_value is not None:
+            self.memory_bytes -= len(old_value)
+        self.entries[key] = value
+        self.memory_bytes += len(value)
+        while self.memory_bytes > self.max_memory_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+
+    def _entry_path(self, key: str) -> Path:
+        assert self.directory is not None
+        return self.directory / key[:2] / key[2:]
@@ -1,44 +1,139 @@
-from dataclasses import dataclass, field
+from collections.abc import Callable
+from dataclasses import dataclass, field, fields
+from typing import Any
 
 
-@dataclass
+@dataclass(eq=False, repr=False, slots=True)
 class Expression:
-    """Base class for AST nodes representing expressions."""
-
-
-@dataclass
+    """Base class for AST nodes representing expressions.
+
+    Nodes use `__slots__` instead of an instance `__dict__`. Operators and the
+    `None`, `true` and `false` literals are shared instances (see `operator()`,
+    `NONE_LITERAL`, `TRUE_LITERAL` and `FALSE_LITERAL`), so they must not be
+    mutated in place.
+
+    Equality and repr walk the tree with an explicit stack instead of recursing,
+    so arbitrarily deep trees can be compared and printed."""
+
+    def __eq__(self, other: object) -> bool:
+        pairs: list[tuple[Any, Any]] = [(self, other)]
+        while pairs:
+            a, b = pairs.pop()
+            if isinstance(a, Expression) or isinstance(b, Expression):
+                if isinstance(a, LazyBlock):
+                    a.expand()
+                if isinstance(b, LazyBlock):
+                    b.expand()
+                if a.__class__ is not b.__class__:
+                    return False
+                if a is b:
+                    continue
+                for name in field_names(type(a)):
+                    pairs.append((getattr(a, name), getattr(b, name)))
+            elif type(a) is list and type(b) is list:
+                if len(a) != len(b):
+                    return False
+                pairs.extend(zip(a, b))
+            elif a != b:
+                return False
+        return True
+
+    def __repr__(self) -> str:
+        parts: list[str] = []
+        # Either a value still to be printed or a piece of finished output.
+        work: list[tuple[bool, Any]] = [(False, self)]
+        while work:
+            is_output, value = work.pop()
+            if is_output:
+                parts.append(value)
+            elif isinstance(value, Expression):
+                if isinstance(value, LazyBlock):
+                    value.expand()
+                names = field_names(type(value))
+                work.append((True, ")"))
+                for i in reversed(range(len(names))):
+                    work.append((False, getattr(value, names[i])))
+                    work.append((True, f"{', ' if i else ''}{names[i]}="))
+                work.append((True, f"{type(value).__name__}("))
+            elif type(value) is list:
+                work.append((True, "]"))
+                for i in reversed(range(len(value))):
+                    work.append((False, value[i]))
+                    if i:
+                        work.append((True, ", "))
+                work.append((True, "["))
+            else:
+                parts.append(repr(value))
+        return "".join(parts)
+
+
+_field_names: dict[type, tuple[str, ...]] = {}
+
+
+def field_names(node_type: type) -> tuple[str, ...]:
+    names = _field_names.get(node_type)
+    if names is None:
+        names = _field_names[node_type] = tuple(f.name for f in fields(node_type))
+    return names
+
+
+@dataclass(eq=False, repr=False, slots=True)
 class Literal(Expression):
     value: int | bool | None
 
+    def __reduce_ex__(self, protocol: Any) -> Any:
+        # Shared literals are pickled by name, so they stay shared.
+        if self is NONE_LITERAL:
+            return "NONE_LITERAL"
+        if self is TRUE_LITERAL:
+            return "TRUE_LITERAL"
+        if self is FALSE_LITERAL:
+            return "FALSE_LITERAL"
+        return object.__reduce_ex__(self, protocol)
+
 
-@dataclass
+@dataclass(eq=False, repr=False, slots=True)
 class Identifier(Expression):
     name: str
 
 
-@dataclass
+@dataclass(eq=False, repr=False, slots=True)
 class Operator(Expression):
     symbol: str
 
+    def __reduce_ex__(self, protocol: Any) -> Any:
+        return operator, (self.symbol,)
+
+
+_operators: dict[str, Operator] = {}
 
-@dataclass
+
+def operator(symbol: str) -> Operator:
+    """Returns the shared `Operator` node for `symbol`."""
+    node = _operators.get(symbol)
+    if node is None:
+        node = _operators[symbol] = Operator(symbol)
+    return node
+
+
+@dataclass(eq=False, repr=False, slots=True)
 class Punctuation(Expression):
     name: str
 
 
-@dataclass
+@dataclass(eq=False, repr=False, slots=True)
 class FunctionCall(Expression):
     function_name: Identifier
     args: list[Expression] | None
 
 
-@dataclass
+@dataclass(eq=False, repr=False, slots=True)
 class UnaryOp(Expression):
     op: Operator
     right: Expression
 
 
-@dataclass
+@dataclass(eq=False, repr=False, slots=True)
 class BinaryOp(Expression):
     """AST node for a binary operation like `A + B`"""
 
@@ -47,31 +142,62 @@ class BinaryOp(Expression):
     right: Expression
 
 
-@dataclass
+@dataclass(eq=False, repr=False, slots=True)
 class ConditionalStatement(Expression):
     """Class for conditional statements"""
 
     cond: Expression
 
 
-@dataclass
+@dataclass(eq=False, repr=False, slots=True)
 class TernaryOp(ConditionalStatement):
     then_: Expression
     else_: Expression | None = None
 
 
-@dataclass
+@dataclass(eq=False, repr=False, slots=True)
 class WhileStatement(ConditionalStatement):
     body: Expression
 
 
-@dataclass
+@dataclass(eq=False, repr=False, slots=True)
 class Block(Expression):
     statements: list[Expression]
-    result_expression: Expression = field(default_factory=lambda:  Literal(None))
+    result_expression: Expression = field(default_factory=lambda: NONE_LITERAL)
+
 
-@dataclass
+class LazyBlock(Block):
+    """Placeholder for a block that is parsed when it is first used.
+
+    Until then the `statements` slot holds the function that parses the
+    block. Accessing `statements` or `result_expression`, or comparing or
+    printing the node, parses it and turns the node into a plain `Block`.
+    Blocks inside it are placeholders again."""
+
+    __slots__ = ()
+
+    def __init__(self, parse: Callable[[], Block]) -> None:
+        object.__setattr__(self, "statements", parse)
+
+    def __getattribute__(self, name: str) -> Any:
+        if name == "statements" or name == "result_expression":
+            LazyBlock.expand(self)
+        return object.__getattribute__(self, name)
+
+    def expand(self) -> None:
+        if type(self) is LazyBlock:
+            block = object.__getattribute__(self, "statements")()
+            object.__setattr__(self, "statements", block.statements)
+            object.__setattr__(self, "result_expression", block.result_expression)
+            self.__class__ = Block  # type: ignore[assignment]
+
+
+@dataclass(eq=False, repr=False, slots=True)
 class Variable(Expression):
     identifier: Identifier
     initializer: Expression
-    
+
+
+NONE_LITERAL: Literal = Literal(None)
+TRUE_LITERAL: Literal = Literal(True)
+FALSE_LITERAL: Literal = Literal(False)
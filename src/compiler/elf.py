@@ -0,0 +1,88 @@
+import struct
+from collections.abc import Sequence
+from functools import cache
+
+from compiler.assembly import ENTRY_POINT, Instruction, assemble_and_link, render
+from compiler.encoder import EncodedCode, EncodingError, encode
+from compiler.runtime import RUNTIME
+
+# Where the file is mapped, the usual address of static executables.
+BASE_ADDRESS = 0x400000
+ELF_HEADER = struct.Struct("<16sHHIQQQIHHHHHH")
+PROGRAM_HEADER = struct.Struct("<IIQQQQQQ")
+PT_LOAD = 1
+PT_GNU_STACK = 0x6474E551
+PF_X = 1
+PF_W = 2
+PF_R = 4
+CODE_OFFSET = ELF_HEADER.size + 2 * PROGRAM_HEADER.size
+
+
+@cache
+def prebuilt_runtime() -> EncodedCode:
+    """The runtime, encoded once per process. Worker processes forked after
+    the first call share it."""
+    return encode(RUNTIME)
+
+
+def link(units: Sequence[EncodedCode]) -> tuple[bytes, dict[str, int]]:
+    """Places encoded code one unit after another and resolves the references
+    between them. Returns the code and the offsets of all labels."""
+    code = bytearray()
+    labels: dict[str, int] = {}
+    starts = []
+    for unit in units:
+        starts.append(len(code))
+        for label, offset in unit.labels.items():
+            labels.setdefault(label, len(code) + offset)
+        code += unit.code
+    for start, unit in zip(starts, units):
+        for offset, label in unit.relocations:
+            if label not in labels:
+                raise Exception(f"Undefined symbol {label}")
+            position = start + offset
+            struct.pack_into("<i", code, position, labels[label] - position - 4)
+    return bytes(code), labels
+
+
+def write_elf(code: bytes, entry: int) -> bytes:
+    """A static ELF executable with `code` mapped readable and executable,
+    starting at offset `entry` of the code."""
+    size = CODE_OFFSET + len(code)
+    header = ELF_HEADER.pack(
+        b"\x7fELF\x02\x01\x01",  # 64-bit, little-endian, version 1
+        2,  # executable
+        0x3E,  # x86-64
+        1,
+        BASE_ADDRESS + CODE_OFFSET + entry,
+        ELF_HEADER.size,  # program headers right after this header
+        0,  # no section headers
+        0,
+        ELF_HEADER.size,
+        PROGRAM_HEADER.size,
+        2,
+        0,
+        0,
+        0,
+    )
+    load = PROGRAM_HEADER.pack(
+        PT_LOAD, PF_R | PF_X, 0, BASE_ADDRESS, BASE_ADDRESS, size, size, 0x1000
+    )
+    # Asks for a stack that is not executable.
+    stack = PROGRAM_HEADER.pack(PT_GNU_STACK, PF_R | PF_W, 0, 0, 0, 0, 0, 16)
+    return header + load + stack + code
+
+
+def build_executable(program: list[Instruction], use_toolchain: bool = False) -> bytes:
+    """Builds an executable from the instructions of the compiled program.
+
+    The program is encoded in-process and linked with the prebuilt runtime.
+    Instructions the encoder does not support, or `use_toolchain`, make it
+    fall back to GNU `as` and `ld`."""
+    if not use_toolchain:
+        try:
+            code, labels = link([prebuilt_runtime(), encode(program)])
+            return write_elf(code, labels[ENTRY_POINT])
+        except EncodingError:
+            pass
+    return assemble_and_link(render([*program, *RUNTIME]))
@@ -0,0 +1,200 @@
+import struct
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+
+from compiler.assembly import LABEL, Instruction, Mem, Operand
+
+REGISTERS_64 = {
+    name: number
+    for number, name in enumerate(
+        ["%rax", "%rcx", "%rdx", "%rbx", "%rsp", "%rbp", "%rsi", "%rdi"]
+        + [f"%r{n}" for n in range(8, 16)]
+    )
+}
+# Only the low byte registers that need no REX prefix.
+REGISTERS_8 = {"%al": 0, "%cl": 1, "%dl": 2, "%bl": 3}
+CONDITION_CODES = {
+    "o": 0x0, "no": 0x1, "b": 0x2, "ae": 0x3, "e": 0x4, "ne": 0x5, "be": 0x6, "a": 0x7,
+    "s": 0x8, "ns": 0x9, "p": 0xA, "np": 0xB, "l": 0xC, "ge": 0xD, "le": 0xE, "g": 0xF,
+}  # fmt: skip
+# The /digit of the group 1 arithmetic instructions.
+ALU_OPS = {"addq": 0, "subq": 5, "xorq": 6, "cmpq": 7}
+
+
+class EncodingError(Exception):
+    """An instruction or operand form the encoder does not support."""
+
+
+@dataclass
+class EncodedCode:
+    """Machine code with the offsets of its labels.
+
+    `relocations` lists the 32-bit relative references to labels that were
+    not defined in the same code, as (offset of the field, label)."""
+
+    code: bytearray = field(default_factory=bytearray)
+    labels: dict[str, int] = field(default_factory=dict)
+    relocations: list[tuple[int, str]] = field(default_factory=list)
+
+
+def fits_int8(value: int) -> bool:
+    return -128 <= value < 128
+
+
+def register_number(operand: Operand, registers: dict[str, int] = REGISTERS_64) -> int:
+    if isinstance(operand, str) and operand in registers:
+        return registers[operand]
+    raise EncodingError(f"Expected a register, got {operand!r}")
+
+
+def rex(w: bool, reg: int, rm: int) -> bytes:
+    value = 0x40 | (8 if w else 0) | (4 if reg >= 8 else 0) | (1 if rm >= 8 else 0)
+    return bytes([value]) if value != 0x40 else b""
+
+
+def modrm(reg: int, rm: Operand) -> tuple[int, bytes]:
+    """The extension bit of the r/m field and the ModRM, SIB and displacement
+    bytes for register field `reg` and operand `rm`."""
+    if isinstance(rm, Mem):
+        base = register_number(rm.base)
+        low = base & 7
+        sib = b"\x24" if low == 4 else b""
+        if rm.offset == 0 and low != 5:
+            mod, displacement = 0, b""
+        elif fits_int8(rm.offset):
+            mod, displacement = 1, struct.pack("<b", rm.offset)
+        else:
+            mod, displacement = 2, struct.pack("<i", rm.offset)
+        return base, bytes([mod << 6 | (reg & 7) << 3 | low]) + sib + displacement
+    if isinstance(rm, str):
+        number = REGISTERS_8[rm] if rm in REGISTERS_8 else register_number(rm)
+        return number, bytes([0xC0 | (reg & 7) << 3 | number & 7])
+    raise EncodingError(f"Expected a register or memory operand, got {rm!r}")
+
+
+def with_modrm(opcode: bytes, reg: int, rm: Operand, w: bool = True) -> bytes:
+    rm_number, tail = modrm(reg, rm)
+    return rex(w, reg, rm_number) + opcode + tail
+
+
+def immediate32(value: int) -> bytes:
+    if not -(2**31) <= value < 2**31:
+        raise EncodingError(f"Immediate {value} does not fit in 32 bits")
+    return struct.pack("<i", value)
+
+
+class Encoder:
+    """Encodes the instructions of `compiler.assembly` into x86-64 machine
+    code. Jumps and calls always use 32-bit displacements, so every
+    instruction has its final size when it is encoded and labels are
+    patched in at the end."""
+
+    def __init__(self) -> None:
+        self.output = EncodedCode()
+        self.fixups: list[tuple[int, str]] = []
+
+    def encode(self, instructions: Iterable[Instruction]) -> EncodedCode:
+        code = self.output.code
+        for instruction in instructions:
+            mnemonic, *operands = instruction
+            if mnemonic == LABEL:
+                assert isinstance(operands[0], str)
+                self.output.labels[operands[0]] = len(code)
+            else:
+                code += self.encode_instruction(mnemonic, operands)
+        for offset, label in self.fixups:
+            if label in self.output.labels:
+                struct.pack_into("<i", code, offset, self.output.labels[label] - offset - 4)
+            else:
+                self.output.relocations.append((offset, label))
+        return self.output
+
+    def branch(self, opcode: bytes, target: Operand) -> bytes:
+        if not isinstance(target, str) or target.startswith("%"):
+            raise EncodingError(f"Expected a label, got {target!r}")
+        self.fixups.append((len(self.output.code) + len(opcode), target))
+        return opcode + b"\0\0\0\0"
+
+    def encode_instruction(self, mnemonic: str, operands: list[Operand]) -> bytes:
+        match mnemonic, *operands:
+            case "movq", int(value), destination:
+                return with_modrm(b"\xc7", 0, destination) + immediate32(value)
+            case "movq", Mem() as source, destination:
+                return with_modrm(b"\x8b", register_number(destination), source)
+            case "movq", source, destination:
+                return with_modrm(b"\x89", register_number(source), destination)
+            case "movabsq", int(value), destination:
+                number = register_number(destination)
+                return rex(True, 0, number) + bytes([0xB8 | number & 7]) + struct.pack(
+                    "<q" if value < 0 else "<Q", value
+                )
+            case ("addq" | "subq" | "xorq" | "cmpq"), int(value), destination:
+                digit = ALU_OPS[mnemonic]
+                if fits_int8(value):
+                    return with_modrm(b"\x83", digit, destination) + struct.pack("<b", value)
+                return with_modrm(b"\x81", digit, destination) + immediate32(value)
+            case ("addq" | "subq" | "xorq" | "cmpq"), Mem() as source, destination:
+                opcode = bytes([ALU_OPS[mnemonic] << 3 | 0x03])
+                return with_modrm(opcode, register_number(destination), source)
+            case ("addq" | "subq" | "xorq" | "cmpq"), source, destination:
+                opcode = bytes([ALU_OPS[mnemonic] << 3 | 0x01])
+                return with_modrm(opcode, register_number(source), destination)
+            case "testq", source, destination:
+                return with_modrm(b"\x85", register_number(source), destination)
+            case "imulq", int(value), destination:
+                number = register_number(destination)
+                if fits_int8(value):
+                    return with_modrm(b"\x6b", number, destination) + struct.pack("<b", value)
+                return with_modrm(b"\x69", number, destination) + immediate32(value)
+            case "imulq", source, destination:
+                return with_modrm(b"\x0f\xaf", register_number(destination), source)
+            case "idivq", operand:
+                return with_modrm(b"\xf7", 7, operand)
+            case "negq", operand:
+                return with_modrm(b"\xf7", 3, operand)
+            case "cqto",:
+                return b"\x48\x99"
+            case "leaq", Mem() as source, destination:
+                return with_modrm(b"\x8d", register_number(destination), source)
+            case "movzbq", source, destination:
+                if isinstance(source, str):
+                    register_number(source, REGISTERS_8)
+                return with_modrm(b"\x0f\xb6", register_number(destination), source)
+            case "movb", source, Mem() as destination:
+                reg = register_number(source, REGISTERS_8)
+                return with_modrm(b"\x88", reg, destination, w=False)
+            case "pushq", int(value):
+                if fits_int8(value):
+                    return b"\x6a" + struct.pack("<b", value)
+                return b"\x68" + immediate32(value)
+            case "pushq", Mem() as source:
+                return with_modrm(b"\xff", 6, source, w=False)
+            case "pushq", source:
+                number = register_number(source)
+                return rex(False, 0, number) + bytes([0x50 | number & 7])
+            case "popq", destination:
+                number = register_number(destination)
+                return rex(False, 0, number) + bytes([0x58 | number & 7])
+            case "jmp", target:
+                return self.branch(b"\xe9", target)
+            case "call", target:
+                return self.branch(b"\xe8", target)
+            case "ret",:
+                return b"\xc3"
+            case "syscall",:
+                return b"\x0f\x05"
+            case _ if mnemonic.startswith("set") and mnemonic[3:] in CONDITION_CODES:
+                (operand,) = operands
+                register_number(operand, REGISTERS_8)
+                opcode = bytes([0x0F, 0x90 | CONDITION_CODES[mnemonic[3:]]])
+                return with_modrm(opcode, 0, operand, w=False)
+            case _ if mnemonic.startswith("j") and mnemonic[1:] in CONDITION_CODES:
+                (target,) = operands
+                return self.branch(bytes([0x0F, 0x80 | CONDITION_CODES[mnemonic[1:]]]), target)
+        raise EncodingError(
+            f"Cannot encode {mnemonic} {', '.join(repr(o) for o in operands)}"
+        )
+
+
+def encode(instructions: Iterable[Instruction]) -> EncodedCode:
+    return Encoder().encode(instructions)
@@ -0,0 +1,264 @@
+from array import array
+from collections.abc import Sequence
+from enum import IntEnum
+from typing import Any
+
+import compiler.custom_ast as ast
+
+
+class NodeKind(IntEnum):
+    LITERAL = 0
+    IDENTIFIER = 1
+    FUNCTION_CALL = 2
+    UNARY_OP = 3
+    BINARY_OP = 4
+    TERNARY_OP = 5
+    WHILE_STATEMENT = 6
+    BLOCK = 7
+    VARIABLE = 8
+
+
+class AstArena:
+    """Flat AST stored in parallel arrays and addressed by integer node ids.
+
+    Per node the arena stores its kind, a payload and the position and count of
+    its child ids in the shared `children` array:
+
+    - literal: index of the value in `constants`, no children
+    - identifier: index of the name in `strings`, no children
+    - function call: 1 if it has an argument list, else 0; children are the
+      function name identifier followed by the arguments
+    - unary op: index of the operator in `strings`; child is the operand
+    - binary op: index of the operator in `strings`; children are the operands
+    - ternary op: children are the condition, then branch and optional else branch
+    - while statement: children are the condition and body
+    - block: children are the statements followed by the result expression
+    - variable: children are the identifier and initializer
+
+    Nodes are added in post-order, children before their parent, so the subtree
+    of a node is the contiguous id range `subtree(node)` and can be walked
+    without recursion or an explicit stack.
+
+    The arena is also a `NodeBuilder`, so the parsers can emit into it
+    directly: `parse(tokens, builder=arena)` returns the id of the root node."""
+
+    def __init__(self) -> None:
+        self.kinds = array("B")
+        self.payloads = array("q")
+        self.child_starts = array("I")
+        self.child_counts = array("I")
+        self.subtree_starts = array("I")
+        self.children = array("I")
+        self.strings: list[str] = []
+        self.string_ids: dict[str, int] = {}
+        self.constants: list[int | bool | None] = []
+        self.constant_ids: dict[tuple[type, int | bool | None], int] = {}
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def add(self, kind: NodeKind, payload: int, children: Sequence[int] = ()) -> int:
+        node = len(self.kinds)
+        subtree_start = node
+        if children:
+            subtree_start = self.subtree_starts[children[0]]
+            expected_start = subtree_start
+            for child in children:
+                if self.subtree_starts[child] != expected_start:
+                    raise Exception("Arena nodes must be added in post-order")
+                expected_start = child + 1
+            if expected_start != node:
+                raise Exception("Arena nodes must be added in post-order")
+        self.kinds.append(kind)
+        self.payloads.append(payload)
+        self.child_starts.append(len(self.children))
+        self.child_counts.append(len(children))
+        self.subtree_starts.append(subtree_start)
+        self.children.extend(children)
+        return node
+
+    def string_id(self, string: str) -> int:
+        string_id = self.string_ids.get(string)
+        if string_id is None:
+            string_id = self.string_ids[string] = len(self.strings)
+            self.strings.append(string)
+        return string_id
+
+    def constant_id(self, value: int | bool | None) -> int:
+        # Keyed by type too, because 1 and True are equal dictionary keys.
+        key = (type(value), value)
+        constant_id = self.constant_ids.get(key)
+        if constant_id is None:
+            constant_id = self.constant_ids[key] = len(self.constants)
+            self.constants.append(value)
+        return constant_id
+
+    def child(self, node: int, index: int) -> int:
+        return self.children[self.child_starts[node] + index]
+
+    def children_of(self, node: int) -> Sequence[int]:
+        start = self.child_starts[node]
+        return self.children[start : start + self.child_counts[node]]
+
+    def subtree(self, node: int) -> range:
+        """Ids of the subtree rooted at `node`, in post-order."""
+        return range(self.subtree_starts[node], node + 1)
+
+    def string(self, node: int) -> str:
+        """Name of an identifier or symbol of an operator node."""
+        return self.strings[self.payloads[node]]
+
+    def value(self, node: int) -> int | bool | None:
+        """Value of a literal node."""
+        return self.constants[self.payloads[node]]
+
+    # === NodeBuilder ===
+
+    def literal(self, value: int | bool | None) -> int:
+        return self.add(NodeKind.LITERAL, self.constant_id(value))
+
+    def none_literal(self) -> int:
+        return self.literal(None)
+
+    def boolean_literal(self, value: bool) -> int:
+        return self.literal(value)
+
+    def identifier(self, name: str) -> int:
+        return self.add(NodeKind.IDENTIFIER, self.string_id(name))
+
+    def operator(self, symbol: str) -> int:
+        # Operators are stored as payloads of the operation nodes.
+        return self.string_id(symbol)
+
+    def function_call(self, function_name: int, args: list[int] | None) -> int:
+        if args is None:
+            return self.add(NodeKind.FUNCTION_CALL, 0, [function_name])
+        return self.add(NodeKind.FUNCTION_CALL, 1, [function_name, *args])
+
+    def unary_op(self, op: int, right: int) -> int:
+        return self.add(NodeKind.UNARY_OP, op, [right])
+
+    def binary_op(self, left: int, op: int, right: int) -> int:
+        return self.add(NodeKind.BINARY_OP, op, [left, right])
+
+    def ternary_op(self, cond: int, then_: int, else_: int | None = None) -> int:
+        if else_ is None:
+            return self.add(NodeKind.TERNARY_OP, 0, [cond, then_])
+        return self.add(NodeKind.TERNARY_OP, 0, [cond, then_, else_])
+
+    def while_statement(self, cond: int, body: int) -> int:
+        return self.add(NodeKind.WHILE_STATEMENT, 0, [cond, body])
+
+    def block(self, statements: list[int], result_expression: int) -> int:
+        return self.add(NodeKind.BLOCK, 0, [*statements, result_expression])
+
+    def variable(self, identifier: int, initializer: int) -> int:
+        return self.add(NodeKind.VARIABLE, 0, [identifier, initializer])
+
+    def is_identifier(self, node: int) -> bool:
+        return self.kinds[node] == NodeKind.IDENTIFIER
+
+    # === Conversion ===
+
+    def add_tree(self, expression: ast.Expression) -> int:
+        """Copies a `custom_ast` tree into the arena and returns its root id."""
+        results: list[int] = []
+        # (node, True) once its children have been added.
+        work: list[tuple[Any, bool]] = [(expression, False)]
+        while work:
+            node, children_done = work.pop()
+            if not children_done:
+                work.append((node, True))
+                work.extend((child, False) for child in reversed(ast_children(node)))
+                continue
+            child_count = len(ast_children(node))
+            children = results[len(results) - child_count :]
+            del results[len(results) - child_count :]
+            if isinstance(node, ast.Literal):
+                results.append(self.literal(node.value))
+            elif isinstance(node, ast.Identifier):
+                results.append(self.identifier(node.name))
+            elif isinstance(node, ast.FunctionCall):
+                results.append(
+                    self.function_call(
+                        children[0], None if node.args is None else children[1:]
+                    )
+                )
+            elif isinstance(node, ast.UnaryOp):
+                results.append(self.unary_op(self.operator(node.op.symbol), *children))
+            elif isinstance(node, ast.BinaryOp):
+                assert isinstance(node.op, ast.Operator)
+                results.append(
+                    self.binary_op(children[0], self.operator(node.op.symbol), children[1])
+                )
+            elif isinstance(node, ast.TernaryOp):
+                results.append(self.ternary_op(*children))
+            elif isinstance(node, ast.WhileStatement):
+                results.append(self.while_statement(*children))
+            elif isinstance(node, ast.Block):
+                results.append(self.block(children[:-1], children[-1]))
+            elif isinstance(node, ast.Variable):
+                results.append(self.variable(*children))
+            else:
+                raise Exception(f"Cannot store {type(node).__name__} in an arena")
+        return results[0]
+
+    def to_ast(self, root: int) -> ast.Expression:
+        """Builds the `custom_ast` tree of the subtree rooted at `root`."""
+        start = self.subtree_starts[root]
+        built: list[Any] = []
+        kinds, payloads = self.kinds, self.payloads
+        for node in range(start, root + 1):
+            kind = kinds[node]
+            children = [built[child - start] for child in self.children_of(node)]
+            if kind == NodeKind.LITERAL:
+                value = self.constants[payloads[node]]
+                if value is None:
+                    built.append(ast.NONE_LITERAL)
+                elif value is True:
+                    built.append(ast.TRUE_LITERAL)
+                elif value is False:
+                    built.append(ast.FALSE_LITERAL)
+                else:
+                    built.append(ast.Literal(value))
+            elif kind == NodeKind.IDENTIFIER:
+                built.append(ast.Identifier(self.strings[payloads[node]]))
+            elif kind == NodeKind.FUNCTION_CALL:
+                args = children[1:] if payloads[node] else None
+                built.append(ast.FunctionCall(children[0], args))
+            elif kind == NodeKind.UNARY_OP:
+                op = ast.operator(self.strings[payloads[node]])
+                built.append(ast.UnaryOp(op, children[0]))
+            elif kind == NodeKind.BINARY_OP:
+                op = ast.operator(self.strings[payloads[node]])
+                built.append(ast.BinaryOp(children[0], op, children[1]))
+            elif kind == NodeKind.TERNARY_OP:
+                built.append(ast.TernaryOp(*children))
+            elif kind == NodeKind.WHILE_STATEMENT:
+                built.append(ast.WhileStatement(*children))
+            elif kind == NodeKind.BLOCK:
+                built.append(ast.Block(children[:-1], children[-1]))
+            else:
+                built.append(ast.Variable(*children))
+        return built[-1]
+
+
+def ast_children(node: ast.Expression) -> list[ast.Expression]:
+    """Child nodes of `node` in the order the arena stores them."""
+    if isinstance(node, ast.FunctionCall):
+        return [node.function_name, *(node.args or [])]
+    if isinstance(node, ast.UnaryOp):
+        return [node.right]
+    if isinstance(node, ast.BinaryOp):
+        return [node.left, node.right]
+    if isinstance(node, ast.TernaryOp):
+        if node.else_ is None:
+            return [node.cond, node.then_]
+        return [node.cond, node.then_, node.else_]
+    if isinstance(node, ast.WhileStatement):
+        return [node.cond, node.body]
+    if isinstance(node, ast.Block):
+        return [*node.statements, node.result_expression]
+    if isinstance(node, ast.Variable):
+        return [node.identifier, node.initializer]
+    return []
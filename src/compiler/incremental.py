@@ -0,0 +1,387 @@
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from typing import Any, NamedTuple
+
+import compiler.custom_ast as ast
+from compiler.flat_ast import ast_children
+from compiler.optimizer import with_children
+from compiler.parser import PrattParser
+from compiler.tokenizer import Token, TokenKind, tokenize_line, tokenizer
+
+# Nodes that can be in a tree many times, so they cannot be found by identity.
+SHARED_NODES = (ast.NONE_LITERAL, ast.TRUE_LITERAL, ast.FALSE_LITERAL)
+
+
+class Edit(NamedTuple):
+    """Replaces `removed` characters at `offset` of the source with `inserted`."""
+
+    offset: int
+    removed: int
+    inserted: str
+
+
+@dataclass
+class Span:
+    """A block or parenthesized expression of the tree: the indices of its
+    opening and closing bracket tokens and its node.
+
+    `parent` is the smallest span around it, or None at the top level, and
+    `route` the child indices leading from the parent's node, or the root,
+    to `node`. The positions are as they were after `epoch` shifts of the
+    `ParsedSource`, see `Shifts`."""
+
+    start: int
+    end: int
+    node: ast.Expression
+    parent: "Span | None" = field(default=None, compare=False, repr=False)
+    route: tuple[int, ...] = field(default=(), compare=False, repr=False)
+    epoch: int = field(default=0, compare=False, repr=False)
+
+
+class Shifts:
+    """Shifts of positions by edits, applied to a stored position when it is
+    read instead of to every position after the edit.
+
+    A shift `(boundary, amount)` moves the positions from `boundary` on, as
+    they were when it was recorded. A position stored at epoch `e` has
+    moved by all shifts recorded since, `shifts[e:]`."""
+
+    def __init__(self) -> None:
+        self.shifts: list[tuple[int, int]] = []
+
+    @property
+    def epoch(self) -> int:
+        return len(self.shifts)
+
+    def add(self, boundary: int, amount: int) -> None:
+        self.shifts.append((boundary, amount))
+
+    def current(self, position: int, epoch: int) -> int:
+        for boundary, amount in self.shifts[epoch:]:
+            if position >= boundary:
+                position += amount
+        return position
+
+    def offsets(self) -> list[tuple[list[int], list[int]]]:
+        """For each epoch, what `current` adds to a position as a piecewise
+        constant function: `(thresholds, amounts)`, where a position `p` moves
+        by `amounts[bisect_right(thresholds, p)]`."""
+        thresholds: list[int] = []
+        amounts = [0]
+        result = [(thresholds, amounts)]
+        # Epochs from the last one back, each adding its shift in front.
+        for boundary, amount in reversed(self.shifts):
+            low = bisect_left(thresholds, boundary)
+            high = bisect_right(thresholds, boundary + amount)
+            thresholds = [
+                *thresholds[:low], boundary, *(t - amount for t in thresholds[high:])
+            ]
+            amounts = [*amounts[: low + 1], *(a + amount for a in amounts[high:])]
+            result.append((thresholds, amounts))
+        result.reverse()
+        return result
+
+
+# Pending shifts after which they are applied to all tokens and spans.
+MAX_PENDING_SHIFTS = 32
+
+
+class ParsedSource:
+    """A source with its tokens and tree, kept so the tree can be updated
+    after edits with `apply`. `spans` lists the blocks and parenthesized
+    expressions of the tree, ordered by their first token.
+
+    Edits record how they move the token lines and span positions after
+    them, and the tokens and spans are brought up to date in one pass when
+    they are read, or once `MAX_PENDING_SHIFTS` shifts are pending."""
+
+    def __init__(
+        self, source: str, tokens: list[Token], tree: ast.Expression | None, spans: list[Span]
+    ) -> None:
+        self.source = source
+        self.tree = tree
+        self._tokens = tokens
+        self._spans = spans
+        # Epochs of the token lines in `line_shifts`.
+        self._token_epochs = [0] * len(tokens)
+        self.line_shifts = Shifts()
+        self.span_shifts = Shifts()
+
+    @property
+    def tokens(self) -> list[Token]:
+        self.apply_shifts()
+        return self._tokens
+
+    @property
+    def spans(self) -> list[Span]:
+        self.apply_shifts()
+        return self._spans
+
+    def apply(self, edit: Edit) -> None:
+        """Applies `edit` to the source and updates the tokens and tree.
+
+        Only the lines the edit touches are tokenized again, and only the
+        smallest block or parenthesized expression that contains all changed
+        tokens is parsed again. The new subtree is spliced into a copy of the
+        path from the root, and all other nodes are reused. Token and span
+        lists are updated in place, but the old tree is not modified.
+
+        Apart from copying the source string and splicing the token and span
+        lists, the work grows with the edited lines, the reparsed subtree and
+        the depth of the tree, not with the size of the source. The shifted
+        positions after the edit are applied later, see `ParsedSource`.
+
+        Edits that change the bracket structure around them are parsed in
+        full. If the edited source does not parse, this raises the error
+        `parse` would and nothing is changed."""
+        source = self.source
+        offset, removed, inserted = edit
+        if offset < 0 or removed < 0 or offset + removed > len(source):
+            raise Exception(f"Edit {edit} is outside of the source")
+        new_source = source[:offset] + inserted + source[offset + removed :]
+
+        # Tokens never span lines, so retokenizing the lines of the edit is enough.
+        first = source.rfind("\n", 0, offset) + 1
+        old_last = source.find("\n", offset + removed)
+        if old_last == -1:
+            old_last = len(source)
+        new_last = old_last + len(inserted) - removed
+        first_line = source.count("\n", 0, first) + 1
+        last_line = first_line + source.count("\n", first, old_last)
+        line_shift = inserted.count("\n") - source.count("\n", offset, offset + removed)
+
+        tokens = self._tokens
+        token_indices = range(len(tokens))
+        old_start = bisect_left(token_indices, first_line, key=self.token_line)
+        old_end = bisect_right(token_indices, last_line, lo=old_start, key=self.token_line)
+        new = tokenize_line(new_source[first:new_last], first_line)
+
+        # Tokens the edit only moved do not count as changed.
+        common = min(old_end - old_start, len(new))
+        prefix = 0
+        while prefix < common and tokens[old_start + prefix].text == new[prefix].text:
+            prefix += 1
+        suffix = 0
+        while (
+            suffix < common - prefix
+            and tokens[old_end - 1 - suffix].text == new[len(new) - 1 - suffix].text
+        ):
+            suffix += 1
+        changed_start = old_start + prefix
+        changed_end = old_end - suffix
+        shift = len(new) - (old_end - old_start)
+
+        spans = self._spans
+        tree = self.tree
+        if changed_start != changed_end or shift != 0:
+            target = self.enclosing_span(changed_start, changed_end)
+            if tree is None or target is None:
+                self.replace(parse_source(new_source))
+                return
+            # Tokens of the target in the edited token list, which continues
+            # after the new tokens with the old tokens from `old_end` on.
+            start = self.span_start(target)
+            end = self.span_end(target) + shift + 1
+            new_end = old_start + len(new)
+            part = (
+                tokens[start : min(end, old_start)]
+                + new[max(start - old_start, 0) : max(end - old_start, 0)]
+                + tokens[max(start, new_end) - shift : end - shift]
+            )
+            parser = SpanParser(part, start)
+            node: ast.Expression
+            try:
+                if part[0].kind == TokenKind.LEFT_BRACE:
+                    node = parser.parse_block()
+                else:
+                    node = parser.parse_parenthesized()
+            except Exception:
+                self.replace(parse_source(new_source))
+                return
+            # The edit moved the closing bracket, or turned the left side of
+            # an assignment into something that is not an identifier or the
+            # other way around, which the enclosing expression has to check.
+            if parser.pos != len(part) or (type(node) is ast.Identifier) != (
+                type(target.node) is ast.Identifier
+            ):
+                self.replace(parse_source(new_source))
+                return
+
+            for root in parser.roots:
+                root.parent = target.parent
+                root.route = target.route
+            span: Span | None = target
+            while span is not None:
+                parent = span.parent
+                node = splice(tree if parent is None else parent.node, span.route, node)
+                if parent is not None:
+                    parent.node = node
+                span = parent
+            tree = node
+
+            span_indices = range(len(spans))
+            index = bisect_left(span_indices, start, key=self.span_start_at)
+            after = bisect_right(span_indices, end - shift - 1, lo=index, key=self.span_start_at)
+            if shift:
+                self.span_shifts.add(changed_end, shift)
+            new_spans = parser.sorted_spans()
+            for span in new_spans:
+                span.epoch = self.span_shifts.epoch
+            spans[index:after] = new_spans
+
+        if line_shift:
+            self.line_shifts.add(last_line + 1, line_shift)
+        tokens[old_start:old_end] = new
+        self._token_epochs[old_start:old_end] = [self.line_shifts.epoch] * len(new)
+        self.source = new_source
+        self.tree = tree
+        if self.line_shifts.epoch + self.span_shifts.epoch > MAX_PENDING_SHIFTS:
+            self.apply_shifts()
+
+    def token_line(self, index: int) -> int:
+        return self.line_shifts.current(
+            self._tokens[index].location.line, self._token_epochs[index]
+        )
+
+    def span_start(self, span: Span) -> int:
+        return self.span_shifts.current(span.start, span.epoch)
+
+    def span_end(self, span: Span) -> int:
+        return self.span_shifts.current(span.end, span.epoch)
+
+    def span_start_at(self, index: int) -> int:
+        return self.span_start(self._spans[index])
+
+    def enclosing_span(self, start: int, end: int) -> Span | None:
+        """The smallest span with the tokens `start` to `end`, not counting
+        its own brackets. Spans are nested, so it is the span that starts last
+        before `start` or one of the spans around that."""
+        index = bisect_left(range(len(self._spans)), start, key=self.span_start_at) - 1
+        span = self._spans[index] if index >= 0 else None
+        while span is not None and self.span_end(span) < end:
+            span = span.parent
+        return span
+
+    def apply_shifts(self) -> None:
+        """Moves all token lines and span positions by the pending shifts."""
+        if self.line_shifts.epoch:
+            offsets = self.line_shifts.offsets()
+            for token, epoch in zip(self._tokens, self._token_epochs):
+                thresholds, amounts = offsets[epoch]
+                token.location.line += amounts[bisect_right(thresholds, token.location.line)]
+            self._token_epochs = [0] * len(self._tokens)
+            self.line_shifts = Shifts()
+        if self.span_shifts.epoch:
+            offsets = self.span_shifts.offsets()
+            for span in self._spans:
+                thresholds, amounts = offsets[span.epoch]
+                span.start += amounts[bisect_right(thresholds, span.start)]
+                span.end += amounts[bisect_right(thresholds, span.end)]
+                span.epoch = 0
+            self.span_shifts = Shifts()
+
+    def replace(self, other: "ParsedSource") -> None:
+        self.source = other.source
+        self.tree = other.tree
+        self._tokens = other._tokens
+        self._spans = other._spans
+        self._token_epochs = other._token_epochs
+        self.line_shifts = other.line_shifts
+        self.span_shifts = other.span_shifts
+
+
+class SpanParser(PrattParser):
+    """Parser that records the `Span` of every block and parenthesized
+    expression it parses. `offset` is the index of the first token in the
+    whole token list. `roots` are the spans not inside another one."""
+
+    def __init__(self, tokens: list[Token], offset: int = 0) -> None:
+        super().__init__(tokens)
+        self.offset = offset
+        self.spans: list[Span] = []
+        # The spans found inside each span being parsed, the top level first.
+        self.children: list[list[Span]] = [[]]
+
+    @property
+    def roots(self) -> list[Span]:
+        return self.children[0]
+
+    def parse_block(self) -> ast.Block:
+        start = self.pos
+        self.children.append([])
+        node = super().parse_block()
+        self.record(start, node)
+        return node
+
+    def parse_parenthesized(self) -> ast.Expression:
+        start = self.pos
+        self.children.append([])
+        node = super().parse_parenthesized()
+        if all(node is not shared for shared in SHARED_NODES):
+            self.record(start, node)
+        else:
+            children = self.children.pop()
+            self.children[-1].extend(children)
+        return node
+
+    def record(self, start: int, node: ast.Expression) -> None:
+        span = Span(self.offset + start, self.offset + self.pos - 1, node)
+        children = self.children.pop()
+        for child in children:
+            child.parent = span
+        find_routes(node, children)
+        self.children[-1].append(span)
+        self.spans.append(span)
+
+    def sorted_spans(self) -> list[Span]:
+        # Spans are recorded when their node is finished, inner ones first.
+        return sorted(self.spans, key=span_start)
+
+
+def parse_source(source: str) -> ParsedSource:
+    """Tokenizes and parses `source` in full."""
+    tokens = tokenizer(source)
+    parser = SpanParser(tokens)
+    tree = parser.parse()  # type: ignore[no-untyped-call]
+    if tree is not None:
+        find_routes(tree, parser.roots)
+    return ParsedSource(source, tokens, tree, parser.sorted_spans())
+
+
+def span_start(span: Span) -> int:
+    return span.start
+
+
+def find_routes(root: ast.Expression, spans: list[Span]) -> None:
+    """Sets the `route` from `root` of each of `spans`, which are inside
+    `root` but not inside each other."""
+    wanted = {id(span.node): span for span in spans}
+    # Entries are (node, child index, entry of its parent), so routes share
+    # their prefixes.
+    work: list[tuple[ast.Expression, int, Any]] = [(root, -1, None)]
+    while work and wanted:
+        entry = work.pop()
+        span = wanted.pop(id(entry[0]), None)
+        if span is None:
+            work.extend((child, i, entry) for i, child in enumerate(ast_children(entry[0])))
+            continue
+        route = []
+        while entry[2] is not None:
+            route.append(entry[1])
+            entry = entry[2]
+        route.reverse()
+        span.route = tuple(route)
+
+
+def splice(
+    root: ast.Expression, route: tuple[int, ...], replacement: ast.Expression
+) -> ast.Expression:
+    """Copy of `root` with the node at the end of `route` replaced."""
+    path = [root]
+    for i in route[:-1]:
+        path.append(ast_children(path[-1])[i])
+    for node, i in zip(reversed(path), reversed(route)):
+        children = ast_children(node)
+        children[i] = replacement
+        replacement = with_children(node, children)
+    return replacement
@@ -0,0 +1,334 @@
+import operator
+import sys
+from collections.abc import Callable
+from typing import Any
+
+import compiler.custom_ast as ast
+
+Value = int | bool | None
+Closure = Callable[[], Any]
+
+# Ints are signed 64-bit values that wrap around on overflow, like the
+# compiled programs' arithmetic.
+INT_MIN = -(1 << 63)
+INT_MAX = (1 << 63) - 1
+
+
+def wrap_int(value: int) -> int:
+    return (value - INT_MIN) % (1 << 64) + INT_MIN
+
+
+def add(a: int, b: int) -> int:
+    result = a + b
+    return result if INT_MIN <= result <= INT_MAX else wrap_int(result)
+
+
+def subtract(a: int, b: int) -> int:
+    result = a - b
+    return result if INT_MIN <= result <= INT_MAX else wrap_int(result)
+
+
+def multiply(a: int, b: int) -> int:
+    result = a * b
+    return result if INT_MIN <= result <= INT_MAX else wrap_int(result)
+
+
+# The Python operators of the arithmetic that can overflow.
+OVERFLOWING_OPERATORS: dict[str, Callable[[Any, Any], Any]] = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+}
+
+
+def negate(a: int) -> int:
+    return -a if a != INT_MIN else a
+
+
+def divide(a: int, b: int) -> int:
+    # Integer division and remainder truncate towards zero, like the CPU does.
+    quotient = abs(a) // abs(b)
+    return quotient if (a < 0) == (b < 0) else -quotient
+
+
+def remainder(a: int, b: int) -> int:
+    result = abs(a) % abs(b)
+    return -result if a < 0 else result
+
+
+BINARY_OPERATORS: dict[str, Callable[[Any, Any], Any]] = {
+    "+": add,
+    "-": subtract,
+    "*": multiply,
+    "/": divide,
+    "%": remainder,
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+
+def print_int(value: int) -> None:
+    print(value)
+
+
+def print_bool(value: bool) -> None:
+    print("true" if value else "false")
+
+
+def read_int() -> int:
+    line = sys.stdin.readline()
+    if not line:
+        raise Exception("read_int: end of input")
+    return int(line)
+
+
+BUILTINS: dict[str, Callable[..., Value]] = {
+    "print_int": print_int,
+    "print_bool": print_bool,
+    "read_int": read_int,
+}
+
+
+class ClosureCompiler:
+    """Compiles an AST into a tree of Python closures that evaluate it.
+
+    All decisions that a tree walker makes on every visit are made once here:
+    the node type selects the closure, operators are resolved to functions,
+    and variables are resolved to indices in a single `frame` list shared by
+    all closures of the program. The language has no user-defined functions,
+    so one frame holds every variable, each declaration getting its own slot."""
+
+    def __init__(self, builtins: dict[str, Callable[..., Value]] = BUILTINS) -> None:
+        self.frame: list[Value] = []
+        self.scopes: list[dict[str, int]] = [{}]
+        self.builtins = builtins
+
+    def declare(self, name: str) -> int:
+        scope = self.scopes[-1]
+        if name in scope:
+            raise Exception(f'Variable "{name}" is already declared in this block')
+        slot = scope[name] = len(self.frame)
+        self.frame.append(None)
+        return slot
+
+    def slot(self, name: str) -> int:
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        raise Exception(f'Undefined variable "{name}"')
+
+    def compile(self, node: ast.Expression) -> Closure:
+        if isinstance(node, ast.Literal):
+            value = node.value
+            if type(value) is int:
+                value = wrap_int(value)
+            return lambda: value
+        if isinstance(node, ast.Identifier):
+            return self.compile_identifier(node)
+        if isinstance(node, ast.BinaryOp):
+            return self.compile_binary_op(node)
+        if isinstance(node, ast.UnaryOp):
+            return self.compile_unary_op(node)
+        if isinstance(node, ast.TernaryOp):
+            return self.compile_ternary_op(node)
+        if isinstance(node, ast.WhileStatement):
+            return self.compile_while(node)
+        if isinstance(node, ast.Block):
+            return self.compile_block(node)
+        if isinstance(node, ast.Variable):
+            return self.compile_variable(node)
+        if isinstance(node, ast.FunctionCall):
+            return self.compile_function_call(node)
+        raise Exception(f"Cannot interpret {type(node).__name__}")
+
+    def compile_identifier(self, node: ast.Identifier) -> Closure:
+        frame = self.frame
+        slot = self.slot(node.name)
+        return lambda: frame[slot]
+
+    def compile_binary_op(self, node: ast.BinaryOp) -> Closure:
+        assert isinstance(node.op, ast.Operator)
+        symbol = node.op.symbol
+        if symbol == "=":
+            return self.compile_assignment(node)
+        left = self.compile(node.left)
+        right = self.compile(node.right)
+        if symbol == "and":
+            return lambda: left() and right()
+        if symbol == "or":
+            return lambda: left() or right()
+        if symbol not in BINARY_OPERATORS:
+            raise Exception(f'Unknown operator "{symbol}"')
+        if symbol in OVERFLOWING_OPERATORS:
+            return self.compile_overflowing_op(node, OVERFLOWING_OPERATORS[symbol], left, right)
+        op = BINARY_OPERATORS[symbol]
+
+        # Specialized forms of the most common operand shapes in loops save
+        # one or two closure calls per evaluation.
+        frame = self.frame
+        if isinstance(node.right, ast.Literal):
+            constant = node.right.value
+            if type(constant) is int:
+                constant = wrap_int(constant)
+            if isinstance(node.left, ast.Identifier):
+                slot = self.slot(node.left.name)
+                return lambda: op(frame[slot], constant)
+            return lambda: op(left(), constant)
+        if isinstance(node.left, ast.Identifier) and isinstance(node.right, ast.Identifier):
+            left_slot = self.slot(node.left.name)
+            right_slot = self.slot(node.right.name)
+            return lambda: op(frame[left_slot], frame[right_slot])
+        return lambda: op(left(), right())
+
+    def compile_overflowing_op(
+        self, node: ast.BinaryOp, op: Callable[[Any, Any], Any], left: Closure, right: Closure
+    ) -> Closure:
+        # Like the operators of `BINARY_OPERATORS`, with the overflow check
+        # inlined into the closure instead of calling another function.
+        frame = self.frame
+        if isinstance(node.right, ast.Literal) and isinstance(node.left, ast.Identifier):
+            slot = self.slot(node.left.name)
+            constant = node.right.value
+            if type(constant) is int:
+                constant = wrap_int(constant)
+
+            def slot_and_constant() -> Any:
+                result = op(frame[slot], constant)
+                return result if INT_MIN <= result <= INT_MAX else wrap_int(result)
+
+            return slot_and_constant
+        if isinstance(node.left, ast.Identifier) and isinstance(node.right, ast.Identifier):
+            left_slot = self.slot(node.left.name)
+            right_slot = self.slot(node.right.name)
+
+            def slots() -> Any:
+                result = op(frame[left_slot], frame[right_slot])
+                return result if INT_MIN <= result <= INT_MAX else wrap_int(result)
+
+            return slots
+
+        def operands() -> Any:
+            result = op(left(), right())
+            return result if INT_MIN <= result <= INT_MAX else wrap_int(result)
+
+        return operands
+
+    def compile_assignment(self, node: ast.BinaryOp) -> Closure:
+        if not isinstance(node.left, ast.Identifier):
+            raise Exception("Left side of an assignment must be a variable")
+        frame = self.frame
+        slot = self.slot(node.left.name)
+        value = self.compile(node.right)
+
+        def assign() -> Any:
+            frame[slot] = result = value()
+            return result
+
+        return assign
+
+    def compile_unary_op(self, node: ast.UnaryOp) -> Closure:
+        right = self.compile(node.right)
+        if node.op.symbol == "not":
+            return lambda: not right()
+        if node.op.symbol == "-":
+            return lambda: negate(right())
+        raise Exception(f'Unknown operator "{node.op.symbol}"')
+
+    def compile_ternary_op(self, node: ast.TernaryOp) -> Closure:
+        cond = self.compile(node.cond)
+        then_ = self.compile(node.then_)
+        if node.else_ is None:
+
+            def if_then() -> None:
+                if cond():
+                    then_()
+
+            return if_then
+        else_ = self.compile(node.else_)
+        return lambda: then_() if cond() else else_()
+
+    def compile_while(self, node: ast.WhileStatement) -> Closure:
+        cond = self.compile(node.cond)
+        body = self.compile(node.body)
+
+        def loop() -> None:
+            while cond():
+                body()
+
+        return loop
+
+    def compile_block(self, node: ast.Block) -> Closure:
+        self.scopes.append({})
+        try:
+            statements = tuple(self.compile(s) for s in node.statements)
+            result = self.compile(node.result_expression)
+        finally:
+            self.scopes.pop()
+        if not statements:
+            return result
+        if len(statements) == 1:
+            (statement,) = statements
+
+            def block_1() -> Any:
+                statement()
+                return result()
+
+            return block_1
+
+        def block() -> Any:
+            for statement in statements:
+                statement()
+            return result()
+
+        return block
+
+    def compile_variable(self, node: ast.Variable) -> Closure:
+        # The initializer cannot see the variable it initializes.
+        initializer = self.compile(node.initializer)
+        frame = self.frame
+        slot = self.declare(node.identifier.name)
+
+        def declare() -> None:
+            frame[slot] = initializer()
+
+        return declare
+
+    def compile_function_call(self, node: ast.FunctionCall) -> Closure:
+        name = node.function_name.name
+        if name not in self.builtins:
+            raise Exception(f'Unknown function "{name}"')
+        function = self.builtins[name]
+        args = tuple(self.compile(arg) for arg in node.args or [])
+        if not args:
+            return function
+        if len(args) == 1:
+            (arg,) = args
+            return lambda: function(arg())
+        return lambda: function(*[arg() for arg in args])
+
+
+def compile_closures(
+    tree: ast.Expression, builtins: dict[str, Callable[..., Value]] = BUILTINS
+) -> Closure:
+    """Returns a function that runs the program `tree` and returns its value."""
+    compiler = ClosureCompiler(builtins)
+    run = compiler.compile(tree)
+    frame = compiler.frame
+    initial_frame = list(frame)
+
+    def run_program() -> Value:
+        frame[:] = initial_frame
+        result: Value = run()
+        return result
+
+    return run_program
+
+
+def interpret(
+    tree: ast.Expression, builtins: dict[str, Callable[..., Value]] = BUILTINS
+) -> Value:
+    return compile_closures(tree, builtins)()
@@ -0,0 +1,437 @@
+from array import array
+from enum import IntEnum
+
+import compiler.custom_ast as ast
+from compiler.flat_ast import ast_children
+
+
+class Op(IntEnum):
+    CONST = 0  # dst = constants[a]
+    COPY = 1  # dst = a
+    ADD = 2  # dst = a + b, and so on for the other binary operators
+    SUB = 3
+    MUL = 4
+    DIV = 5
+    MOD = 6
+    EQ = 7
+    NE = 8
+    LT = 9
+    LE = 10
+    GT = 11
+    GE = 12
+    NEG = 13  # dst = -a
+    NOT = 14  # dst = not a
+    JUMP = 15  # goto a
+    JUMP_IF_FALSE = 16  # if not a: goto b
+    JUMP_IF_TRUE = 17  # if a: goto b
+    CALL = 18  # dst = functions[a](*arguments[b])
+    RETURN = 19  # return a
+
+
+BINARY_OPS = {
+    "+": Op.ADD,
+    "-": Op.SUB,
+    "*": Op.MUL,
+    "/": Op.DIV,
+    "%": Op.MOD,
+    "==": Op.EQ,
+    "!=": Op.NE,
+    "<": Op.LT,
+    "<=": Op.LE,
+    ">": Op.GT,
+    ">=": Op.GE,
+}
+COMPARISON_OPS = frozenset([Op.EQ, Op.NE, Op.LT, Op.LE, Op.GT, Op.GE])
+# Instructions that do not write their `dst` field.
+NO_DESTINATION_OPS = frozenset([Op.JUMP, Op.JUMP_IF_FALSE, Op.JUMP_IF_TRUE, Op.RETURN])
+JUMP_OPS = frozenset([Op.JUMP, Op.JUMP_IF_FALSE, Op.JUMP_IF_TRUE])
+TWO_SOURCE_OPS = frozenset(BINARY_OPS.values())
+ONE_SOURCE_OPS = frozenset(
+    [Op.COPY, Op.NEG, Op.NOT, Op.JUMP_IF_FALSE, Op.JUMP_IF_TRUE, Op.RETURN]
+)
+
+# Static types of values, as far as lowering can tell without a type checker.
+INT = "Int"
+BOOL = "Bool"
+UNIT = "Unit"
+UNKNOWN = "Unknown"
+
+BUILTIN_TYPES = {
+    "print_int": UNIT,
+    "print_bool": UNIT,
+    "read_int": INT,
+}
+
+
+class IrProgram:
+    """A program as a flat list of three-address instructions.
+
+    Instruction `i` is `ops[i]` with operands `dsts[i]`, `srcs_a[i]` and
+    `srcs_b[i]`, stored in parallel arrays. Operands are register numbers,
+    except for constant, function, argument list and jump target indices as
+    noted on `Op`. Registers are virtual and unlimited: every variable
+    declaration and every temporary gets its own, and each distinct constant
+    lives in a register of its own that is initialized before the program
+    starts, so loops do not reload constants."""
+
+    def __init__(self) -> None:
+        self.ops = array("B")
+        self.dsts = array("i")
+        self.srcs_a = array("i")
+        self.srcs_b = array("i")
+        self.constants: list[int | bool | None] = []
+        self.functions: list[str] = []
+        self.arguments: list[tuple[int, ...]] = []
+        self.register_names: list[str] = []
+        self.register_types: list[str] = []
+        # Registers that hold a constant, given as (register, constant index).
+        # They are set before the first instruction runs and never written.
+        self.constant_registers: list[tuple[int, int]] = []
+        self.result_type = UNIT
+
+    def __len__(self) -> int:
+        return len(self.ops)
+
+    def instruction(self, index: int) -> tuple[Op, int, int, int]:
+        return Op(self.ops[index]), self.dsts[index], self.srcs_a[index], self.srcs_b[index]
+
+    def sources(self, index: int) -> tuple[int, ...]:
+        """Registers read by instruction `index`."""
+        op = self.ops[index]
+        if op in TWO_SOURCE_OPS:
+            return self.srcs_a[index], self.srcs_b[index]
+        if op in ONE_SOURCE_OPS:
+            return (self.srcs_a[index],)
+        if op == Op.CALL:
+            return self.arguments[self.srcs_b[index]]
+        return ()
+
+    def read_counts(self) -> list[int]:
+        """How many instructions read each register."""
+        counts = [0] * len(self.register_names)
+        for i in range(len(self.ops)):
+            for register in self.sources(i):
+                counts[register] += 1
+        return counts
+
+    def jump_targets(self) -> list[int]:
+        return sorted(
+            {
+                self.srcs_a[i] if self.ops[i] == Op.JUMP else self.srcs_b[i]
+                for i in range(len(self.ops))
+                if self.ops[i] in JUMP_OPS
+            }
+        )
+
+    def dump(self) -> str:
+        """Human-readable listing of the program."""
+        labels = {target: f"L{n}" for n, target in enumerate(self.jump_targets())}
+        names = self.register_names
+        lines = [
+            f"    {names[register]} = const {format_constant(self.constants[constant])}"
+            for register, constant in self.constant_registers
+        ]
+        for i in range(len(self.ops) + 1):
+            if i in labels:
+                lines.append(f"{labels[i]}:")
+            if i == len(self.ops):
+                break
+            op, dst, a, b = self.instruction(i)
+            if op == Op.CONST:
+                text = f"{names[dst]} = const {format_constant(self.constants[a])}"
+            elif op == Op.COPY:
+                text = f"{names[dst]} = copy {names[a]}"
+            elif op in (Op.NEG, Op.NOT):
+                text = f"{names[dst]} = {op.name.lower()} {names[a]}"
+            elif op == Op.JUMP:
+                text = f"jump {labels[a]}"
+            elif op in (Op.JUMP_IF_FALSE, Op.JUMP_IF_TRUE):
+                text = f"{op.name.lower()} {names[a]}, {labels[b]}"
+            elif op == Op.CALL:
+                args = ", ".join(names[r] for r in self.arguments[b])
+                text = f"{names[dst]} = call {self.functions[a]}({args})"
+            elif op == Op.RETURN:
+                text = f"return {names[a]}"
+            else:
+                text = f"{names[dst]} = {op.name.lower()} {names[a]}, {names[b]}"
+            lines.append(f"    {text}")
+        return "\n".join(lines) + "\n"
+
+
+def format_constant(value: int | bool | None) -> str:
+    if value is None:
+        return "unit"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+class Lowering:
+    """Translates an AST into an `IrProgram`.
+
+    Variables are resolved to registers here, with the same scoping rules and
+    errors as the interpreter."""
+
+    def __init__(self) -> None:
+        self.program = IrProgram()
+        self.scopes: list[dict[str, int]] = [{}]
+        self.constant_ids: dict[tuple[type, int | bool | None], int] = {}
+        self.function_ids: dict[str, int] = {}
+        self.temp_count = 0
+        self.variable_registers: set[int] = set()
+        self.declaration_counts: dict[str, int] = {}
+        self.constant_registers: dict[int, int] = {}
+        # Ids of subtrees that contain an assignment, see `snapshot`.
+        self.assigning: set[int] = set()
+
+    def emit(self, op: Op, dst: int = 0, a: int = 0, b: int = 0) -> int:
+        program = self.program
+        program.ops.append(op)
+        program.dsts.append(dst)
+        program.srcs_a.append(a)
+        program.srcs_b.append(b)
+        return len(program.ops) - 1
+
+    def patch_target(self, instruction: int, target: int) -> None:
+        if self.program.ops[instruction] == Op.JUMP:
+            self.program.srcs_a[instruction] = target
+        else:
+            self.program.srcs_b[instruction] = target
+
+    def here(self) -> int:
+        return len(self.program.ops)
+
+    def new_register(self, name: str, type: str) -> int:
+        self.program.register_names.append(name)
+        self.program.register_types.append(type)
+        return len(self.program.register_names) - 1
+
+    def new_temp(self, type: str = UNKNOWN) -> int:
+        self.temp_count += 1
+        return self.new_register(f"t{self.temp_count}", type)
+
+    def constant(self, value: int | bool | None) -> int:
+        # Keyed by type too, because 1 and True are equal dictionary keys.
+        key = (type(value), value)
+        if key not in self.constant_ids:
+            self.constant_ids[key] = len(self.program.constants)
+            self.program.constants.append(value)
+        return self.constant_ids[key]
+
+    def load_constant(self, value: int | bool | None) -> int:
+        constant = self.constant(value)
+        register = self.constant_registers.get(constant)
+        if register is None:
+            if value is None:
+                register = self.new_register("unit", UNIT)
+            else:
+                register = self.new_temp(BOOL if isinstance(value, bool) else INT)
+            self.constant_registers[constant] = register
+            self.program.constant_registers.append((register, constant))
+        return register
+
+    def type_of(self, register: int) -> str:
+        return self.program.register_types[register]
+
+    def new_variable(self, name: str) -> int:
+        # Later declarations of the same name are numbered to keep dumps readable.
+        same_name = self.declaration_counts.get(name, 0)
+        self.declaration_counts[name] = same_name + 1
+        register = self.new_register(name if not same_name else f"{name}.{same_name}", UNKNOWN)
+        self.variable_registers.add(register)
+        return register
+
+    def declare(self, name: str, register: int) -> None:
+        scope = self.scopes[-1]
+        if name in scope:
+            raise Exception(f'Variable "{name}" is already declared in this block')
+        scope[name] = register
+
+    def variable(self, name: str) -> int:
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        raise Exception(f'Undefined variable "{name}"')
+
+    def lower_program(self, tree: ast.Expression) -> IrProgram:
+        self.find_assignments(tree)
+        result = self.lower(tree)
+        self.program.result_type = self.type_of(result)
+        self.emit(Op.RETURN, 0, result)
+        return self.program
+
+    def find_assignments(self, tree: ast.Expression) -> None:
+        work: list[tuple[ast.Expression, bool]] = [(tree, False)]
+        while work:
+            node, children_done = work.pop()
+            children = ast_children(node)
+            if not children_done:
+                work.append((node, True))
+                work.extend((child, False) for child in children)
+                continue
+            if (
+                isinstance(node, ast.BinaryOp)
+                and isinstance(node.op, ast.Operator)
+                and node.op.symbol == "="
+            ) or any(id(child) in self.assigning for child in children):
+                self.assigning.add(id(node))
+
+    def snapshot(self, register: int, later: list[ast.Expression]) -> int:
+        """Copies a variable's value to a temporary if code evaluated later
+        may assign the variable before the value is used."""
+        if register in self.variable_registers and any(
+            id(node) in self.assigning for node in later
+        ):
+            copy = self.new_temp(self.type_of(register))
+            self.emit(Op.COPY, copy, register)
+            return copy
+        return register
+
+    def lower_into(self, node: ast.Expression, dst: int) -> None:
+        """Emits code computing `node` into register `dst`."""
+        value = self.lower(node, dst)
+        if value != dst:
+            self.emit(Op.COPY, dst, value)
+            if self.type_of(dst) == UNKNOWN:
+                self.program.register_types[dst] = self.type_of(value)
+
+    def lower(self, node: ast.Expression, dst: int | None = None) -> int:
+        """Emits code computing `node` and returns the register holding it.
+
+        Operations that are a single instruction write their result straight
+        to `dst` if it is given, which saves a copy into a variable. Anything
+        longer uses a temporary, because `dst` may be read before the last
+        instruction."""
+        if isinstance(node, ast.Literal):
+            return self.load_constant(node.value)
+        if isinstance(node, ast.Identifier):
+            return self.variable(node.name)
+        if isinstance(node, ast.BinaryOp):
+            return self.lower_binary_op(node, dst)
+        if isinstance(node, ast.UnaryOp):
+            operand = self.lower(node.right)
+            if node.op.symbol == "not":
+                op, result_type = Op.NOT, BOOL
+            elif node.op.symbol == "-":
+                op, result_type = Op.NEG, INT
+            else:
+                raise Exception(f'Unknown operator "{node.op.symbol}"')
+            dst = self.result_register(dst, result_type)
+            self.emit(op, dst, operand)
+            return dst
+        if isinstance(node, ast.TernaryOp):
+            return self.lower_ternary_op(node)
+        if isinstance(node, ast.WhileStatement):
+            start = self.here()
+            cond = self.lower(node.cond)
+            exit_jump = self.emit(Op.JUMP_IF_FALSE, 0, cond)
+            self.lower_statement(node.body)
+            self.emit(Op.JUMP, 0, start)
+            self.patch_target(exit_jump, self.here())
+            return self.load_constant(None)
+        if isinstance(node, ast.Block):
+            self.scopes.append({})
+            try:
+                for statement in node.statements:
+                    self.lower_statement(statement)
+                return self.lower(node.result_expression)
+            finally:
+                self.scopes.pop()
+        if isinstance(node, ast.Variable):
+            # The initializer cannot see the variable it initializes, so the
+            # variable is added to the scope afterwards.
+            register = self.new_variable(node.identifier.name)
+            self.lower_into(node.initializer, register)
+            self.declare(node.identifier.name, register)
+            return self.load_constant(None)
+        if isinstance(node, ast.FunctionCall):
+            return self.lower_function_call(node, dst)
+        raise Exception(f"Cannot lower {type(node).__name__}")
+
+    def result_register(self, dst: int | None, type: str) -> int:
+        if dst is None:
+            return self.new_temp(type)
+        if self.type_of(dst) == UNKNOWN:
+            self.program.register_types[dst] = type
+        return dst
+
+    def lower_binary_op(self, node: ast.BinaryOp, dst: int | None) -> int:
+        assert isinstance(node.op, ast.Operator)
+        symbol = node.op.symbol
+        if symbol == "=":
+            if not isinstance(node.left, ast.Identifier):
+                raise Exception("Left side of an assignment must be a variable")
+            register = self.variable(node.left.name)
+            self.lower_into(node.right, register)
+            return register
+        if symbol in ("and", "or"):
+            result = self.new_temp(BOOL)
+            self.lower_into(node.left, result)
+            skip = self.emit(
+                Op.JUMP_IF_FALSE if symbol == "and" else Op.JUMP_IF_TRUE, 0, result
+            )
+            self.lower_into(node.right, result)
+            self.patch_target(skip, self.here())
+            return result
+        if symbol not in BINARY_OPS:
+            raise Exception(f'Unknown operator "{symbol}"')
+        op = BINARY_OPS[symbol]
+        left = self.snapshot(self.lower(node.left), [node.right])
+        right = self.lower(node.right)
+        dst = self.result_register(dst, BOOL if op in COMPARISON_OPS else INT)
+        self.emit(op, dst, left, right)
+        return dst
+
+    def lower_statement(self, node: ast.Expression) -> None:
+        """Emits code for `node` when its value is not used."""
+        if isinstance(node, ast.TernaryOp):
+            self.lower_ternary_op(node, discard=True)
+        else:
+            self.lower(node)
+
+    def lower_ternary_op(self, node: ast.TernaryOp, discard: bool = False) -> int:
+        cond = self.lower(node.cond)
+        else_jump = self.emit(Op.JUMP_IF_FALSE, 0, cond)
+        if node.else_ is None:
+            self.lower_statement(node.then_)
+            self.patch_target(else_jump, self.here())
+            return self.load_constant(None)
+        if discard:
+            self.lower_statement(node.then_)
+            end_jump = self.emit(Op.JUMP)
+            self.patch_target(else_jump, self.here())
+            self.lower_statement(node.else_)
+            self.patch_target(end_jump, self.here())
+            return self.load_constant(None)
+        dst = self.new_temp()
+        then_value = self.lower(node.then_)
+        self.emit(Op.COPY, dst, then_value)
+        end_jump = self.emit(Op.JUMP)
+        self.patch_target(else_jump, self.here())
+        else_value = self.lower(node.else_)
+        self.emit(Op.COPY, dst, else_value)
+        self.patch_target(end_jump, self.here())
+        if self.type_of(then_value) == self.type_of(else_value):
+            self.program.register_types[dst] = self.type_of(then_value)
+        return dst
+
+    def lower_function_call(self, node: ast.FunctionCall, dst: int | None) -> int:
+        name = node.function_name.name
+        if name not in BUILTIN_TYPES:
+            raise Exception(f'Unknown function "{name}"')
+        arg_nodes = node.args or []
+        args = tuple(
+            self.snapshot(self.lower(arg), arg_nodes[i + 1 :])
+            for i, arg in enumerate(arg_nodes)
+        )
+        if name not in self.function_ids:
+            self.function_ids[name] = len(self.program.functions)
+            self.program.functions.append(name)
+        self.program.arguments.append(args)
+        dst = self.result_register(dst, BUILTIN_TYPES[name])
+        self.emit(Op.CALL, dst, self.function_ids[name], len(self.program.arguments) - 1)
+        return dst
+
+
+def lower(tree: ast.Expression) -> IrProgram:
+    return Lowering().lower_program(tree)
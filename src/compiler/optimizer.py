@@ -0,0 +1,238 @@
+import compiler.custom_ast as ast
+from compiler.flat_ast import ast_children
+from compiler.interpreter import BINARY_OPERATORS, negate, wrap_int
+from compiler.stats import count_nodes
+
+ARITHMETIC_OPERATORS = frozenset(["+", "-", "*", "/", "%", "<", "<=", ">", ">="])
+EQUALITY_OPERATORS = frozenset(["==", "!="])
+# Operators whose result is an Int or a Bool whatever their operands are.
+INT_OPERATORS = frozenset(["+", "-", "*", "/", "%"])
+BOOL_OPERATORS = frozenset(["<", "<=", ">", ">=", "==", "!="])
+
+
+def simplify(tree: ast.Expression) -> tuple[ast.Expression, int]:
+    """Folds constants and applies algebraic identities.
+
+    Returns the simplified tree and the number of nodes removed. Subtrees
+    that do not change are shared with the input tree. Nothing with a
+    possible side effect (assignment, declaration or call) is removed, and
+    operations with operands of the wrong type or division by zero are left
+    for later phases to report."""
+    results: list[ast.Expression] = []
+    # (node, True) once its children have been simplified.
+    work: list[tuple[ast.Expression, bool]] = [(tree, False)]
+    while work:
+        node, children_done = work.pop()
+        children = ast_children(node)
+        if not children_done:
+            work.append((node, True))
+            work.extend((child, False) for child in reversed(children))
+            continue
+        new_children = results[len(results) - len(children) :]
+        del results[len(results) - len(children) :]
+        if any(new is not old for new, old in zip(new_children, children)):
+            node = with_children(node, new_children)
+        results.append(simplify_node(node))
+    simplified = results[0]
+    return simplified, count_nodes(tree) - count_nodes(simplified)
+
+
+def with_children(node: ast.Expression, children: list[ast.Expression]) -> ast.Expression:
+    """Copy of `node` with the children listed by `ast_children` replaced."""
+    if isinstance(node, ast.FunctionCall):
+        assert isinstance(children[0], ast.Identifier)
+        return ast.FunctionCall(children[0], None if node.args is None else children[1:])
+    if isinstance(node, ast.UnaryOp):
+        return ast.UnaryOp(node.op, children[0])
+    if isinstance(node, ast.BinaryOp):
+        return ast.BinaryOp(children[0], node.op, children[1])
+    if isinstance(node, ast.TernaryOp):
+        return ast.TernaryOp(*children)
+    if isinstance(node, ast.WhileStatement):
+        return ast.WhileStatement(*children)
+    if isinstance(node, ast.Block):
+        return ast.Block(children[:-1], children[-1])
+    if isinstance(node, ast.Variable):
+        assert isinstance(children[0], ast.Identifier)
+        return ast.Variable(children[0], children[1])
+    raise Exception(f"{type(node).__name__} has no children")
+
+
+def literal(value: int | bool | None) -> ast.Literal:
+    if value is None:
+        return ast.NONE_LITERAL
+    if value is True:
+        return ast.TRUE_LITERAL
+    if value is False:
+        return ast.FALSE_LITERAL
+    return ast.Literal(value)
+
+
+def int_value(node: ast.Expression) -> int | None:
+    """The value of an Int literal, wrapped to 64 bits like every backend
+    does, so folding computes what the program would."""
+    if isinstance(node, ast.Literal) and type(node.value) is int:
+        return wrap_int(node.value)
+    return None
+
+
+def is_bool(node: ast.Expression, value: bool) -> bool:
+    return isinstance(node, ast.Literal) and node.value is value
+
+
+def is_int(node: ast.Expression) -> bool:
+    """Whether `node` is known to be an Int without a type checker."""
+    if isinstance(node, ast.BinaryOp):
+        return isinstance(node.op, ast.Operator) and node.op.symbol in INT_OPERATORS
+    if isinstance(node, ast.UnaryOp):
+        return node.op.symbol == "-"
+    return int_value(node) is not None
+
+
+def is_boolean(node: ast.Expression) -> bool:
+    """Whether `node` is known to be a Bool without a type checker."""
+    if isinstance(node, ast.BinaryOp):
+        return isinstance(node.op, ast.Operator) and node.op.symbol in BOOL_OPERATORS
+    if isinstance(node, ast.UnaryOp):
+        return node.op.symbol == "not"
+    return isinstance(node, ast.Literal) and type(node.value) is bool
+
+
+def declares(node: ast.Expression) -> bool:
+    """Whether `node` declares a variable in the enclosing block. Such a node
+    cannot be removed or moved into a block of its own."""
+    work = [node]
+    while work:
+        node = work.pop()
+        if isinstance(node, ast.Variable):
+            return True
+        work.extend(child for child in ast_children(node) if not isinstance(child, ast.Block))
+    return False
+
+
+def is_pure(node: ast.Expression) -> bool:
+    """Whether evaluating `node` can be skipped without changing the program.
+    Identifiers are not, because an undefined variable is an error."""
+    return isinstance(node, ast.Literal)
+
+
+def simplify_node(node: ast.Expression) -> ast.Expression:
+    if isinstance(node, ast.BinaryOp):
+        return simplify_binary_op(node)
+    if isinstance(node, ast.UnaryOp):
+        return simplify_unary_op(node)
+    if isinstance(node, ast.TernaryOp):
+        return simplify_ternary_op(node)
+    if isinstance(node, ast.WhileStatement):
+        if is_bool(node.cond, False) and not declares(node.body):
+            return ast.NONE_LITERAL
+        return node
+    if isinstance(node, ast.Block):
+        return simplify_block(node)
+    return node
+
+
+def simplify_binary_op(node: ast.BinaryOp) -> ast.Expression:
+    assert isinstance(node.op, ast.Operator)
+    symbol = node.op.symbol
+    left, right = node.left, node.right
+    # `and` and `or` give one of their operands, so `x and true` is only `x`
+    # if `x` is a Bool.
+    if symbol == "and":
+        if is_bool(left, True):
+            return right
+        if is_bool(right, True) and is_boolean(left):
+            return left
+        if is_bool(left, False):
+            return ast.FALSE_LITERAL
+        return node
+    if symbol == "or":
+        if is_bool(left, False):
+            return right
+        if is_bool(right, False) and is_boolean(left):
+            return left
+        if is_bool(left, True):
+            return ast.TRUE_LITERAL
+        return node
+
+    left_value, right_value = int_value(left), int_value(right)
+    if left_value is not None and right_value is not None:
+        if symbol not in ARITHMETIC_OPERATORS and symbol not in EQUALITY_OPERATORS:
+            return node
+        if symbol in ("/", "%") and right_value == 0:
+            return node
+        return literal(BINARY_OPERATORS[symbol](left_value, right_value))
+    if (
+        symbol in EQUALITY_OPERATORS
+        and isinstance(left, ast.Literal)
+        and isinstance(right, ast.Literal)
+        and type(left.value) is type(right.value)
+    ):
+        return literal(BINARY_OPERATORS[symbol](left.value, right.value))
+
+    # Identities. Operands of other types give errors or other values, so
+    # they only apply to operands known to be Ints.
+    if symbol == "+":
+        if right_value == 0 and is_int(left):
+            return left
+        if left_value == 0 and is_int(right):
+            return right
+    elif symbol == "-":
+        if right_value == 0 and is_int(left):
+            return left
+    elif symbol == "*":
+        if right_value == 1 and is_int(left):
+            return left
+        if left_value == 1 and is_int(right):
+            return right
+    elif symbol == "/":
+        if right_value == 1 and is_int(left):
+            return left
+    return node
+
+
+def simplify_unary_op(node: ast.UnaryOp) -> ast.Expression:
+    right = node.right
+    symbol = node.op.symbol
+    value = int_value(right)
+    if symbol == "-" and value is not None:
+        return literal(negate(value))
+    if symbol == "not" and isinstance(right, ast.Literal) and type(right.value) is bool:
+        return literal(not right.value)
+    # --x and not not x
+    if isinstance(right, ast.UnaryOp) and right.op.symbol == symbol:
+        inner = right.right
+        if is_int(inner) if symbol == "-" else is_boolean(inner):
+            return inner
+    return node
+
+
+def simplify_ternary_op(node: ast.TernaryOp) -> ast.Expression:
+    if declares(node.then_) or (node.else_ is not None and declares(node.else_)):
+        return node
+    if is_bool(node.cond, True):
+        if node.else_ is not None:
+            return node.then_
+        # Without an else branch the value is Unit, whatever the branch gives.
+        if isinstance(node.then_, ast.Block):
+            return simplify_block(
+                ast.Block(
+                    [*node.then_.statements, node.then_.result_expression], ast.NONE_LITERAL
+                )
+            )
+        if is_pure(node.then_):
+            return ast.NONE_LITERAL
+        return ast.Block([node.then_], ast.NONE_LITERAL)
+    if is_bool(node.cond, False):
+        return node.else_ if node.else_ is not None else ast.NONE_LITERAL
+    return node
+
+
+def simplify_block(node: ast.Block) -> ast.Expression:
+    statements = [s for s in node.statements if not is_pure(s)]
+    if not statements and not declares(node.result_expression):
+        # A block without declarations adds nothing to its result.
+        return node.result_expression
+    if len(statements) != len(node.statements):
+        return ast.Block(statements, node.result_expression)
+    return node
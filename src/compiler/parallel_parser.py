@@ -0,0 +1,145 @@
+import multiprocessing
+import os
+import re
+from array import array
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+
+import compiler.custom_ast as ast
+from compiler.parser import AST_BUILDER, PARSERS, Parser, parse
+from compiler.tokenizer import Token, TokenKind, TokenStream, match_brackets
+
+# Programs with fewer tokens are parsed in this process, because starting the
+# pool takes longer than parsing them.
+MIN_PARALLEL_TOKENS = 200_000
+# Chunks per worker, so a worker that finishes early can take another one.
+CHUNKS_PER_JOB = 4
+# Tokens that end a top-level statement or start a bracket to skip over.
+SPLIT_REGEX = re.compile(
+    b"[%c%c%c]" % (TokenKind.LEFT_PAREN, TokenKind.LEFT_BRACE, TokenKind.SEMICOLON)
+)
+
+# The parser and statement ranges of a worker process, see `start_worker`.
+worker_parser: Parser | None = None
+worker_ranges: list[tuple[int, int]] = []
+
+
+def parallel_parse(
+    tokens: Sequence[Token],
+    engine: str = "recursive",
+    jobs: int | None = None,
+    min_tokens: int = MIN_PARALLEL_TOKENS,
+) -> ast.Expression:
+    """Parses `tokens` like `parse`, using a pool of `jobs` processes.
+
+    A program that is one block is split at the `;`s between its top-level
+    statements, found with the bracket index of the tokens, and the
+    statements are parsed in chunks by the workers. The workers index into
+    the whole token sequence, so nodes and errors are the same as from a
+    serial parse. If any chunk fails, the program is parsed again in this
+    process to raise the error `parse` would.
+
+    Programs with fewer than `min_tokens` tokens, and programs that are not
+    a single block, are parsed serially."""
+    if engine not in PARSERS or jobs == 1 or len(tokens) < max(min_tokens, 1):
+        return parse(tokens, engine)
+    if isinstance(tokens, TokenStream):
+        kinds = tokens.kinds
+        matches = tokens.bracket_matches()
+    else:
+        kinds = array("B", [token.kind for token in tokens])
+        matches = match_brackets(kinds)
+    ranges = top_level_statements(kinds, matches)
+    if ranges is None or len(ranges) < 2:
+        return parse(tokens, engine)
+
+    jobs = jobs or os.cpu_count() or 1
+    try:
+        with ProcessPoolExecutor(
+            jobs,
+            mp_context=pool_context(),
+            initializer=start_worker,
+            initargs=(tokens, engine, ranges),
+        ) as executor:
+            chunks = executor.map(parse_chunk, split_chunks(ranges, jobs * CHUNKS_PER_JOB))
+            nodes = [node for chunk in chunks for node in chunk]
+    except Exception:
+        return parse(tokens, engine)
+
+    # The last range is the result expression if it ends at the closing brace.
+    has_result = ranges[-1][1] == len(tokens) - 1
+    result_expression = nodes.pop() if has_result else AST_BUILDER.none_literal()
+    return AST_BUILDER.block(nodes, result_expression)
+
+
+def top_level_statements(
+    kinds: array, matches: dict[int, int]
+) -> list[tuple[int, int]] | None:
+    """The token ranges of the top-level statements of a program that is one
+    block, ending at their `;`, followed by the result expression if there is
+    one. None if the program is not a single block with matching brackets."""
+    end = len(kinds) - 1
+    if end <= 0 or kinds[0] != TokenKind.LEFT_BRACE or matches.get(0) != end:
+        return None
+    ranges = []
+    start = pos = 1
+    while (match := SPLIT_REGEX.search(kinds, pos, end)) is not None:
+        pos = match.start()
+        if kinds[pos] == TokenKind.SEMICOLON:
+            ranges.append((start, pos))
+            start = pos = pos + 1
+        else:
+            close = matches.get(pos)
+            if close is None:
+                return None
+            pos = close + 1
+    if start < end:
+        ranges.append((start, end))
+    return ranges
+
+
+def split_chunks(ranges: list[tuple[int, int]], count: int) -> list[tuple[int, int]]:
+    """Splits `ranges` into at most about `count` runs of similar token counts.
+    Returns the index ranges of the runs in `ranges`."""
+    size = (ranges[-1][1] - ranges[0][0]) / count
+    chunks = []
+    first = 0
+    limit = ranges[0][0] + size
+    for index, (_, end) in enumerate(ranges):
+        if end >= limit:
+            chunks.append((first, index + 1))
+            first = index + 1
+            limit = end + size
+    if first < len(ranges):
+        chunks.append((first, len(ranges)))
+    return chunks
+
+
+def pool_context() -> multiprocessing.context.BaseContext:
+    # Forked workers share the tokens with this process instead of each
+    # getting a pickled copy.
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context()
+
+
+def start_worker(
+    tokens: Sequence[Token], engine: str, ranges: list[tuple[int, int]]
+) -> None:
+    global worker_parser, worker_ranges
+    worker_parser = PARSERS[engine](tokens)
+    worker_ranges = ranges
+
+
+def parse_chunk(chunk: tuple[int, int]) -> list[ast.Expression]:
+    """Parses the statements `worker_ranges[chunk[0]:chunk[1]]`."""
+    parser = worker_parser
+    assert parser is not None
+    nodes = []
+    for start, end in worker_ranges[chunk[0] : chunk[1]]:
+        parser.pos = start
+        parser.kind = parser.kinds[start]
+        nodes.append(parser.parse_expression())
+        if parser.pos != end:
+            raise Exception(f"{parser.peek().location}: statement does not end at ;")
+    return nodes
@@ -1,68 +1,175 @@
-from compiler.tokenizer import Token
+from array import array
+from compiler.tokenizer import Token, TokenKind, TokenStream, SourceLocation, KIND_TEXTS
+from compiler.tokenizer import match_brackets
 from compiler.tokenizer import tokenizer
 import compiler.custom_ast as ast
-from collections.abc import Callable
-from compiler.utils import get_keywords
+from collections.abc import Callable, Sequence
+from typing import Any, Protocol
+
+
+KEYWORDS = frozenset([TokenKind.IF, TokenKind.WHILE, TokenKind.VAR])
+BOOLEAN_LITERALS = frozenset([TokenKind.TRUE, TokenKind.FALSE])
+PREFIX_OPERATORS = frozenset([TokenKind.NOT, TokenKind.MINUS])
+ASSIGNMENT_OPERATORS = frozenset([TokenKind.ASSIGN])
+OR_OPERATORS = frozenset([TokenKind.OR])
+AND_OPERATORS = frozenset([TokenKind.AND])
+EQUALITY_OPERATORS = frozenset([TokenKind.NOT_EQUAL, TokenKind.EQUAL])
+COMPARISON_OPERATORS = frozenset(
+    [TokenKind.LESS, TokenKind.LESS_EQUAL, TokenKind.GREATER, TokenKind.GREATER_EQUAL]
+)
+ADDITIVE_OPERATORS = frozenset([TokenKind.PLUS, TokenKind.MINUS])
+MULTIPLICATIVE_OPERATORS = frozenset(
+    [TokenKind.STAR, TokenKind.SLASH, TokenKind.PERCENT]
+)
+
+
+class NodeBuilder(Protocol):
+    """Creates the nodes of the tree the parser builds.
+
+    Parsers create every node through their builder, so a different builder
+    (like `flat_ast.AstArena`) can make them emit another representation. The
+    signatures follow the `custom_ast` constructors."""
+
+    def literal(self, value: int) -> Any: ...
+    def none_literal(self) -> Any: ...
+    def boolean_literal(self, value: bool) -> Any: ...
+    def identifier(self, name: str) -> Any: ...
+    def operator(self, symbol: str) -> Any: ...
+    def function_call(self, function_name: Any, args: list[Any] | None) -> Any: ...
+    def unary_op(self, op: Any, right: Any) -> Any: ...
+    def binary_op(self, left: Any, op: Any, right: Any) -> Any: ...
+    def ternary_op(self, cond: Any, then_: Any, else_: Any | None) -> Any: ...
+    def while_statement(self, cond: Any, body: Any) -> Any: ...
+    def block(self, statements: list[Any], result_expression: Any) -> Any: ...
+    def variable(self, identifier: Any, initializer: Any) -> Any: ...
+    def is_identifier(self, node: Any) -> bool: ...
+
+
+class AstBuilder:
+    """Builds `custom_ast` nodes. The default `NodeBuilder`."""
+
+    literal = ast.Literal
+    identifier = ast.Identifier
+    operator = staticmethod(ast.operator)
+    function_call = ast.FunctionCall
+    unary_op = ast.UnaryOp
+    binary_op = ast.BinaryOp
+    ternary_op = ast.TernaryOp
+    while_statement = ast.WhileStatement
+    block = ast.Block
+    variable = ast.Variable
+
+    @staticmethod
+    def none_literal() -> ast.Literal:
+        return ast.NONE_LITERAL
+
+    @staticmethod
+    def boolean_literal(value: bool) -> ast.Literal:
+        return ast.TRUE_LITERAL if value else ast.FALSE_LITERAL
+
+    @staticmethod
+    def is_identifier(node: ast.Expression) -> bool:
+        return type(node) is ast.Identifier
+
+
+AST_BUILDER = AstBuilder()
 
 
 class Parser:
-    def __init__(self, tokens: list[Token]) -> None:
+    """Parses a token sequence into a tree.
+
+    With `lazy`, blocks are not parsed but skipped to their closing brace
+    using the bracket index of the tokens, and become `custom_ast.LazyBlock`
+    placeholders that are parsed when they are first used. Syntax errors
+    inside a block are then raised at that point. Placeholders keep the parser
+    and the tokens alive until they are parsed. Lazy parsing needs the default
+    `AstBuilder`."""
+
+    def __init__(
+        self, tokens: Sequence[Token], builder: NodeBuilder = AST_BUILDER, lazy: bool = False
+    ) -> None:
+        if lazy and not isinstance(builder, AstBuilder):
+            raise Exception("Lazy parsing only builds custom_ast trees")
         self.tokens = tokens
+        self.builder = builder
+        self.lazy = lazy
         self.pos = 0
         self.token_length = len(tokens)
+        self.token_text: Callable[[int], str]
+        if isinstance(tokens, TokenStream):
+            self.kinds = array("B", tokens.kinds)
+            self.token_text = tokens.text
+        else:
+            self.kinds = array("B", [token.kind for token in tokens])
+            self.token_text = lambda index: tokens[index].text
+        # The trailing END lets the parser look past the last token without
+        # bounds checks. `kind` is always the kind of the token at `pos`.
+        self.kinds.append(TokenKind.END)
+        self.kind = self.kinds[0]
+        self.bracket_matches: dict[int, int] = {}
+        if lazy:
+            self.bracket_matches = (
+                tokens.bracket_matches()
+                if isinstance(tokens, TokenStream)
+                else match_brackets(self.kinds)
+            )
+        self.end_token = Token(
+            location=tokens[-1].location if tokens else SourceLocation(1, 1),
+            type="end",
+            text="",
+        )
 
     def peek(self) -> Token:
         if self.pos < self.token_length:
             return self.tokens[self.pos]
         else:
-            return Token(
-                location=self.tokens[-1].location,
-                type="end",
-                text="",
-            )
+            return self.end_token
 
-    def consume(self, expected: str | list[str] | None = None) -> Token:
-        self.pos
-        token = self.peek()
-        if isinstance(expected, str) and token.text != expected:
-            raise Exception(f'{token.location}: expected "{expected}"')
-        if isinstance(expected, list) and token.text not in expected:
-            comma_separated = ", ".join([f'"{e}"' for e in expected])
-            raise Exception(f"{token.location}: expected one of: {comma_separated}")
+    def consume(self, expected: TokenKind | None = None) -> int:
+        kind = self.kind
+        if expected is not None and kind != expected:
+            raise Exception(f'{self.peek().location}: expected "{KIND_TEXTS[expected]}"')
         self.pos += 1
-        return token
+        self.kind = self.kinds[self.pos]
+        return kind
 
     def parse_int_literal(self) -> ast.Literal:
-        if self.peek().type != "int_literal":
+        if self.kind != TokenKind.INT_LITERAL:
             raise Exception(f"{self.peek().location}: expected an integer literal")
-        token = self.consume()
-        return ast.Literal(int(token.text))
+        text = self.token_text(self.pos)
+        self.consume()
+        return self.builder.literal(int(text))
+
+    def parse_boolean_literal(self) -> ast.Literal:
+        if self.consume() == TokenKind.TRUE:
+            return self.builder.boolean_literal(True)
+        return self.builder.boolean_literal(False)
 
     def parse_identifier(self) -> ast.Identifier | ast.Expression:
-        if self.peek().type != "identifier":
+        if self.kind in KEYWORDS:
+            return self.parse_keyword()
+        elif self.kind != TokenKind.IDENTIFIER:
             raise Exception(
                 f"{self.peek().location}: expected an identifier (variable)"
             )
-        elif self.peek().text in get_keywords():
-            return self.parse_keyword()
-        token = self.consume()
-        identifier = ast.Identifier(token.text)
-        if self.peek().text == "(":
+        identifier = self.builder.identifier(self.token_text(self.pos))
+        self.consume()
+        if self.kind == TokenKind.LEFT_PAREN:
             return self.parse_function_call(identifier)
         return identifier
 
     def parse_function_call(self, identifier: ast.Identifier) -> ast.FunctionCall:
-        self.consume("(")
+        self.consume(TokenKind.LEFT_PAREN)
         args: list[ast.Expression] = []
-        if self.peek().text != ")":
+        if self.kind != TokenKind.RIGHT_PAREN:
             while True:
                 arg = self.parse_expression()
                 args.append(arg)
-                if self.peek().text != ",":
+                if self.kind != TokenKind.COMMA:
                     break
-                self.consume(",")
-        self.consume(")")
-        return ast.FunctionCall(identifier, args if args else None)
+                self.consume(TokenKind.COMMA)
+        self.consume(TokenKind.RIGHT_PAREN)
+        return self.builder.function_call(identifier, args if args else None)
 
     def parse_expression(self) -> ast.Expression:
 
@@ -70,138 +177,172 @@ class Parser:
 
     def parse_binary_operator(
         self,
-        operators: list[str],
+        operators: frozenset[TokenKind],
         next_func: Callable[[], ast.Expression],
         left_associative: bool = True,
         left_operand_check: None | Callable[..., None] = None,
     ) -> ast.Expression:
         left_operand = next_func()
-        while self.peek().text in operators:
+        while self.kind in operators:
             if left_operand_check:
                 left_operand_check(left_operand)
-            operator_token = self.consume(operators)
-            operator = ast.Operator(operator_token.text)
+            operator = self.builder.operator(KIND_TEXTS[self.consume()])
             if left_associative:
                 right_operand = next_func()
             else:
                 right_operand = self.parse_expression()
-            left_operand = ast.BinaryOp(left_operand, operator, right_operand)
+            left_operand = self.builder.binary_op(left_operand, operator, right_operand)
         return left_operand
 
     def parse_level_1(self) -> ast.Expression:
         return self.parse_binary_operator(
-            ["="],
+            ASSIGNMENT_OPERATORS,
             self.parse_level_2,
             left_associative=False,
-            left_operand_check=lambda left: check_is_identifier(
+            left_operand_check=lambda left: self.check_is_identifier(
                 left,
                 "Left operand of assignment operator '=' needs to be an Identifier",
             ),
         )
 
     def parse_level_2(self) -> ast.Expression:
-        return self.parse_binary_operator(["or"], self.parse_level_3)
+        return self.parse_binary_operator(OR_OPERATORS, self.parse_level_3)
 
     def parse_level_3(self) -> ast.Expression:
-        return self.parse_binary_operator(["and"], self.parse_level_4)
+        return self.parse_binary_operator(AND_OPERATORS, self.parse_level_4)
 
     def parse_level_4(self) -> ast.Expression:
-        return self.parse_binary_operator(["!=", "=="], self.parse_level_5)
+        return self.parse_binary_operator(EQUALITY_OPERATORS, self.parse_level_5)
 
     def parse_level_5(self) -> ast.Expression:
-        return self.parse_binary_operator(["<", "<=", ">", ">="], self.parse_level_6)
+        return self.parse_binary_operator(COMPARISON_OPERATORS, self.parse_level_6)
 
     def parse_level_6(self) -> ast.Expression:
-        return self.parse_binary_operator(["+", "-"], self.parse_level_7)
+        return self.parse_binary_operator(ADDITIVE_OPERATORS, self.parse_level_7)
 
     def parse_level_7(self) -> ast.Expression:
-        return self.parse_binary_operator(["*", "/", "%"], self.parse_level_8)
+        return self.parse_binary_operator(MULTIPLICATIVE_OPERATORS, self.parse_level_8)
 
     def parse_level_8(self) -> ast.Expression:
-        if self.peek().text in ["not", "-"]:
-            operator_token = self.consume(["not", "-"])
-            operator = ast.Operator(operator_token.text)
+        if self.kind in PREFIX_OPERATORS:
+            operator = self.builder.operator(KIND_TEXTS[self.consume()])
             right = self.parse_level_8()
-            return ast.UnaryOp(operator, right)
+            return self.builder.unary_op(operator, right)
         else:
             return self.parse_level_9()
 
     def parse_level_9(self) -> ast.Expression:
-        if self.peek().text == "(":
+        kind = self.kind
+        if kind == TokenKind.LEFT_PAREN:
             return self.parse_parenthesized()
-        elif self.peek().text == "{":
+        elif kind == TokenKind.LEFT_BRACE:
             return self.parse_block()
-        elif self.peek().type == "int_literal":
+        elif kind == TokenKind.INT_LITERAL:
             return self.parse_int_literal()
-        elif self.peek().type == "identifier":
+        elif kind in BOOLEAN_LITERALS:
+            return self.parse_boolean_literal()
+        elif kind == TokenKind.IDENTIFIER or kind in KEYWORDS:
             return self.parse_identifier()
         else:
             raise Exception(
                 f'{self.peek().location}: expected "(", an integer literal or an identifier'
             )
 
-    def parse_keyword(self):
-        if self.peek().text == "if":
+    def parse_keyword(self) -> ast.Expression:
+        if self.kind == TokenKind.IF:
             return self.parse_if_statement()
-        elif self.peek().text == "while":
+        elif self.kind == TokenKind.WHILE:
             return self.parse_while_statement()
-        elif self.peek().text == "var":
+        elif self.kind == TokenKind.VAR:
             return self.parse_var_declaration()
         else:
             raise Exception(f"Keyowrd {self.peek().text} is not handled in parser")
 
     def parse_if_statement(self) -> ast.TernaryOp:
-        self.consume("if")
+        self.consume(TokenKind.IF)
         if_ = self.parse_expression()
-        self.consume("then")
+        self.consume(TokenKind.THEN)
         then_ = self.parse_expression()
         else_ = None
-        if self.peek().text == "else":
-            self.consume("else")
+        if self.kind == TokenKind.ELSE:
+            self.consume(TokenKind.ELSE)
             else_ = self.parse_expression()
-        return ast.TernaryOp(if_, then_, else_)
+        return self.builder.ternary_op(if_, then_, else_)
 
     def parse_while_statement(self) -> ast.WhileStatement:
-        self.consume("while")
+        self.consume(TokenKind.WHILE)
         cond = self.parse_expression()
-        self.consume("do")
+        self.consume(TokenKind.DO)
         body = self.parse_expression()
-        return ast.WhileStatement(cond, body)
+        return self.builder.while_statement(cond, body)
 
     def parse_var_declaration(self) -> ast.Variable:
-        self.consume("var")
+        self.consume(TokenKind.VAR)
         identifier = self.parse_identifier()
-        if type(identifier) != ast.Identifier:
+        if not self.builder.is_identifier(identifier):
             raise Exception(f"Variable must be of type identifier")
-        self.consume("=")
+        self.consume(TokenKind.ASSIGN)
         initializer = self.parse_expression()
-        return ast.Variable(identifier, initializer)
+        return self.builder.variable(identifier, initializer)
 
     def parse_parenthesized(self) -> ast.Expression:
-        self.consume("(")
+        self.consume(TokenKind.LEFT_PAREN)
         expr = self.parse_expression()
-        self.consume(")")
+        self.consume(TokenKind.RIGHT_PAREN)
         return expr
 
     def parse_block(self) -> ast.Block:
-        self.consume("{")
+        if self.lazy:
+            return self.skip_block()
+        return self.parse_block_now()
+
+    def skip_block(self) -> ast.Block:
+        start = self.pos
+        end = self.bracket_matches.get(start)
+        if end is None:
+            # The braces do not match, so parse the block to report the error.
+            return self.parse_block_now()
+        self.pos = end + 1
+        self.kind = self.kinds[self.pos]
+        return ast.LazyBlock(lambda: self.parse_block_at(start))
+
+    def parse_block_at(self, start: int) -> ast.Block:
+        pos = self.pos
+        self.pos = start
+        self.kind = self.kinds[start]
+        try:
+            return self.parse_block_now()
+        finally:
+            self.pos = pos
+            self.kind = self.kinds[pos]
+
+    def parse_block_now(self) -> ast.Block:
+        self.consume(TokenKind.LEFT_BRACE)
         statements: list[ast.Expression] = []
         result_expression = None
-        while self.peek().text != "}":
+        while self.kind != TokenKind.RIGHT_BRACE:
             statement = self.parse_expression()
-            next_token = self.peek().text
-            if next_token == "}":
+            if self.kind == TokenKind.RIGHT_BRACE:
                 result_expression = statement
                 break
             else:
                 statements.append(statement)
-                self.consume(";")
-
-        self.consume("}")
-        return ast.Block(
-            statements, result_expression if result_expression else ast.Literal(None)
+                self.consume(TokenKind.SEMICOLON)
+
+        self.consume(TokenKind.RIGHT_BRACE)
+        return self.builder.block(
+            statements,
+            (
+                result_expression
+                if result_expression is not None
+                else self.builder.none_literal()
+            ),
         )
 
+    def check_is_identifier(self, expression: ast.Expression, error_message: str) -> None:
+        if not self.builder.is_identifier(expression):
+            raise Exception(error_message)
+
     def parse(self):
         if not bool(self.tokens):
             return None
@@ -214,16 +355,282 @@ class Parser:
         return expression
 
 
-def parse(tokens: list[Token]) -> ast.Expression:
-    parser = Parser(tokens)
-    return parser.parse()
+# Binding powers of the binary operators, indexed by token kind. Zero means the
+# token is not a binary operator.
+BINDING_POWERS = [0] * len(TokenKind)
+for power, operators in enumerate(
+    [
+        ASSIGNMENT_OPERATORS,
+        OR_OPERATORS,
+        AND_OPERATORS,
+        EQUALITY_OPERATORS,
+        COMPARISON_OPERATORS,
+        ADDITIVE_OPERATORS,
+        MULTIPLICATIVE_OPERATORS,
+    ],
+    start=1,
+):
+    for operator_kind in operators:
+        BINDING_POWERS[operator_kind] = power
+
+
+class PrattParser(Parser):
+    """Parser that handles binary operators by precedence climbing.
+
+    Produces the same trees as `Parser`, but parses each operand with one loop
+    driven by `BINDING_POWERS` instead of descending through every level."""
+
+    def parse_expression(self, min_power: int = 1) -> ast.Expression:
+        # Plain variables and integer literals are by far the most common
+        # operands, so they are parsed here without going through the levels.
+        kind = self.kind
+        pos = self.pos
+        left_operand: ast.Expression
+        if kind == TokenKind.IDENTIFIER and self.kinds[pos + 1] != TokenKind.LEFT_PAREN:
+            left_operand = self.builder.identifier(self.token_text(pos))
+            self.pos = pos + 1
+            self.kind = self.kinds[pos + 1]
+        elif kind == TokenKind.INT_LITERAL:
+            left_operand = self.builder.literal(int(self.token_text(pos)))
+            self.pos = pos + 1
+            self.kind = self.kinds[pos + 1]
+        else:
+            left_operand = self.parse_level_8()
+        while True:
+            kind = self.kind
+            power = BINDING_POWERS[kind]
+            if power < min_power:
+                return left_operand
+            if kind == TokenKind.ASSIGN:
+                self.check_is_identifier(
+                    left_operand,
+                    "Left operand of assignment operator '=' needs to be an Identifier",
+                )
+                self.consume()
+                # Right associative: the right side is a whole expression.
+                right_operand = self.parse_expression()
+            else:
+                self.consume()
+                right_operand = self.parse_expression(power + 1)
+            left_operand = self.builder.binary_op(
+                left_operand, self.builder.operator(KIND_TEXTS[kind]), right_operand
+            )
+
+
+# Frame tags of IterativeParser. Each frame is a list starting with its tag and
+# says what to do with the next finished operand or subexpression.
+EXPRESSION = 0  # [EXPRESSION, min_power, left operand or None, operator kind]
+PREFIX = 1  # [PREFIX, operator kind]
+PARENTHESIZED = 2  # [PARENTHESIZED]
+CALL_ARGUMENT = 3  # [CALL_ARGUMENT, function name, arguments so far]
+BLOCK_STATEMENT = 4  # [BLOCK_STATEMENT, statements so far]
+IF_CONDITION = 5  # [IF_CONDITION]
+IF_THEN = 6  # [IF_THEN, condition]
+IF_ELSE = 7  # [IF_ELSE, condition, then branch]
+WHILE_CONDITION = 8  # [WHILE_CONDITION]
+WHILE_BODY = 9  # [WHILE_BODY, condition]
+VAR_INITIALIZER = 10  # [VAR_INITIALIZER, identifier]
+VAR_INVALID_NAME = 11  # [VAR_INVALID_NAME]
+
 
+class IterativeParser(Parser):
+    """Parser that keeps its state on an explicit stack instead of the call stack.
 
-def check_is_identifier(expression: ast.Expression, Error_msg=None) -> None:
-    if Error_msg == None:
-        Error_msg = "Expected an Identifier"
-    if type(expression) != ast.Identifier:
-        raise Exception(Error_msg)
+    Builds the same trees and raises the same errors as `PrattParser`, but the
+    nesting depth of the program only grows a list of frames, so it never hits
+    the recursion limit."""
+
+    def parse_expression(self) -> ast.Expression:
+        kinds = self.kinds
+        stack: list[list] = []
+        value: ast.Expression
+
+        def start_expression(min_power: int) -> None:
+            stack.append([EXPRESSION, min_power, None, TokenKind.END])
+
+        start_expression(1)
+        while True:
+            # Parse prefix operators and a primary expression. Primaries that
+            # contain subexpressions push a frame and start a new expression.
+            kind = self.kind
+            while kind in PREFIX_OPERATORS:
+                stack.append([PREFIX, self.consume()])
+                kind = self.kind
+            if kind == TokenKind.VAR:
+                self.consume()
+                kind = self.kind
+                if kind == TokenKind.IDENTIFIER and kinds[self.pos + 1] != TokenKind.LEFT_PAREN:
+                    identifier = self.builder.identifier(self.token_text(self.pos))
+                    self.consume()
+                    self.consume(TokenKind.ASSIGN)
+                    stack.append([VAR_INITIALIZER, identifier])
+                    start_expression(1)
+                    continue
+                if kind != TokenKind.IDENTIFIER and kind not in KEYWORDS:
+                    raise Exception(
+                        f"{self.peek().location}: expected an identifier (variable)"
+                    )
+                # The name is a function call or keyword expression. It is parsed
+                # in full before it is rejected, like Parser does.
+                stack.append([VAR_INVALID_NAME])
+            if kind == TokenKind.INT_LITERAL:
+                value = self.builder.literal(int(self.token_text(self.pos)))
+                self.consume()
+            elif kind in BOOLEAN_LITERALS:
+                value = self.parse_boolean_literal()
+            elif kind == TokenKind.IDENTIFIER:
+                identifier = self.builder.identifier(self.token_text(self.pos))
+                self.consume()
+                if self.kind != TokenKind.LEFT_PAREN:
+                    value = identifier
+                else:
+                    self.consume()
+                    if self.kind == TokenKind.RIGHT_PAREN:
+                        self.consume()
+                        value = self.builder.function_call(identifier, None)
+                    else:
+                        stack.append([CALL_ARGUMENT, identifier, []])
+                        start_expression(1)
+                        continue
+            elif kind == TokenKind.LEFT_PAREN:
+                self.consume()
+                stack.append([PARENTHESIZED])
+                start_expression(1)
+                continue
+            elif kind == TokenKind.LEFT_BRACE and self.lazy:
+                value = self.skip_block()
+            elif kind == TokenKind.LEFT_BRACE:
+                self.consume()
+                if self.kind == TokenKind.RIGHT_BRACE:
+                    self.consume()
+                    value = self.builder.block([], self.builder.none_literal())
+                else:
+                    stack.append([BLOCK_STATEMENT, []])
+                    start_expression(1)
+                    continue
+            elif kind == TokenKind.IF:
+                self.consume()
+                stack.append([IF_CONDITION])
+                start_expression(1)
+                continue
+            elif kind == TokenKind.WHILE:
+                self.consume()
+                stack.append([WHILE_CONDITION])
+                start_expression(1)
+                continue
+            elif kind == TokenKind.VAR:
+                continue
+            else:
+                raise Exception(
+                    f'{self.peek().location}: expected "(", an integer literal or an identifier'
+                )
+
+            # Hand the finished value to the frames on the stack until one of
+            # them needs another subexpression.
+            while True:
+                frame = stack[-1]
+                tag = frame[0]
+                if tag == EXPRESSION:
+                    if frame[2] is not None:
+                        value = self.builder.binary_op(
+                            frame[2], self.builder.operator(KIND_TEXTS[frame[3]]), value
+                        )
+                    kind = self.kind
+                    power = BINDING_POWERS[kind]
+                    if power < frame[1]:
+                        stack.pop()
+                        if not stack:
+                            return value
+                        continue
+                    if kind == TokenKind.ASSIGN:
+                        self.check_is_identifier(
+                            value,
+                            "Left operand of assignment operator '=' needs to be an Identifier",
+                        )
+                    self.consume()
+                    frame[2] = value
+                    frame[3] = kind
+                    # Assignment is right associative.
+                    start_expression(1 if kind == TokenKind.ASSIGN else power + 1)
+                    break
+                elif tag == PREFIX:
+                    stack.pop()
+                    value = self.builder.unary_op(self.builder.operator(KIND_TEXTS[frame[1]]), value)
+                elif tag == PARENTHESIZED:
+                    stack.pop()
+                    self.consume(TokenKind.RIGHT_PAREN)
+                elif tag == CALL_ARGUMENT:
+                    frame[2].append(value)
+                    if self.kind == TokenKind.COMMA:
+                        self.consume()
+                        start_expression(1)
+                        break
+                    self.consume(TokenKind.RIGHT_PAREN)
+                    stack.pop()
+                    value = self.builder.function_call(frame[1], frame[2])
+                elif tag == BLOCK_STATEMENT:
+                    if self.kind == TokenKind.RIGHT_BRACE:
+                        self.consume()
+                        stack.pop()
+                        value = self.builder.block(frame[1], value)
+                        continue
+                    frame[1].append(value)
+                    self.consume(TokenKind.SEMICOLON)
+                    if self.kind != TokenKind.RIGHT_BRACE:
+                        start_expression(1)
+                        break
+                    self.consume()
+                    stack.pop()
+                    value = self.builder.block(frame[1], self.builder.none_literal())
+                elif tag == IF_CONDITION:
+                    self.consume(TokenKind.THEN)
+                    stack[-1] = [IF_THEN, value]
+                    start_expression(1)
+                    break
+                elif tag == IF_THEN:
+                    if self.kind == TokenKind.ELSE:
+                        self.consume()
+                        stack[-1] = [IF_ELSE, frame[1], value]
+                        start_expression(1)
+                        break
+                    stack.pop()
+                    value = self.builder.ternary_op(frame[1], value, None)
+                elif tag == IF_ELSE:
+                    stack.pop()
+                    value = self.builder.ternary_op(frame[1], frame[2], value)
+                elif tag == WHILE_CONDITION:
+                    self.consume(TokenKind.DO)
+                    stack[-1] = [WHILE_BODY, value]
+                    start_expression(1)
+                    break
+                elif tag == WHILE_BODY:
+                    stack.pop()
+                    value = self.builder.while_statement(frame[1], value)
+                elif tag == VAR_INITIALIZER:
+                    stack.pop()
+                    value = self.builder.variable(frame[1], value)
+                else:
+                    raise Exception(f"Variable must be of type identifier")
+
+
+PARSERS: dict[str, type[Parser]] = {
+    "recursive": Parser,
+    "pratt": PrattParser,
+    "iterative": IterativeParser,
+}
+
+
+def parse(
+    tokens: Sequence[Token],
+    engine: str = "recursive",
+    builder: NodeBuilder = AST_BUILDER,
+    lazy: bool = False,
+) -> ast.Expression:
+    """Parses `tokens` with one of the `PARSERS`. See `Parser` for `lazy`."""
+    if engine not in PARSERS:
+        raise Exception(f"Unknown parser engine: {engine}")
+    parser = PARSERS[engine](tokens, builder, lazy)
+    return parser.parse()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,265 @@
+from dataclasses import dataclass, field
+
+from compiler.assembly import Mem, Operand, fits_imm32
+from compiler.ir import JUMP_OPS, NO_DESTINATION_OPS, IrProgram, Op
+
+# Registers given to IR registers. %rax, %rcx and %rdx are left out, because
+# the code generator uses them as scratch registers.
+CALLEE_SAVED = ("%rbx", "%r12", "%r13", "%r14", "%r15")
+CALLER_SAVED = ("%rsi", "%rdi", "%r8", "%r9", "%r10", "%r11")
+# Uses inside a loop are counted this many times per level of nesting when
+# choosing what to spill.
+LOOP_WEIGHT = 10
+
+
+@dataclass
+class Allocation:
+    """Where each IR register lives while the program runs."""
+
+    # A physical register, stack slot or immediate for each IR register.
+    locations: list[Operand]
+    frame_size: int = 0
+    # Callee-saved registers in use, with the stack slots they are saved to.
+    callee_saved: dict[str, Mem] = field(default_factory=dict)
+    # For each call instruction, the caller-saved registers holding values
+    # that are needed after it, with the slots they are saved to.
+    saved_across_calls: dict[int, list[tuple[str, Mem]]] = field(default_factory=dict)
+
+
+@dataclass
+class Interval:
+    """The range of instructions from the first definition of `register` to
+    its last use, including every loop it is live through."""
+
+    register: int
+    start: int
+    end: int
+    weight: int = 0
+    crosses_call: bool = False
+
+
+class StackFrame:
+    def __init__(self) -> None:
+        self.slots = 0
+
+    def new_slot(self) -> Mem:
+        self.slots += 1
+        return Mem("%rbp", -8 * self.slots)
+
+    def size(self) -> int:
+        return (self.slots * 8 + 15) // 16 * 16
+
+
+def immediate_constants(program: IrProgram) -> dict[int, int]:
+    """Constant registers whose value fits in an instruction."""
+    immediates = {}
+    for register, constant in program.constant_registers:
+        value = int(program.constants[constant] or 0)
+        if fits_imm32(value):
+            immediates[register] = value
+    return immediates
+
+
+def stack_allocation(program: IrProgram) -> Allocation:
+    """The baseline: every register that is not an immediate gets a stack slot."""
+    immediates = immediate_constants(program)
+    frame = StackFrame()
+    locations: list[Operand] = [
+        immediates[register] if register in immediates else frame.new_slot()
+        for register in range(len(program.register_names))
+    ]
+    return Allocation(locations, frame.size())
+
+
+def successors(program: IrProgram, index: int) -> tuple[int, ...]:
+    op = program.ops[index]
+    if op == Op.RETURN:
+        return ()
+    if op == Op.JUMP:
+        return (program.srcs_a[index],)
+    if op in JUMP_OPS:
+        return index + 1, program.srcs_b[index]
+    return (index + 1,)
+
+
+def destination(program: IrProgram, index: int) -> int | None:
+    return None if program.ops[index] in NO_DESTINATION_OPS else program.dsts[index]
+
+
+def basic_blocks(program: IrProgram) -> list[range]:
+    leaders = {0, *program.jump_targets()}
+    for i in range(len(program)):
+        if program.ops[i] in JUMP_OPS or program.ops[i] == Op.RETURN:
+            leaders.add(i + 1)
+    starts = sorted(leader for leader in leaders if leader < len(program))
+    return [range(start, end) for start, end in zip(starts, [*starts[1:], len(program)])]
+
+
+def live_intervals(program: IrProgram) -> tuple[list[Interval], dict[int, set[int]]]:
+    """Computes the live interval of every register that is not an immediate.
+
+    Liveness is solved per basic block with sets, which stay small because
+    few values are live at any one point. Returns the intervals sorted by
+    start and, for each call instruction, the registers live across it."""
+    immediates = immediate_constants(program)
+    blocks = basic_blocks(program)
+    block_of = {block.start: n for n, block in enumerate(blocks)}
+    uses: list[set[int]] = []
+    defs: list[set[int]] = []
+    for block in blocks:
+        block_uses: set[int] = set()
+        block_defs: set[int] = set()
+        for i in block:
+            block_uses.update(r for r in program.sources(i) if r not in block_defs)
+            dst = destination(program, i)
+            if dst is not None:
+                block_defs.add(dst)
+        uses.append(block_uses - immediates.keys())
+        defs.append(block_defs)
+
+    block_successors = [
+        [block_of[s] for s in successors(program, block[-1]) if s < len(program)]
+        for block in blocks
+    ]
+    live_in: list[set[int]] = [set() for _ in blocks]
+    live_out: list[set[int]] = [set() for _ in blocks]
+    changed = True
+    while changed:
+        changed = False
+        for n in reversed(range(len(blocks))):
+            out = set().union(*(live_in[s] for s in block_successors[n]))
+            new_in = uses[n] | (out - defs[n])
+            if len(new_in) != len(live_in[n]) or len(out) != len(live_out[n]):
+                live_in[n], live_out[n] = new_in, out
+                changed = True
+
+    starts: dict[int, int] = {}
+    ends: dict[int, int] = {}
+
+    def extend(register: int, position: int) -> None:
+        if register in immediates:
+            return
+        if register not in starts or position < starts[register]:
+            starts[register] = position
+        if register not in ends or position > ends[register]:
+            ends[register] = position
+
+    # Constants that are not immediates are set before the first instruction.
+    for register, _ in program.constant_registers:
+        extend(register, 0)
+    live_across_calls: dict[int, set[int]] = {}
+    for n, block in enumerate(blocks):
+        live = set(live_out[n])
+        for register in live:
+            extend(register, block[-1])
+        for i in reversed(block):
+            dst = destination(program, i)
+            if dst is not None:
+                extend(dst, i)
+                live.discard(dst)
+            if program.ops[i] == Op.CALL:
+                live_across_calls[i] = set(live)
+            for register in program.sources(i):
+                if register not in immediates:
+                    extend(register, i)
+                    live.add(register)
+        for register in live:
+            extend(register, block.start)
+
+    intervals = {r: Interval(r, starts[r], ends[r]) for r in starts}
+    depths = loop_depths(program)
+    for i in range(len(program)):
+        dst = destination(program, i)
+        for register in (*program.sources(i), *(() if dst is None else (dst,))):
+            if register in intervals:
+                intervals[register].weight += LOOP_WEIGHT ** min(depths[i], 6)
+    for registers in live_across_calls.values():
+        for register in registers:
+            intervals[register].crosses_call = True
+    return sorted(intervals.values(), key=lambda i: i.start), live_across_calls
+
+
+def loop_depths(program: IrProgram) -> list[int]:
+    """How many loops contain each instruction. A loop is the range from the
+    target of a backward jump to the jump."""
+    changes = [0] * (len(program) + 1)
+    for i in range(len(program)):
+        if program.ops[i] in JUMP_OPS:
+            target = successors(program, i)[-1]
+            if target <= i:
+                changes[target] += 1
+                changes[i + 1] -= 1
+    depths = []
+    depth = 0
+    for i in range(len(program)):
+        depth += changes[i]
+        depths.append(depth)
+    return depths
+
+
+def allocate_registers(program: IrProgram) -> Allocation:
+    """Linear scan register allocation.
+
+    Intervals are visited in order of their start. Values live across a call
+    prefer callee-saved registers, and other values caller-saved ones, so
+    that few registers need saving around calls. When every register is
+    taken, the interval with the lowest use count, weighted by loop nesting,
+    is spilled to the stack, so variables used in inner loops keep their
+    registers."""
+    intervals, live_across_calls = live_intervals(program)
+    immediates = immediate_constants(program)
+    locations: list[Operand] = [
+        immediates.get(register, 0) for register in range(len(program.register_names))
+    ]
+    frame = StackFrame()
+    free = {register: True for register in (*CALLEE_SAVED, *CALLER_SAVED)}
+    active: list[tuple[Interval, str]] = []
+
+    for interval in intervals:
+        still_active = []
+        for other, register in active:
+            if other.end < interval.start:
+                free[register] = True
+            else:
+                still_active.append((other, register))
+        active = still_active
+
+        preferred = (
+            (*CALLEE_SAVED, *CALLER_SAVED)
+            if interval.crosses_call
+            else (*CALLER_SAVED, *CALLEE_SAVED)
+        )
+        available = next((r for r in preferred if free[r]), None)
+        if available is not None:
+            register = available
+        else:
+            cheapest = min(range(len(active)), key=lambda n: active[n][0].weight)
+            spilled, register = active[cheapest]
+            if spilled.weight <= interval.weight:
+                locations[spilled.register] = frame.new_slot()
+                del active[cheapest]
+            else:
+                locations[interval.register] = frame.new_slot()
+                continue
+        free[register] = False
+        locations[interval.register] = register
+        active.append((interval, register))
+
+    allocation = Allocation(locations)
+    used = set(location for location in locations if isinstance(location, str))
+    for register in CALLEE_SAVED:
+        if register in used:
+            allocation.callee_saved[register] = frame.new_slot()
+    save_slots: dict[str, Mem] = {}
+    for call, live in sorted(live_across_calls.items()):
+        saved = sorted(
+            location
+            for location in {locations[r] for r in live}
+            if isinstance(location, str) and location in CALLER_SAVED
+        )
+        for register in saved:
+            if register not in save_slots:
+                save_slots[register] = frame.new_slot()
+        allocation.saved_across_calls[call] = [(r, save_slots[r]) for r in saved]
+    allocation.frame_size = frame.size()
+    return allocation
@@ -0,0 +1,178 @@
+"""Builtin functions and program entry for compiled programs.
+
+The runtime uses Linux system calls directly, so executables need no C
+library. Builtins follow the System V calling convention and, like C
+functions, may change any caller-saved register."""
+
+from compiler.assembly import ENTRY_POINT, LABEL, Instruction, Mem
+
+SYS_READ = 0
+SYS_WRITE = 1
+SYS_EXIT = 60
+STDIN = 0
+STDOUT = 1
+STDERR = 2
+
+# The compiled program is a function with this name.
+PROGRAM_FUNCTION = "program"
+
+
+def prologue(frame_size: int) -> list[Instruction]:
+    instructions: list[Instruction] = [("pushq", "%rbp"), ("movq", "%rsp", "%rbp")]
+    if frame_size:
+        instructions.append(("subq", frame_size, "%rsp"))
+    return instructions
+
+
+EPILOGUE: list[Instruction] = [
+    ("movq", "%rbp", "%rsp"),
+    ("popq", "%rbp"),
+    ("ret",),
+]
+
+
+def store_text(text: bytes, offset: int) -> list[Instruction]:
+    """Instructions writing `text` to the stack at `offset(%rbp)`."""
+    instructions: list[Instruction] = []
+    for start in range(0, len(text), 8):
+        chunk = int.from_bytes(text[start : start + 8].ljust(8, b"\0"), "little")
+        instructions += [
+            ("movabsq", chunk, "%rax"),
+            ("movq", "%rax", Mem("%rbp", offset + start)),
+        ]
+    return instructions
+
+
+def write_text(text: bytes, fd: int) -> list[Instruction]:
+    """Instructions writing `text` to `fd`, using the stack below %rbp."""
+    offset = -((len(text) + 15) // 16 * 16)
+    return [
+        *store_text(text, offset),
+        ("movq", SYS_WRITE, "%rax"),
+        ("movq", fd, "%rdi"),
+        ("leaq", Mem("%rbp", offset), "%rsi"),
+        ("movq", len(text), "%rdx"),
+        ("syscall",),
+    ]
+
+
+def exit_with(status: int) -> list[Instruction]:
+    return [
+        ("movq", SYS_EXIT, "%rax"),
+        ("movq", status, "%rdi"),
+        ("syscall",),
+    ]
+
+
+START: list[Instruction] = [
+    (LABEL, ENTRY_POINT),
+    ("call", PROGRAM_FUNCTION),
+    *exit_with(0),
+]
+
+# Prints %rdi in decimal and a newline. Digits are written backwards into a
+# buffer that ends at %rbp. The remainder has the sign of the dividend, so
+# negative numbers, including the most negative one, are converted digit by
+# digit without negating the whole number.
+PRINT_INT: list[Instruction] = [
+    (LABEL, "print_int"),
+    *prologue(32),
+    ("movq", "%rdi", "%rax"),
+    ("leaq", Mem("%rbp", -1), "%rsi"),
+    ("movq", 10, "%rcx"),
+    ("movb", "%cl", Mem("%rsi")),
+    (LABEL, ".Lprint_int_digit"),
+    ("cqto",),
+    ("idivq", "%rcx"),
+    ("testq", "%rdx", "%rdx"),
+    ("jns", ".Lprint_int_positive"),
+    ("negq", "%rdx"),
+    (LABEL, ".Lprint_int_positive"),
+    ("addq", ord("0"), "%rdx"),
+    ("subq", 1, "%rsi"),
+    ("movb", "%dl", Mem("%rsi")),
+    ("testq", "%rax", "%rax"),
+    ("jne", ".Lprint_int_digit"),
+    ("testq", "%rdi", "%rdi"),
+    ("jns", ".Lprint_int_write"),
+    ("movq", ord("-"), "%rdx"),
+    ("subq", 1, "%rsi"),
+    ("movb", "%dl", Mem("%rsi")),
+    (LABEL, ".Lprint_int_write"),
+    ("movq", "%rbp", "%rdx"),
+    ("subq", "%rsi", "%rdx"),
+    ("movq", SYS_WRITE, "%rax"),
+    ("movq", STDOUT, "%rdi"),
+    ("syscall",),
+    *EPILOGUE,
+]
+
+PRINT_BOOL: list[Instruction] = [
+    (LABEL, "print_bool"),
+    *prologue(16),
+    ("testq", "%rdi", "%rdi"),
+    ("je", ".Lprint_bool_false"),
+    *store_text(b"true\n", -16),
+    ("movq", 5, "%rdx"),
+    ("jmp", ".Lprint_bool_write"),
+    (LABEL, ".Lprint_bool_false"),
+    *store_text(b"false\n", -16),
+    ("movq", 6, "%rdx"),
+    (LABEL, ".Lprint_bool_write"),
+    ("movq", SYS_WRITE, "%rax"),
+    ("movq", STDOUT, "%rdi"),
+    ("leaq", Mem("%rbp", -16), "%rsi"),
+    ("syscall",),
+    *EPILOGUE,
+]
+
+# Reads a line from standard input one byte at a time, so nothing after the
+# line is consumed, and returns the integer on it. An optional minus sign and
+# the digits are used, other characters are skipped. The value is kept in
+# %r8, the sign in %r9 and the digit count in %r10, which system calls keep.
+# Without any digits before the end of the line or input, the program exits
+# with an error like the interpreter does.
+READ_INT: list[Instruction] = [
+    (LABEL, "read_int"),
+    *prologue(32),
+    ("xorq", "%r8", "%r8"),
+    ("xorq", "%r9", "%r9"),
+    ("xorq", "%r10", "%r10"),
+    (LABEL, ".Lread_int_next"),
+    ("movq", SYS_READ, "%rax"),
+    ("movq", STDIN, "%rdi"),
+    ("leaq", Mem("%rbp", -8), "%rsi"),
+    ("movq", 1, "%rdx"),
+    ("syscall",),
+    ("cmpq", 1, "%rax"),
+    ("jne", ".Lread_int_end"),
+    ("movzbq", Mem("%rbp", -8), "%rax"),
+    ("cmpq", ord("\n"), "%rax"),
+    ("je", ".Lread_int_end"),
+    ("cmpq", ord("-"), "%rax"),
+    ("jne", ".Lread_int_digit"),
+    ("movq", 1, "%r9"),
+    ("jmp", ".Lread_int_next"),
+    (LABEL, ".Lread_int_digit"),
+    ("subq", ord("0"), "%rax"),
+    ("cmpq", 9, "%rax"),
+    ("ja", ".Lread_int_next"),
+    ("imulq", 10, "%r8"),
+    ("addq", "%rax", "%r8"),
+    ("addq", 1, "%r10"),
+    ("jmp", ".Lread_int_next"),
+    (LABEL, ".Lread_int_end"),
+    ("testq", "%r10", "%r10"),
+    ("je", ".Lread_int_error"),
+    ("movq", "%r8", "%rax"),
+    ("testq", "%r9", "%r9"),
+    ("je", ".Lread_int_return"),
+    ("negq", "%rax"),
+    (LABEL, ".Lread_int_return"),
+    *EPILOGUE,
+    (LABEL, ".Lread_int_error"),
+    *write_text(b"read_int: end of input\n", STDERR),
+    *exit_with(1),
+]
+
+RUNTIME: list[Instruction] = [*START, *PRINT_INT, *PRINT_BOOL, *READ_INT]
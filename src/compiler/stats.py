@@ -0,0 +1,176 @@
+import gc
+import time
+import tracemalloc
+from collections.abc import Callable
+from contextvars import ContextVar, Token
+from types import TracebackType
+from typing import Any, TypeVar
+
+import compiler.custom_ast as ast
+from compiler.flat_ast import ast_children
+
+T = TypeVar("T")
+
+_active_stats: ContextVar["CompileStats | None"] = ContextVar("compile_stats", default=None)
+
+
+def gc_collections() -> int:
+    return sum(generation["collections"] for generation in gc.get_stats())
+
+
+class Phase:
+    """Measurements of one compiler phase.
+
+    If the statistics trace memory, `allocated_bytes` is the most memory the
+    phase had allocated at any point, from tracemalloc's peak, and
+    `retained_bytes` is how much of it was still allocated at the end. Both
+    are None otherwise. Phases must not be nested, since each one resets the
+    peak. `counts` holds item counts such as tokens or AST nodes."""
+
+    enabled = True
+
+    def __init__(self, stats: "CompileStats", name: str) -> None:
+        self.stats = stats
+        self.name = name
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.allocated_bytes: int | None = None
+        self.retained_bytes: int | None = None
+        self.gc_collections = 0
+        self.counts: dict[str, int] = {}
+
+    def __enter__(self) -> "Phase":
+        if self.stats.trace_memory:
+            tracemalloc.reset_peak()
+            self.retained_bytes = tracemalloc.get_traced_memory()[0]
+        self.gc_collections = gc_collections()
+        self.cpu_seconds = time.process_time()
+        self.wall_seconds = time.perf_counter()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.wall_seconds = time.perf_counter() - self.wall_seconds
+        self.cpu_seconds = time.process_time() - self.cpu_seconds
+        self.gc_collections = gc_collections() - self.gc_collections
+        if self.retained_bytes is not None:
+            current, peak = tracemalloc.get_traced_memory()
+            self.allocated_bytes = peak - self.retained_bytes
+            self.retained_bytes = current - self.retained_bytes
+        self.stats.phases.append(self)
+
+    def to_dict(self) -> dict[str, Any]:
+        result: dict[str, Any] = {
+            "wall_seconds": self.wall_seconds,
+            "cpu_seconds": self.cpu_seconds,
+        }
+        if self.allocated_bytes is not None:
+            result["allocated_bytes"] = self.allocated_bytes
+            result["retained_bytes"] = self.retained_bytes
+        return {**result, "gc_collections": self.gc_collections, **self.counts}
+
+
+class DisabledPhase:
+    """Stand-in for `Phase` when no statistics are being collected."""
+
+    enabled = False
+    counts: dict[str, int] = {}
+
+    def __enter__(self) -> "DisabledPhase":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        pass
+
+
+DISABLED_PHASE = DisabledPhase()
+
+
+class CompileStats:
+    """Per-phase statistics of the compiles run while this object is active.
+
+    Usage:
+
+        with CompileStats() as stats:
+            call_compiler(source_code)
+        print(stats.format())
+
+    Compiler phases are wrapped in `with phase(name)`. When no `CompileStats`
+    is active, that is a context variable lookup and nothing else.
+
+    With `trace_memory`, tracemalloc runs while the object is active to
+    measure the memory each phase allocates. Tracing makes the compile
+    several times slower, so it is off by default."""
+
+    def __init__(self, trace_memory: bool = False) -> None:
+        self.phases: list[Phase] = []
+        self.trace_memory = trace_memory
+        self._reset_token: Token[CompileStats | None] | None = None
+        self._started_tracing = False
+
+    def __enter__(self) -> "CompileStats":
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._reset_token = _active_stats.set(self)
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        assert self._reset_token is not None
+        _active_stats.reset(self._reset_token)
+        self._reset_token = None
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def to_dict(self) -> dict[str, dict[str, Any]]:
+        return {phase.name: phase.to_dict() for phase in self.phases}
+
+    def format(self) -> str:
+        lines = [
+            f"{'phase':<12}{'wall ms':>10}{'cpu ms':>10}{'alloc KiB':>11}"
+            f"{'kept KiB':>10}{'gc':>5}  items"
+        ]
+        for phase in self.phases:
+            items = " ".join(f"{name}={count}" for name, count in phase.counts.items())
+            if phase.allocated_bytes is None or phase.retained_bytes is None:
+                memory = f"{'-':>11}{'-':>10}"
+            else:
+                memory = (
+                    f"{phase.allocated_bytes / 1024:11.1f}"
+                    f"{phase.retained_bytes / 1024:+10.1f}"
+                )
+            lines.append(
+                f"{phase.name:<12}{phase.wall_seconds * 1000:10.2f}"
+                f"{phase.cpu_seconds * 1000:10.2f}{memory}"
+                f"{phase.gc_collections:5d}  {items}".rstrip()
+            )
+        return "\n".join(lines)
+
+
+def phase(name: str) -> Phase | DisabledPhase:
+    stats = _active_stats.get()
+    if stats is None:
+        return DISABLED_PHASE
+    return Phase(stats, name)
+
+
+def run_with_stats(function: Callable[[str], T], argument: str) -> tuple[T, dict[str, Any]]:
+    """Calls `function(argument)` collecting statistics. Useful for running a
+    compile in another process and sending the statistics back."""
+    with CompileStats() as stats:
+        result = function(argument)
+    return result, stats.to_dict()
+
+
+def count_nodes(node: ast.Expression) -> int:
+    count = 0
+    stack = [node]
+    while stack:
+        count += 1
+        stack.extend(ast_children(stack.pop()))
+    return count
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import threading
+import time
+from base64 import b64decode
+from concurrent.futures import ThreadPoolExecutor
+from compiler.async_server import AsyncCompileServer, FRAME_HEADER, encode_frame
+from compiler.compile_cache import CompileCache
+from compiler.tokenizer import LineCache, tokenize_stream
+
+
+def run_with_server(client, compile, cache=None, **limits):
+    async def main():
+        with ThreadPoolExecutor(8) as executor:
+            server = AsyncCompileServer(cache or CompileCache(), compile, executor, **limits)
+            tcp_server = await asyncio.start_server(
+                server.handle_connection, "127.0.0.1", 0
+            )
+            async with tcp_server:
+                port = tcp_server.sockets[0].getsockname()[1]
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                try:
+                    return await client(reader, writer)
+                finally:
+                    writer.close()
+
+    return asyncio.run(main())
+
+
+async def receive(reader):
+    (length,) = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    return json.loads(await reader.readexactly(length))
+
+
+def test_pipelined_requests_are_answered_in_order():
+    def compile(source_code):
+        # Later requests finish first.
+        time.sleep(0.1 / len(source_code))
+        return source_code.encode()
+
+    async def client(reader, writer):
+        sources = ["a", "bb", "ccc", "dddd"]
+        for i, source in enumerate(sources):
+            writer.write(encode_frame({"command": "compile", "code": source, "id": i}))
+        writer.write(encode_frame({"command": "ping"}))
+        responses = [await receive(reader) for _ in range(len(sources) + 1)]
+        return sources, responses
+
+    sources, responses = run_with_server(client, compile)
+    assert [r["id"] for r in responses[:-1]] == list(range(len(sources)))
+    assert [b64decode(r["program"]).decode() for r in responses[:-1]] == sources
+    assert responses[-1] == {}
+
+
+def test_compile_errors_and_cache_stats():
+    def compile(source_code):
+        raise Exception("Bad program")
+
+    async def client(reader, writer):
+        writer.write(encode_frame({"command": "compile", "code": "x"}))
+        writer.write(encode_frame({"command": "cache_stats"}))
+        writer.write(encode_frame({"command": "unknown"}))
+        return [await receive(reader) for _ in range(3)]
+
+    error, stats, unknown = run_with_server(client, compile)
+    assert "Exception: Bad program" in error["error"]
+    assert stats["cache"]["misses"] == 1
+    assert unknown == {"error": "Unknown command: unknown"}
+
+
+def test_line_cache_stats():
+    line_cache = LineCache()
+
+    def compile(source_code):
+        return bytes(tokenize_stream(source_code, line_cache=line_cache).kinds)
+
+    async def client(reader, writer):
+        for source in ["x = 1\ny", "x = 1\nz"]:
+            writer.write(encode_frame({"command": "compile", "code": source}))
+            await receive(reader)
+        writer.write(encode_frame({"command": "cache_stats"}))
+        return await receive(reader)
+
+    stats = run_with_server(client, compile, line_cache=line_cache)
+    assert stats["line_cache"] == {
+        "hits": 1, "misses": 3, "hit_rate": 0.25, "entries": 3, "bytes": 7
+    }
+
+
+def test_concurrency_limits():
+    lock = threading.Lock()
+    running = 0
+    most_running = 0
+
+    def compile(source_code):
+        nonlocal running, most_running
+        with lock:
+            running += 1
+            most_running = max(most_running, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+        return b""
+
+    async def client(reader, writer):
+        for i in range(6):
+            writer.write(encode_frame({"command": "compile", "code": str(i)}))
+        return [await receive(reader) for _ in range(6)]
+
+    run_with_server(client, compile, max_concurrency=2)
+    assert most_running == 2
+    most_running = 0
+    run_with_server(client, compile, max_connection_concurrency=3)
+    assert most_running == 3
+
+
+def test_invalid_frame_closes_connection():
+    async def client(reader, writer):
+        writer.write(FRAME_HEADER.pack(1 << 31))
+        response = await receive(reader)
+        return response, await reader.read()
+
+    response, rest = run_with_server(client, lambda source_code: b"")
+    assert "exceeds the limit" in response["error"]
+    assert rest == b""
+
+
+def test_batch_items_are_streamed_as_they_finish():
+    def compile(source_code):
+        if source_code == "bad":
+            raise Exception("Bad program")
+        time.sleep(0.1 if source_code == "slow" else 0)
+        return source_code.encode()
+
+    async def client(reader, writer):
+        batch = {"command": "compile_batch", "codes": ["slow", "a", "bad"], "id": 7}
+        writer.write(encode_frame(batch))
+        writer.write(encode_frame({"command": "ping"}))
+        return [await receive(reader) for _ in range(5)]
+
+    *items, end, ping = run_with_server(client, compile)
+    assert items[-1]["index"] == 0
+    assert all(item["id"] == 7 for item in items)
+    assert sorted(item["index"] for item in items) == [0, 1, 2]
+    assert "Exception: Bad program" in {i["index"]: i for i in items}[2]["error"]
+    assert end == {"id": 7}
+    assert ping == {}
+
+
+def test_disk_cache_tier(tmp_path):
+    def compile(source_code):
+        return source_code.encode()
+
+    async def client(reader, writer):
+        writer.write(encode_frame({"command": "compile", "code": "a"}))
+        compiled = await receive(reader)
+        writer.write(encode_frame({"command": "cache_stats"}))
+        return compiled, await receive(reader)
+
+    run_with_server(client, compile, CompileCache(directory=str(tmp_path)))
+    compiled, stats = run_with_server(client, compile, CompileCache(directory=str(tmp_path)))
+    assert b64decode(compiled["program"]) == b"a"
+    assert compiled["stats"] == {}
+    assert stats["cache"]["disk_hits"] == 1
+    assert stats["cache"]["memory_entries"] == 1
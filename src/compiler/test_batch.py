@@ -0,0 +1,37 @@
+import time
+import pytest
+from base64 import b64decode
+from compiler.batch import compile_batch
+from compiler.compile_cache import CompileCache
+
+
+def compile(source_code):
+    if source_code == "bad":
+        raise Exception("Bad program")
+    if source_code == "slow":
+        time.sleep(0.5)
+    return source_code.encode()
+
+
+def test_batch_results_are_streamed_as_they_finish():
+    items = list(compile_batch(["slow", "a", "bad", "b"], compile, jobs=2))
+    assert items[-1]["index"] == 0
+    assert sorted(item["index"] for item in items) == [0, 1, 2, 3]
+    by_index = {item["index"]: item for item in items}
+    assert b64decode(by_index[1]["program"]) == b"a"
+    assert b64decode(by_index[3]["program"]) == b"b"
+    assert "Exception: Bad program" in by_index[2]["error"]
+    assert "program" not in by_index[2]
+
+
+def test_batch_uses_cache():
+    cache = CompileCache()
+    list(compile_batch(["a", "bad"], compile, cache, jobs=1))
+    items = list(compile_batch(["a", "bad"], compile, cache, jobs=1))
+    assert cache.stats()["memory_hits"] == 1
+    assert len(items) == 2
+
+
+def test_batch_rejects_invalid_sources():
+    with pytest.raises(Exception, match="list of source code strings"):
+        list(compile_batch("a", compile))  # type: ignore[arg-type]
@@ -0,0 +1,63 @@
+import os
+import pytest
+from compiler.build import MANIFEST_NAME, build, expand_inputs, format_summary
+
+
+def compile(source_code):
+    if "bad" in source_code:
+        raise Exception("Bad program")
+    return source_code.upper().encode()
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return path
+
+
+def test_expand_inputs(tmp_path):
+    write(tmp_path / "dir" / "a.src", "a")
+    write(tmp_path / "dir" / "sub" / "b.src", "b")
+    write(tmp_path / "dir" / ".hidden" / "c.src", "c")
+    write(tmp_path / "d.src", "d")
+    write(tmp_path / "e.txt", "e")
+    pairs = expand_inputs([str(tmp_path / "dir"), str(tmp_path / "*.src")])
+    assert [(str(i.relative_to(tmp_path)), str(o)) for i, o in pairs] == [
+        ("dir/a.src", "a"),
+        ("dir/sub/b.src", "sub/b"),
+        ("d.src", "d"),
+    ]
+    with pytest.raises(Exception, match="would both be compiled to a"):
+        expand_inputs([str(tmp_path / "dir"), str(write(tmp_path / "a.txt", "a"))])
+    with pytest.raises(Exception, match="No such input"):
+        expand_inputs([str(tmp_path / "missing")])
+
+
+def test_build_skips_unchanged_inputs(tmp_path):
+    source = tmp_path / "src"
+    out = tmp_path / "out"
+    a = write(source / "a.src", "a")
+    b = write(source / "b.src", "b")
+    bad = write(source / "bad.src", "bad")
+
+    results = build([str(source)], str(out), compile, jobs=2)
+    assert [r.status for r in results] == ["compiled", "compiled", "failed"]
+    assert (out / "a").read_bytes() == b"A"
+    assert results[2].error == "Exception: Bad program"
+    assert (out / MANIFEST_NAME).exists()
+
+    # Same content with a new timestamp is not recompiled.
+    os.utime(a, ns=(0, 0))
+    b.write_text("bb")
+    results = build([str(source)], str(out), compile, jobs=2)
+    assert [r.status for r in results] == ["unchanged", "compiled", "failed"]
+    assert (out / "b").read_bytes() == b"BB"
+
+    (out / "a").unlink()
+    bad.write_text("ok")
+    results = build([str(source)], str(out), compile, jobs=2)
+    assert [r.status for r in results] == ["compiled", "unchanged", "compiled"]
+
+    summary = format_summary(results, 1.5)
+    assert summary.startswith("2 compiled, 1 unchanged, 0 failed in 1.500 s")
+    assert "Slowest:" in summary
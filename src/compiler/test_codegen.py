@@ -0,0 +1,76 @@
+import os
+import platform
+import subprocess
+import pytest
+from compiler.__main__ import call_compiler
+from compiler.assembly import Mem, render
+
+pytestmark = pytest.mark.skipif(
+    platform.system() != "Linux" or platform.machine() != "x86_64",
+    reason="needs Linux on x86-64",
+)
+
+
+def compile_and_run(source_code, stdin="", tmp_path=None):
+    executable = call_compiler(source_code)
+    path = os.path.join(tmp_path, "program")
+    with open(path, "wb") as f:
+        f.write(executable)
+    os.chmod(path, 0o755)
+    return subprocess.run([path], input=stdin, capture_output=True, text=True, timeout=10)
+
+
+@pytest.mark.parametrize(
+    "source_code, output",
+    [
+        ("1 + 2 * 3", "7\n"),
+        ("-7 % 3", "-1\n"),
+        ("-(2 - 5)", "3\n"),
+        ("1 < 2 and 2 <= 2", "true\n"),
+        ("1 > 2 or 3 >= 4", "false\n"),
+        ("not true", "false\n"),
+        ("if 1 > 2 then 10 else 20", "20\n"),
+        ("if 1 > 2 then 10", ""),
+        ("{ var x = 1; { var x = 2; x = 3; }; x }", "1\n"),
+        ("{ var x = 1; x + (x = 5) }", "6\n"),
+        ("{ var x = 4000000000; x * x }", "-2446744073709551616\n"),
+        ("{ var i = 0; var s = 0; while i < 5 do { s = s + i; i = i + 1; }; s }", "10\n"),
+        ("{ print_int(-1234); print_int(0); print_bool(1 == 1); }", "-1234\n0\ntrue\n"),
+        ("{ var x = 0 - 9223372036854775807 - 1; x }", "-9223372036854775808\n"),
+        ("{ var x = 5000000000 * 5000000000; print_int(x % 7) }", "2\n"),
+        ("9223372036854775807 + 1", "-9223372036854775808\n"),
+        ("{ }", ""),
+        ("", ""),
+    ],
+)
+def test_compiled_program_output(source_code, output, tmp_path):
+    result = compile_and_run(source_code, tmp_path=tmp_path)
+    assert result.returncode == 0
+    assert result.stdout == output
+
+
+def test_short_circuit(tmp_path):
+    result = compile_and_run(
+        "{ false and { print_int(1); true }; true or { print_int(2); true }; "
+        "true and { print_int(3); false } }",
+        tmp_path=tmp_path,
+    )
+    assert result.stdout == "3\nfalse\n"
+
+
+def test_read_int(tmp_path):
+    source_code = "{ var x = read_int(); var y = read_int(); x * y }"
+    assert compile_and_run(source_code, "-12\n5\n", tmp_path).stdout == "-60\n"
+    result = compile_and_run(source_code, "7\n", tmp_path)
+    assert result.returncode == 1
+    assert result.stderr == "read_int: end of input\n"
+
+
+def test_render():
+    assert render([("label", "main"), ("movq", 5, Mem("%rbp", -8)), ("ret",)]) == (
+        "    .global _start\n"
+        "    .text\n"
+        "main:\n"
+        "    movq $5, -8(%rbp)\n"
+        "    ret\n"
+    )
@@ -0,0 +1,64 @@
+import asyncio
+import json
+from base64 import b64decode
+from compiler.__main__ import handle_request
+from compiler.commands import handle_command
+from compiler.compile_cache import CompileCache
+
+
+class FakeService:
+    def __init__(self):
+        self.cache = CompileCache()
+        self.line_cache = None
+
+    async def compile_cached(self, source_code):
+        if source_code == "bad":
+            raise Exception("Bad program")
+        return source_code.encode(), {"phases": []}
+
+    async def compile_batch(self, codes):
+        for index, code in reversed(list(enumerate(codes))):
+            yield {"index": index, "program": code}
+
+
+def messages(request):
+    async def collect():
+        return [m async for m in handle_command(json.dumps(request).encode(), FakeService())]
+
+    return asyncio.run(collect())
+
+
+def test_handle_command():
+    (compiled,) = messages({"command": "compile", "code": "a", "id": 3})
+    assert compiled == {"id": 3, "program": "YQ==", "stats": {"phases": []}}
+    assert messages({"command": "ping"}) == [{}]
+    assert "Exception: Bad program" in messages({"command": "compile", "code": "bad"})[0]["error"]
+    assert messages({"command": "foo"}) == [{"error": "Unknown command: foo"}]
+    assert messages({"command": "cache_stats"})[0]["cache"]["misses"] == 0
+
+
+def test_handle_command_batch():
+    assert messages({"command": "compile_batch", "codes": ["a", "b"], "id": 1}) == [
+        {"id": 1, "index": 1, "program": "b"},
+        {"id": 1, "index": 0, "program": "a"},
+        {"id": 1},
+    ]
+    (error,) = messages({"command": "compile_batch", "codes": "a"})
+    assert "Expected a list of source code strings" in error["error"]
+
+
+def test_handle_request_streams_json_lines():
+    cache = CompileCache()
+    request = json.dumps({"command": "compile_batch", "codes": ["1", "{"]}).encode()
+    chunks = list(handle_request(request, cache))
+    items = sorted((json.loads(chunk) for chunk in chunks[:-1]), key=lambda item: item["index"])
+    assert all(chunk.endswith(b"\n") for chunk in chunks[:-1])
+    assert b64decode(items[0]["program"]).startswith(b"\x7fELF")
+    assert "error" in items[1]
+    assert json.loads(chunks[-1]) == {}
+
+    request = json.dumps({"command": "compile", "code": "1"}).encode()
+    (response,) = handle_request(request, cache)
+    assert b64decode(json.loads(response)["program"]).startswith(b"\x7fELF")
+    (stats,) = handle_request(b'{"command": "cache_stats"}', cache)
+    assert json.loads(stats)["cache"]["memory_entries"] == 1
@@ -0,0 +1,69 @@
+import os
+import pytest
+from compiler.compile_cache import CompileCache
+
+
+def test_key_depends_on_source_and_options():
+    cache = CompileCache()
+    assert cache.key("1 + 2") == cache.key(b"1 + 2")
+    assert cache.key("1 + 2") != cache.key("1 + 3")
+    assert cache.key("1 + 2") != cache.key("1 + 2", {"optimize": True})
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = CompileCache(max_memory_bytes=10)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    assert cache.get("a") == b"aaaa"
+    cache.put("c", b"cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"aaaa"
+    assert cache.get("c") == b"cccc"
+    assert cache.stats() == {
+        "memory_hits": 3,
+        "disk_hits": 0,
+        "misses": 1,
+        "memory_entries": 2,
+        "memory_bytes": 8,
+    }
+
+
+def test_disk_tier_is_shared(tmp_path):
+    first = CompileCache(directory=str(tmp_path))
+    second = CompileCache(directory=str(tmp_path))
+    key = first.key("program")
+    first.put(key, b"executable")
+    assert second.get(key) == b"executable"
+    assert second.get(key) == b"executable"
+    assert second.stats()["disk_hits"] == 1
+    assert second.stats()["memory_hits"] == 1
+    files = [name for _, _, names in os.walk(tmp_path) for name in names]
+    assert files == [key[2:]]
+
+
+def test_get_or_compile_does_not_cache_errors():
+    cache = CompileCache()
+    calls: list[str] = []
+
+    def compile(source: str) -> bytes:
+        calls.append(source)
+        if source == "bad":
+            raise Exception("compilation failed")
+        return source.encode()
+
+    assert cache.get_or_compile("good", compile) == b"good"
+    assert cache.get_or_compile("good", compile) == b"good"
+    for _ in range(2):
+        with pytest.raises(Exception, match="compilation failed"):
+            cache.get_or_compile("bad", compile)
+    assert calls == ["good", "bad", "bad"]
+
+
+def test_counters_are_shared_with_forked_processes():
+    cache = CompileCache()
+    pid = os.fork()
+    if pid == 0:
+        cache.get("missing")
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert cache.stats()["misses"] == 1
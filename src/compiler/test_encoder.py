@@ -0,0 +1,126 @@
+import os
+import platform
+import shutil
+import subprocess
+import pytest
+from compiler.assembly import Mem, render
+from compiler.elf import build_executable, link, prebuilt_runtime
+from compiler.encoder import EncodingError, encode
+
+can_run = platform.system() == "Linux" and platform.machine() == "x86_64"
+
+INSTRUCTIONS = [
+    (("movq", "%rsi", "%rdi"), "4889f7"),
+    (("movq", 5, Mem("%rbp", -8)), "48c745f805000000"),
+    (("movq", Mem("%rbp", -16), "%r12"), "4c8b65f0"),
+    (("movq", "%r12", Mem("%r12", -200)), "4d89a42438ffffff"),
+    (("movq", 5, Mem("%rsp", 8)), "48c744240805000000"),
+    (("movabsq", -5, "%r11"), "49bbfbffffffffffffff"),
+    (("addq", 1, "%rbx"), "4883c301"),
+    (("addq", 100000, "%rbx"), "4881c3a0860100"),
+    (("subq", "%rsi", "%rdx"), "4829f2"),
+    (("cmpq", Mem("%rbp", -16), "%r14"), "4c3b75f0"),
+    (("cmpq", 0, Mem("%rbp", -8)), "48837df800"),
+    (("xorq", 1, "%rax"), "4883f001"),
+    (("testq", "%r10", "%r10"), "4d85d2"),
+    (("imulq", 10, "%r8"), "4d6bc00a"),
+    (("imulq", Mem("%r13"), "%r9"), "4d0faf4d00"),
+    (("idivq", "%rcx"), "48f7f9"),
+    (("negq", Mem("%rbp", -8)), "48f75df8"),
+    (("cqto",), "4899"),
+    (("setge", "%al"), "0f9dc0"),
+    (("movzbq", "%al", "%r15"), "4c0fb6f8"),
+    (("movzbq", Mem("%rbp", -8), "%rax"), "480fb645f8"),
+    (("movb", "%dl", Mem("%rsi")), "8816"),
+    (("leaq", Mem("%rbp", -1), "%rsi"), "488d75ff"),
+    (("pushq", "%r13"), "4155"),
+    (("pushq", Mem("%rbp", -8)), "ff75f8"),
+    (("popq", "%rdi"), "5f"),
+    (("syscall",), "0f05"),
+    (("ret",), "c3"),
+]
+
+
+@pytest.mark.parametrize("instruction, expected", INSTRUCTIONS)
+def test_encode(instruction, expected):
+    assert encode([instruction]).code.hex() == expected
+
+
+@pytest.mark.skipif(shutil.which("as") is None, reason="needs GNU binutils")
+def test_encodings_match_gnu_assembler(tmp_path):
+    source = tmp_path / "test.s"
+    obj = tmp_path / "test.o"
+    binary = tmp_path / "test.bin"
+    source.write_text(render(instruction for instruction, _ in INSTRUCTIONS))
+    subprocess.run(["as", "--64", "-o", obj, source], check=True)
+    subprocess.run(["objcopy", "-O", "binary", "-j", ".text", obj, binary], check=True)
+    assert binary.read_bytes().hex() == "".join(expected for _, expected in INSTRUCTIONS)
+
+
+def test_labels_and_relocations():
+    code = encode([("label", "a"), ("jmp", "b"), ("label", "b"), ("call", "f"), ("jl", "a")])
+    assert code.labels == {"a": 0, "b": 5}
+    assert code.code.hex() == "e900000000" "e800000000" "0f8cf0ffffff"
+    assert code.relocations == [(6, "f")]
+
+    linked, labels = link([encode([("label", "f"), ("ret",)]), code])
+    assert labels["f"] == 0
+    assert linked[7:11] == (-11).to_bytes(4, "little", signed=True)
+
+
+@pytest.mark.parametrize(
+    "instruction",
+    [("movq", 2**40, "%rax"), ("movq", "%eax", "%rbx"), ("jmp", "%rax"), ("frobq", "%rax")],
+)
+def test_unsupported_instructions(instruction):
+    with pytest.raises(EncodingError):
+        encode([instruction])
+
+
+def test_undefined_symbol():
+    with pytest.raises(Exception, match="Undefined symbol missing"):
+        link([encode([("call", "missing")])])
+
+
+def test_runtime_is_encoded_once():
+    assert prebuilt_runtime() is prebuilt_runtime()
+    # Only the runtime's call to the compiled program is left to link.
+    assert [label for _, label in prebuilt_runtime().relocations] == ["program"]
+
+
+def run_executable(executable, tmp_path):
+    path = os.path.join(tmp_path, "program")
+    with open(path, "wb") as f:
+        f.write(executable)
+    os.chmod(path, 0o755)
+    return subprocess.run([path], capture_output=True, text=True, timeout=10)
+
+
+@pytest.mark.skipif(not can_run, reason="needs Linux on x86-64")
+def test_executable_runs(tmp_path):
+    program = [
+        ("label", "program"),
+        ("pushq", "%rbp"),
+        ("movq", "%rsp", "%rbp"),
+        ("movq", -42, "%rdi"),
+        ("call", "print_int"),
+        ("movq", "%rbp", "%rsp"),
+        ("popq", "%rbp"),
+        ("ret",),
+    ]
+    result = run_executable(build_executable(program), tmp_path)
+    assert result.returncode == 0
+    assert result.stdout == "-42\n"
+
+
+@pytest.mark.skipif(
+    not can_run or shutil.which("as") is None, reason="needs Linux on x86-64 and binutils"
+)
+def test_unsupported_instructions_fall_back_to_toolchain(tmp_path):
+    program = [
+        ("label", "program"),
+        ("movl", 7, "%edi"),
+        ("jmp", "print_int"),
+    ]
+    result = run_executable(build_executable(program), tmp_path)
+    assert result.stdout == "7\n"
@@ -0,0 +1,71 @@
+import pytest
+import compiler.custom_ast as ast
+from compiler.flat_ast import AstArena, NodeKind
+from compiler.parser import parse
+from compiler.tokenizer import tokenizer
+
+SOURCE = """{
+    var x = 1;
+    while x < 10 do {
+        if x % 2 == 0 then f(x, true) else g();
+        x = -x + 1
+    };
+    if false then x;
+}"""
+
+
+@pytest.mark.parametrize("engine", ["recursive", "pratt", "iterative"])
+def test_parser_emits_into_arena(engine):
+    tokens = tokenizer(SOURCE)
+    arena = AstArena()
+    root = parse(tokens, engine=engine, builder=arena)
+    assert root == len(arena) - 1
+    assert arena.kinds[root] == NodeKind.BLOCK
+    assert arena.to_ast(root) == parse(tokens)
+
+
+def test_round_trip_through_arena():
+    tree = parse(tokenizer(SOURCE))
+    arena = AstArena()
+    root = arena.add_tree(tree)
+    assert arena.to_ast(root) == tree
+    assert arena.to_ast(arena.add_tree(ast.FunctionCall(ast.Identifier("f"), []))) == (
+        ast.FunctionCall(ast.Identifier("f"), [])
+    )
+
+
+def test_subtrees_are_contiguous():
+    arena = AstArena()
+    root = parse(tokenizer("a + f(b, 1) * 2"), builder=arena)
+    product = arena.child(root, 1)
+    assert arena.kinds[product] == NodeKind.BINARY_OP
+    assert arena.string(product) == "*"
+    kinds = [arena.kinds[node] for node in arena.subtree(product)]
+    assert kinds == [
+        NodeKind.IDENTIFIER, NodeKind.IDENTIFIER, NodeKind.LITERAL,
+        NodeKind.FUNCTION_CALL, NodeKind.LITERAL, NodeKind.BINARY_OP,
+    ]
+    assert list(arena.subtree(root)) == list(range(len(arena)))
+
+
+def test_literals_keep_their_type():
+    arena = AstArena()
+    one = arena.literal(1)
+    true = arena.literal(True)
+    assert arena.value(one) == 1 and arena.value(one) is not True
+    assert arena.value(true) is True
+
+
+def test_nodes_must_be_added_in_post_order():
+    arena = AstArena()
+    a = arena.identifier("a")
+    arena.identifier("b")
+    with pytest.raises(Exception, match="post-order"):
+        arena.unary_op(arena.operator("-"), a)
+
+
+def test_deep_tree_in_arena():
+    arena = AstArena()
+    source = "{ x; " * 5000 + "}" * 5000
+    root = parse(tokenizer(source), engine="iterative", builder=arena)
+    assert arena.to_ast(root) == parse(tokenizer(source), engine="iterative")
@@ -0,0 +1,161 @@
+import random
+import re
+import pytest
+import compiler.custom_ast as ast
+from bisect import bisect_right
+from compiler.incremental import Edit, Shifts, parse_source
+from compiler.parser import parse
+from compiler.tokenizer import tokenizer
+
+SOURCE = """{
+    var x = 1;
+    while x < 10 do {
+        x = x + (2 * f(x, { 3 }));
+        if x > 5 then { print_int(x) } else (y = (x));
+    };
+    { var z = -x; z }
+}
+"""
+
+
+def edit_of(source, text, replacement):
+    return Edit(source.index(text), len(text), replacement)
+
+
+def check(parsed):
+    assert parsed.tokens == tokenizer(parsed.source)
+    full = parse_source(parsed.source)
+    assert parsed.tree == full.tree
+    assert parsed.spans == full.spans
+
+
+@pytest.mark.parametrize(
+    "text, replacement",
+    [
+        ("2 * f", "20 * g"),
+        ("3", "3; 4"),
+        ("3", "var w = 3;\n w\n"),
+        ("z }", "z + 1 }"),
+        ("else (y = (x))", "else (y = (x + 1))"),
+        ("(x)", "(x, y)"),
+        ("{ 3 }", "{ }"),
+        ("\n", "\n\n\n"),
+        ("        x = x", "        x = x\n"),
+        ("x < 10", "x <\n 10"),
+        ("1;", "1; // comment;"),
+        ("{ print_int(x) }", "{ { print_int(x) } }"),
+        (";\n    {", ";\n    }{"),
+        ("}\n", ""),
+        ("{\n", ""),
+    ],
+)
+def test_edit_matches_full_parse(text, replacement):
+    parsed = parse_source(SOURCE)
+    edit = edit_of(SOURCE, text, replacement)
+    new_source = SOURCE[: edit.offset] + replacement + SOURCE[edit.offset + edit.removed :]
+    try:
+        expected = parse(tokenizer(new_source))
+    except Exception as e:
+        with pytest.raises(Exception, match=re.escape(str(e))):
+            parsed.apply(edit)
+        assert parsed.source == SOURCE
+        check(parsed)
+        return
+    parsed.apply(edit)
+    assert parsed.source == new_source
+    assert parsed.tree == expected
+    check(parsed)
+
+
+def test_untouched_nodes_are_reused():
+    parsed = parse_source(SOURCE)
+    old_tree = parsed.tree
+    parsed.apply(edit_of(SOURCE, "-x", "-x * 2"))
+    assert isinstance(parsed.tree, ast.Block) and isinstance(old_tree, ast.Block)
+    assert parsed.tree is not old_tree
+    assert parsed.tree.statements[0] is old_tree.statements[0]
+    assert parsed.tree.statements[1] is old_tree.statements[1]
+    assert parsed.tree.result_expression.statements[0] is not (
+        old_tree.result_expression.statements[0]
+    )
+    assert old_tree == parse(tokenizer(SOURCE))
+    check(parsed)
+
+
+def test_edit_without_token_changes_keeps_tree():
+    parsed = parse_source(SOURCE)
+    old_tree = parsed.tree
+    parsed.apply(edit_of(SOURCE, "x = 1;", "x  =  1; # one\n"))
+    assert parsed.tree is old_tree
+    check(parsed)
+
+
+def test_assignment_target_is_checked():
+    source = "{ (x) = 1 }"
+    with pytest.raises(Exception, match="Left operand of assignment"):
+        parse_source(source).apply(edit_of(source, "x", "x + 1"))
+
+
+def test_bracket_inserted_before_block_on_same_line():
+    parsed = parse_source("{\n{ 1 } }")
+    with pytest.raises(Exception, match='expected ";"'):
+        parsed.apply(Edit(2, 0, "{"))
+    parsed.apply(Edit(2, 0, "{ 2 }; "))
+    check(parsed)
+
+
+def test_empty_source():
+    parsed = parse_source("")
+    parsed.apply(Edit(0, 0, "{ 1 }"))
+    assert parsed.tree == ast.Block([], ast.Literal(1))
+    parsed.apply(Edit(0, 5, ""))
+    assert parsed.tree is None
+
+
+def test_edit_outside_of_source():
+    with pytest.raises(Exception, match="outside of the source"):
+        parse_source("1").apply(Edit(1, 1, ""))
+
+
+def test_random_edits():
+    rng = random.Random(22)
+    fragments = ["x", " ", "\n", "1", "+", "(", ")", "{", "}", ";", "f(", ",", "y = "]
+    parsed = parse_source(SOURCE)
+    for _ in range(300):
+        source = parsed.source
+        offset = rng.randrange(len(source) + 1)
+        removed = rng.randrange(min(4, len(source) - offset) + 1)
+        edit = Edit(offset, removed, "".join(rng.choices(fragments, k=rng.randrange(3))))
+        try:
+            parsed.apply(edit)
+        except Exception:
+            assert parsed.source == source
+        check(parsed)
+
+
+def test_random_edits_between_reads():
+    rng = random.Random(7)
+    fragments = ["x", " ", "\n", "\n\n", "1", "+ y", "(", ")", ";", "f(", "{ 2 }"]
+    parsed = parse_source("{\n" + SOURCE.replace("\n}", "\n};") * 4 + "}")
+    for step in range(400):
+        source = parsed.source
+        offset = rng.randrange(len(source) + 1)
+        removed = rng.randrange(min(4, len(source) - offset) + 1)
+        try:
+            parsed.apply(Edit(offset, removed, rng.choice(fragments)))
+        except Exception:
+            assert parsed.source == source
+        assert parsed.tree == parse_source(parsed.source).tree
+        if step % 50 == 49:
+            check(parsed)
+
+
+def test_shift_offsets():
+    rng = random.Random(3)
+    shifts = Shifts()
+    for _ in range(20):
+        shifts.add(rng.randrange(50), rng.randrange(-5, 6))
+    for epoch, (thresholds, amounts) in enumerate(shifts.offsets()):
+        for position in range(-10, 80):
+            moved = position + amounts[bisect_right(thresholds, position)]
+            assert moved == shifts.current(position, epoch)
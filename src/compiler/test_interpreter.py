@@ -0,0 +1,78 @@
+import io
+import pytest
+from compiler.interpreter import compile_closures, interpret
+from compiler.parser import parse
+from compiler.tokenizer import tokenizer
+
+
+def run(source_code):
+    return interpret(parse(tokenizer(source_code)))
+
+
+@pytest.mark.parametrize(
+    "source_code, expected",
+    [
+        ("1 + 2 * 3", 7),
+        ("(1 + 2) * 3", 9),
+        ("7 % 3", 1),
+        ("-7 % 3", -1),
+        ("-(2 - 5)", 3),
+        ("1 < 2 and 2 <= 2", True),
+        ("1 > 2 or 3 >= 4", False),
+        ("not true", False),
+        ("1 == 1 and 1 != 2", True),
+        ("if 1 < 2 then 10 else 20", 10),
+        ("if 1 > 2 then 10 else 20", 20),
+        ("if 1 > 2 then 10", None),
+        ("{ var x = 1; x = x + 1; x }", 2),
+        ("{ var x = 1; var y = 2; x = y = 5; x + y }", 10),
+        ("{ var x = 1; { var x = 2; x = 3; }; x }", 1),
+        ("{ var x = 1; { x = 2; }; x }", 2),
+        ("{ var x = 1; { var x = x + 1; x } }", 2),
+        ("{ var i = 0; var s = 0; while i < 5 do { s = s + i; i = i + 1; }; s }", 10),
+        ("{ }", None),
+        ("{ var a = 9223372036854775807; a + 1 }", -9223372036854775808),
+        ("{ var a = -9223372036854775807; a - 2 }", 9223372036854775807),
+        ("{ var a = 5000000000; a * a }", 6553255926290448384),
+        ("{ var a = 9223372036854775807; -(a + 1) }", -9223372036854775808),
+        ("9223372036854775808", -9223372036854775808),
+    ],
+)
+def test_interpret(source_code, expected):
+    result = run(source_code)
+    assert result == expected and type(result) is type(expected)
+
+
+def test_short_circuit(capsys):
+    assert run("false and { print_int(1); true }") is False
+    assert run("true or { print_int(2); true }") is True
+    assert run("true and { print_int(3); false }") is False
+    assert capsys.readouterr().out == "3\n"
+
+
+def test_builtins(capsys, monkeypatch):
+    monkeypatch.setattr("sys.stdin", io.StringIO("41\n"))
+    run("{ var x = read_int(); print_int(x + 1); print_bool(x > 100) }")
+    assert capsys.readouterr().out == "42\nfalse\n"
+
+
+@pytest.mark.parametrize(
+    "source_code, message",
+    [
+        ("x + 1", 'Undefined variable "x"'),
+        ("{ var x = x; }", 'Undefined variable "x"'),
+        ("{ var x = 1; var x = 2; }", 'already declared in this block'),
+        ("foo(1)", 'Unknown function "foo"'),
+        ("{ { var x = 1; }; x }", 'Undefined variable "x"'),
+    ],
+)
+def test_errors_are_found_before_running(source_code, message, capsys):
+    with pytest.raises(Exception, match=message):
+        compile_closures(parse(tokenizer("{ print_int(1); " + source_code + " }")))
+    assert capsys.readouterr().out == ""
+
+
+def test_program_can_be_run_again():
+    program = compile_closures(parse(tokenizer("{ var x = 0; x = x + 1; x }")))
+    assert program() == 1
+    assert program() == 1
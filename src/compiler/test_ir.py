@@ -0,0 +1,128 @@
+import io
+import pytest
+from compiler.interpreter import interpret
+from compiler.ir import BOOL, INT, UNIT, lower
+from compiler.parser import parse
+from compiler.tokenizer import tokenizer
+from compiler.vm import run_ir, translate
+
+
+def run(source_code):
+    return run_ir(lower(parse(tokenizer(source_code))))
+
+
+@pytest.mark.parametrize(
+    "source_code",
+    [
+        "1 + 2 * 3",
+        "-7 % 3",
+        "-(2 - 5)",
+        "1 < 2 and 2 <= 2",
+        "1 > 2 or 3 >= 4",
+        "not true",
+        "1 == 1 and 1 != 2",
+        "if 1 < 2 then 10 else 20",
+        "if 1 > 2 then 10 else 20",
+        "if 1 > 2 then 10",
+        "{ var x = 1; x = x + 1; x }",
+        "{ var x = 1; var y = 2; x = y = 5; x + y }",
+        "{ var x = 1; { var x = 2; x = 3; }; x }",
+        "{ var x = 1; { var x = x + 1; x } }",
+        "{ var x = 1; (x = 2) + x }",
+        "{ var x = 1; x + (x = 5) }",
+        "{ var x = 1; var y = x; y = 2; x }",
+        "{ var b = 1 < 2; if b then 1 else 2 }",
+        "{ var i = 0; var s = 0; while i < 5 do { s = s + i; i = i + 1; }; s }",
+        "{ var i = 0; while i < 3 do { if i == 1 then { i = 5 } else { i = i + 1 } }; i }",
+        "{ }",
+        "{ var a = 9223372036854775807; a + 1 }",
+        "{ var a = -9223372036854775807; a - 2 }",
+        "{ var a = 5000000000; a * a }",
+        "{ var a = 9223372036854775807; -(a + 1) }",
+        "9223372036854775808",
+    ],
+)
+def test_vm_matches_interpreter(source_code):
+    tree = parse(tokenizer(source_code))
+    result = run_ir(lower(tree))
+    expected = interpret(tree)
+    assert result == expected and type(result) is type(expected)
+
+
+def test_short_circuit(capsys):
+    assert run("false and { print_int(1); true }") is False
+    assert run("true or { print_int(2); true }") is True
+    assert run("true and { print_int(3); false }") is False
+    assert capsys.readouterr().out == "3\n"
+
+
+def test_arguments_are_evaluated_in_order(capsys):
+    run("{ var x = 1; print_int(x); print_int(x = 2); print_int(x) }")
+    assert capsys.readouterr().out == "1\n2\n2\n"
+    run("{ var x = 1; print_int(x + (x = 10)) }")
+    assert capsys.readouterr().out == "11\n"
+
+
+def test_builtins(capsys, monkeypatch):
+    monkeypatch.setattr("sys.stdin", io.StringIO("41\n"))
+    run("{ var x = read_int(); print_int(x + 1); print_bool(x > 100) }")
+    assert capsys.readouterr().out == "42\nfalse\n"
+
+
+@pytest.mark.parametrize(
+    "source_code, message",
+    [
+        ("x + 1", 'Undefined variable "x"'),
+        ("{ var x = x; }", 'Undefined variable "x"'),
+        ("{ var x = 1; var x = 2; }", 'already declared in this block'),
+        ("foo(1)", 'Unknown function "foo"'),
+        ("{ { var x = 1; }; x }", 'Undefined variable "x"'),
+    ],
+)
+def test_errors_are_found_when_lowering(source_code, message):
+    with pytest.raises(Exception, match=message):
+        lower(parse(tokenizer(source_code)))
+
+
+@pytest.mark.parametrize(
+    "source_code, result_type",
+    [("1 + 2", INT), ("1 < 2", BOOL), ("print_int(1)", UNIT), ("{ var x = true; x }", BOOL)],
+)
+def test_result_type(source_code, result_type):
+    assert lower(parse(tokenizer(source_code))).result_type == result_type
+
+
+def test_dump():
+    program = lower(parse(tokenizer(
+        "{ var x = 3; while x > 0 do { print_int(x); x = x - 1 }; x == 0 }"
+    )))
+    assert program.dump() == (
+        "    t1 = const 3\n"
+        "    unit = const unit\n"
+        "    t2 = const 0\n"
+        "    t5 = const 1\n"
+        "    x = copy t1\n"
+        "L0:\n"
+        "    t3 = gt x, t2\n"
+        "    jump_if_false t3, L1\n"
+        "    t4 = call print_int(x)\n"
+        "    x = sub x, t5\n"
+        "    jump L0\n"
+        "L1:\n"
+        "    t6 = eq x, t2\n"
+        "    return t6\n"
+    )
+
+
+def test_repeated_declarations_are_numbered_in_dump():
+    dump = lower(parse(tokenizer("{ var x = 1; { var x = x + 1; x } }"))).dump()
+    assert "    x.1 = add x, t" in dump
+
+
+def test_translate_fuses_comparisons_into_branches():
+    source = translate(lower(parse(tokenizer(
+        "{ var x = 3; while x > 0 do { print_int(x); x = x - 1 }; x == 0 }"
+    ))))
+    assert "if r0 > r3:" in source
+    assert "r7 = r0 == r3\n" in source
+    assert source.count("pc = 1\n") == 2
@@ -0,0 +1,142 @@
+import pytest
+import compiler.custom_ast as ast
+from compiler.interpreter import compile_closures, interpret
+from compiler.optimizer import simplify
+from compiler.parser import parse
+from compiler.tokenizer import tokenizer
+
+
+def tree(source_code):
+    return parse(tokenizer(source_code))
+
+
+@pytest.mark.parametrize(
+    "source_code, expected, removed",
+    [
+        ("1 + 2 * 3", "7", 4),
+        ("-7 % 3 == -1", "true", 6),
+        ("not (1 < 2)", "false", 3),
+        ("true == false", "false", 2),
+        ("(x + 1) * 1", "x + 1", 2),
+        ("0 + -y", "-y", 2),
+        ("(x * y) - 0 + 1 * (y % 2)", "x * y + y % 2", 4),
+        ("true and b", "b", 2),
+        ("(a < b) and true", "a < b", 2),
+        ("false and f()", "false", 3),
+        ("true or f()", "true", 3),
+        ("false or b", "b", 2),
+        ("- -(x * 2)", "x * 2", 2),
+        ("not not (a == b)", "a == b", 2),
+        ("if true then a else b", "a", 3),
+        ("if 1 > 2 then a else b", "b", 5),
+        ("if false then a", None, 2),
+        ("if true then { f(); 1 }", "{ f(); }", 2),
+        ("while false do f()", None, 3),
+        ("{ 1; 2 + 3; f(); x }", "{ f(); x }", 4),
+        ("{ 2 * 3 }", "6", 3),
+        ("{ var x = 2 * 3 }", "{ var x = 6 }", 2),
+    ],
+)
+def test_simplify(source_code, expected, removed):
+    simplified, removed_nodes = simplify(tree(source_code))
+    assert simplified == (ast.NONE_LITERAL if expected is None else tree(expected))
+    assert removed_nodes == removed
+
+
+@pytest.mark.parametrize(
+    "source_code",
+    [
+        "1 % 0",
+        "true + 0",
+        "1 == true",
+        "f() * 0",
+        "x = x + 0",
+        "x * 1",
+        "b and true",
+        "b or false",
+        "--x",
+        "not not b",
+        "b and false",
+        "true or false and x",
+    ],
+)
+def test_keeps_errors_and_effects(source_code):
+    simplified, _ = simplify(tree(source_code))
+    expected = {
+        "true or false and x": "true",
+    }.get(source_code, source_code)
+    assert simplified == tree(expected)
+
+
+@pytest.mark.parametrize(
+    "source_code",
+    [
+        "{ var t = true; t + 0 }",
+        "{ var t = 3; t and true }",
+        "{ var t = 0; t or false }",
+        "{ var t = true; --t }",
+        "{ var t = 2; not not t }",
+        "{ if true then var y = 3; y }",
+        "{ var x = 1; if true then var x = 2; x }",
+        "{ if false then var y = 3; y }",
+        "{ if true then 1 else var y = 3; y }",
+        "{ var x = 1; while false do var x = 2; x }",
+        "{ while false do var y = 2; y }",
+        "{ var x = 0; { if x == 0 then var x = 5 else 1 }; x }",
+        "{ var x = 0; { while x == 1 do var x = 5 }; x }",
+    ],
+)
+def test_simplify_keeps_values_and_scopes(source_code):
+    def run(tree):
+        try:
+            return compile_closures(tree)()
+        except Exception as e:
+            return str(e)
+
+    original = tree(source_code)
+    assert run(simplify(original)[0]) == run(original)
+
+
+def test_unchanged_subtrees_are_shared():
+    original = tree("{ f(a + b); 1 + 2 }")
+    simplified, _ = simplify(original)
+    assert isinstance(original, ast.Block) and isinstance(simplified, ast.Block)
+    assert simplified.statements[0] is original.statements[0]
+    assert simplify(original.statements[0])[0] is original.statements[0]
+
+
+def test_simplified_program_computes_the_same_value():
+    source_code = """{
+        var x = 10 * 1 + 0;
+        var total = 0;
+        while x > 0 * 5 do {
+            if true then { total = total + x * 1; };
+            x = x - 1 + 0;
+        };
+        if not false then total else 0
+    }"""
+    simplified, removed_nodes = simplify(tree(source_code))
+    assert removed_nodes > 0
+    assert interpret(simplified) == interpret(tree(source_code)) == 55
+
+
+def test_deep_trees():
+    simplified, removed_nodes = simplify(tree("1" + " + 1" * 5000))
+    assert simplified == ast.Literal(5001)
+    assert removed_nodes == 10000
+
+
+@pytest.mark.parametrize(
+    "source_code, expected",
+    [
+        ("9223372036854775807 + 1 < 0", "true"),
+        ("(9223372036854775807 + 1) % 7", "-1"),
+        ("-(-9223372036854775807 - 1)", "-9223372036854775807 - 1"),
+        ("9223372036854775808 == -9223372036854775807 - 1", "true"),
+        ("5000000000 * 5000000000", "6553255926290448384"),
+    ],
+)
+def test_folding_wraps_like_the_backends(source_code, expected):
+    simplified, _ = simplify(tree(source_code))
+    assert simplified == simplify(tree(expected))[0]
+    assert interpret(simplified) == interpret(tree(source_code))
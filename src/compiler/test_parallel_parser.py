@@ -0,0 +1,85 @@
+import pickle
+import pytest
+import compiler.custom_ast as ast
+from compiler.parallel_parser import parallel_parse, split_chunks, top_level_statements
+from compiler.parser import PARSERS, parse
+from compiler.tokenizer import tokenize_stream, tokenizer
+
+SOURCE = """{
+    var x = 1;
+    f(x, { a; b });
+    while x < 3 do { x = x + 1; };
+    if not x then (y = -x) else { true };
+    { var z = x; z }
+}"""
+
+
+def parallel_and_serial(tokens, engine="recursive"):
+    return parallel_parse(tokens, engine, jobs=2, min_tokens=0), parse(tokens, engine)
+
+
+@pytest.mark.parametrize("engine", PARSERS)
+@pytest.mark.parametrize("tokenize", [tokenizer, tokenize_stream])
+@pytest.mark.parametrize(
+    "source",
+    [SOURCE, SOURCE.replace("{ var z = x; z }", "z;"), "{ a; b }", "{ }", "{ a; b } + 1", "1 + 2"],
+)
+def test_parallel_parse_builds_same_tree(source, tokenize, engine):
+    parallel, serial = parallel_and_serial(tokenize(source), engine)
+    assert parallel == serial
+
+
+def test_parallel_parse_keeps_shared_nodes():
+    tree, _ = parallel_and_serial(tokenizer("{ a + 1; b + { }; c = true; false }"))
+    assert tree.statements[0].op is ast.operator("+")
+    assert tree.statements[1].right.result_expression is ast.NONE_LITERAL
+    assert tree.statements[2].right is ast.TRUE_LITERAL
+    assert tree.result_expression is ast.FALSE_LITERAL
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "{ a; b c; d }",
+        "{ a; ; b }",
+        "{ a;\n b;\n f(1, ) }",
+        "{ a; (b; c) }",
+        "{ a; { b }",
+        "{ a;\n var x = { 1 = 2 } }",
+    ],
+)
+def test_parallel_parse_raises_same_errors(source):
+    tokens = tokenizer(source)
+    with pytest.raises(Exception) as serial_error:
+        parse(tokens)
+    with pytest.raises(Exception) as parallel_error:
+        parallel_parse(tokens, jobs=2, min_tokens=0)
+    assert str(parallel_error.value) == str(serial_error.value)
+
+
+def test_top_level_statements():
+    tokens = tokenize_stream("{ f(a; b); { c; d }; e }")
+    ranges = top_level_statements(tokens.kinds, tokens.bracket_matches())
+    assert ranges == [(1, 7), (8, 13), (14, 15)]
+    tokens = tokenize_stream("{ a; }")
+    assert top_level_statements(tokens.kinds, tokens.bracket_matches()) == [(1, 2)]
+    for source in ["a; b", "{ a } + { b }", "{ a; ( }"]:
+        tokens = tokenize_stream(source)
+        assert top_level_statements(tokens.kinds, tokens.bracket_matches()) is None
+
+
+def test_split_chunks():
+    ranges = [(1, 3), (4, 6), (7, 20), (21, 23), (24, 26), (27, 29)]
+    assert split_chunks(ranges, 4) == [(0, 3), (3, 6)]
+    assert split_chunks(ranges, 1) == [(0, 6)]
+    assert split_chunks(ranges, 9) == [(0, 2), (2, 3), (3, 5), (5, 6)]
+
+
+def test_pickled_trees_keep_shared_nodes():
+    tree = parse(tokenizer("{ x = 1 + 2; f(true, { }) }"))
+    copy = pickle.loads(pickle.dumps(tree))
+    assert copy == tree
+    assert copy.statements[0].right.op is tree.statements[0].right.op
+    assert copy.result_expression.args[0] is ast.TRUE_LITERAL
+    assert copy.result_expression.args[1].result_expression is ast.NONE_LITERAL
+    assert pickle.loads(pickle.dumps(ast.Literal(None))) is not ast.NONE_LITERAL
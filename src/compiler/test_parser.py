@@ -1,7 +1,8 @@
 import pytest
 from collections.abc import Sequence
-from compiler.tokenizer import Token, SourceLocation
+from compiler.tokenizer import Token, SourceLocation, tokenizer, tokenize_stream
 from compiler.parser import parse
+from compiler.flat_ast import AstArena
 import compiler.custom_ast as ast
 from compiler.utils import get_keywords
 
@@ -451,12 +452,13 @@ def test_keyword_as_var_throws():
         tokens = create_tokens(["var", t[1]], [keyword, t[1]], ["=", t[3]], ["1", t[0]])
         with pytest.raises(
             Exception,
-            match=r"SourceLocation\(line=0, column=0\): expected \"\(\", an integer literal or an identifier",
+            match=r"SourceLocation\(line=0, column=0\): expected "
+            r"(\"\(\", an integer literal or an identifier|an identifier \(variable\))",
         ):
             parse(tokens)
 
 
-def test_keyword_as_var_throws():
+def test_call_as_var_throws():
     tokens = create_tokens(
         ["var", t[1]], ["f", t[1]], ["(", t[2]], [")", t[2]], ["=", t[3]], ["1", t[0]]
     )
@@ -481,3 +483,214 @@ def test_declare_var_inside_block():
     )
     parsed = parse(tokens)
     assert parsed == correct_answer
+
+
+def test_parse_token_stream():
+    source = "{ var x = f(1, 2); while x > 0 do x = x - 1; x }"
+    assert parse(tokenize_stream(source)) == parse(tokenizer(source))
+
+
+def test_token_stream_error_location():
+    with pytest.raises(Exception, match=r"line=2, column=3\): expected \"\)\""):
+        parse(tokenize_stream("f(1\n  2)"))
+
+
+def test_reserved_words_are_not_identifiers():
+    tokens = create_tokens(["x", t[1]], ["+", t[3]], ["then", t[1]])
+    with pytest.raises(
+        Exception,
+        match=r"SourceLocation\(line=0, column=0\): expected \"\(\", an integer literal or an identifier",
+    ):
+        parse(tokens)
+
+
+ENGINE_SOURCES = [
+    "a = b = c or d and e == f != g < h <= i > j >= k + l - m * n / o % p",
+    "-not -x * (y + 2) - f(a, b = 3)",
+    "if a then b = 1 else while c do { var x = 2; x }",
+    "{ f(); { g() } ; h }",
+]
+
+ENGINE_ERRORS = ["a + b = c", "1 = 2", "f(1, )", "{ a b }", "(a + b", "x y"]
+
+
+@pytest.mark.parametrize("source", ENGINE_SOURCES)
+def test_pratt_engine_builds_same_tree(source):
+    tokens = tokenizer(source.replace("/", "*"))
+    assert parse(tokens, engine="pratt") == parse(tokens)
+
+
+@pytest.mark.parametrize("source", ENGINE_ERRORS)
+def test_pratt_engine_raises_same_errors(source):
+    tokens = tokenizer(source)
+    with pytest.raises(Exception) as recursive_error:
+        parse(tokens)
+    with pytest.raises(Exception) as pratt_error:
+        parse(tokens, engine="pratt")
+    assert str(pratt_error.value) == str(recursive_error.value)
+
+
+def test_pratt_engine_handles_division_precedence():
+    correct_answer = ast.BinaryOp(
+        ast.Identifier("a"),
+        ast.Operator("+"),
+        ast.BinaryOp(ast.Identifier("b"), ast.Operator("/"), ast.Literal(2)),
+    )
+    tokens = create_tokens(["a", t[1]], ["+", t[3]], ["b", t[1]], ["/", t[3]], [2, t[0]])
+    assert parse(tokens, engine="pratt") == correct_answer
+
+
+def test_unknown_engine():
+    with pytest.raises(Exception, match="Unknown parser engine: foo"):
+        parse(create_tokens(["a", t[1]]), engine="foo")
+
+
+@pytest.mark.parametrize("source", ENGINE_SOURCES)
+def test_iterative_engine_builds_same_tree(source):
+    tokens = tokenizer(source.replace("/", "*"))
+    assert parse(tokens, engine="iterative") == parse(tokens)
+
+
+@pytest.mark.parametrize("source", ENGINE_ERRORS + ["var f() = 1", "var 1 = 2", "if a b"])
+def test_iterative_engine_raises_same_errors(source):
+    tokens = tokenizer(source)
+    with pytest.raises(Exception) as recursive_error:
+        parse(tokens)
+    with pytest.raises(Exception) as iterative_error:
+        parse(tokens, engine="iterative")
+    assert str(iterative_error.value) == str(recursive_error.value)
+
+
+def nested(depth, innermost, wrap):
+    node = innermost
+    for _ in range(depth - 1):
+        node = wrap(node)
+    return node
+
+
+# Source and expected tree of each shape, nested `depth` times.
+DEEP_SHAPES = {
+    "parentheses": (
+        lambda depth: "(" * depth + "x" + ")" * depth,
+        lambda depth: ast.Identifier("x"),
+    ),
+    "blocks": (
+        lambda depth: "{ x; " * depth + "}" * depth,
+        lambda depth: nested(
+            depth,
+            ast.Block([ast.Identifier("x")], ast.NONE_LITERAL),
+            lambda node: ast.Block([ast.Identifier("x")], node),
+        ),
+    ),
+    "else_if_chain": (
+        lambda depth: "if a then b else " * depth + "c",
+        lambda depth: nested(
+            depth + 1,
+            ast.Identifier("c"),
+            lambda node: ast.TernaryOp(ast.Identifier("a"), ast.Identifier("b"), node),
+        ),
+    ),
+    "prefix_operators": (
+        lambda depth: "not " * depth + "x",
+        lambda depth: nested(
+            depth + 1, ast.Identifier("x"), lambda node: ast.UnaryOp(ast.operator("not"), node)
+        ),
+    ),
+    "assignments": (
+        lambda depth: "a = " * depth + "1",
+        lambda depth: nested(
+            depth + 1,
+            ast.Literal(1),
+            lambda node: ast.BinaryOp(ast.Identifier("a"), ast.operator("="), node),
+        ),
+    ),
+    "calls": (
+        lambda depth: "f(" * depth + ")" * depth,
+        lambda depth: nested(
+            depth,
+            ast.FunctionCall(ast.Identifier("f"), None),
+            lambda node: ast.FunctionCall(ast.Identifier("f"), [node]),
+        ),
+    ),
+}
+
+
+@pytest.mark.parametrize("shape", DEEP_SHAPES.values(), ids=DEEP_SHAPES.keys())
+def test_iterative_engine_parses_deep_nesting(shape):
+    source, expected = shape
+    assert parse(tokenize_stream(source(3))) == expected(3)
+    parsed = parse(tokenize_stream(source(20000)), engine="iterative")
+    assert parsed == expected(20000)
+    assert repr(parsed).endswith(")")
+
+
+def test_deep_trees_compare_and_print_without_recursion():
+    left: ast.Expression = ast.Literal(1)
+    right: ast.Expression = ast.Literal(1)
+    for _ in range(50000):
+        left = ast.UnaryOp(ast.Operator("-"), left)
+        right = ast.UnaryOp(ast.Operator("-"), right)
+    assert left == right
+    assert left != ast.UnaryOp(ast.Operator("-"), right)
+    assert repr(left) == "UnaryOp(op=Operator(symbol='-'), right=" * 50000 + "Literal(value=1)" + ")" * 50000
+
+
+def test_ast_nodes_share_operators_and_literals():
+    parsed = parse(tokenizer("{ a + b + true; false }"))
+    assert isinstance(parsed, ast.Block)
+    sum_node = parsed.statements[0]
+    assert isinstance(sum_node, ast.BinaryOp) and isinstance(sum_node.left, ast.BinaryOp)
+    assert sum_node.op is sum_node.left.op is ast.operator("+")
+    assert sum_node.right is ast.TRUE_LITERAL
+    assert parsed.result_expression is ast.FALSE_LITERAL
+    assert parse(tokenizer("{ a; }")).result_expression is ast.NONE_LITERAL
+    assert not hasattr(sum_node, "__dict__")
+
+
+@pytest.mark.parametrize("engine", ["recursive", "pratt", "iterative"])
+@pytest.mark.parametrize("source", ENGINE_SOURCES + ["{ { } ; ({ 1 }) + { { 2 } } }"])
+def test_lazy_parse_builds_same_tree(engine, source):
+    tokens = tokenize_stream(source.replace("/", "*"))
+    assert parse(tokens, engine=engine, lazy=True) == parse(tokens)
+
+
+def test_lazy_blocks_are_parsed_on_first_access():
+    parsed = parse(tokenizer("{ var x = { f(x); { g() } }; x }"), lazy=True)
+    assert type(parsed) is ast.LazyBlock
+    assert isinstance(parsed.statements[0], ast.Variable)
+    assert type(parsed) is ast.Block
+    inner = parsed.statements[0].initializer
+    assert type(inner) is ast.LazyBlock
+    assert inner.result_expression == ast.Block([], ast.FunctionCall(ast.Identifier("g"), None))
+    assert type(inner) is ast.Block
+    assert parsed.result_expression == ast.Identifier("x")
+
+
+def test_lazy_parse_raises_errors_inside_blocks_on_access():
+    parsed = parse(tokenizer("{ a; { b c } }"), lazy=True)
+    assert isinstance(parsed, ast.Block)
+    inner = parsed.result_expression
+    with pytest.raises(Exception, match=r"column=10\): expected \";\""):
+        inner.statements
+    with pytest.raises(Exception, match=r"column=10\): expected \";\""):
+        repr(inner)
+
+
+@pytest.mark.parametrize("source", ["{ a; { b }", "{ a ) }", "f({ 1 )", "({ x ) }", "{ } }"])
+def test_lazy_parse_reports_unmatched_braces(source):
+    tokens = tokenizer(source)
+    with pytest.raises(Exception) as error:
+        parse(tokens)
+    with pytest.raises(Exception) as lazy_error:
+        parse(tokens, lazy=True)
+    assert str(lazy_error.value) == str(error.value)
+
+
+def test_lazy_parse_handles_deep_blocks_with_recursive_engine():
+    source, expected = DEEP_SHAPES["blocks"]
+    assert parse(tokenize_stream(source(20000)), lazy=True) == expected(20000)
+
+
+def test_lazy_parse_needs_ast_builder():
+    with pytest.raises(Exception, match="Lazy parsing only builds custom_ast trees"):
+        parse(tokenizer("{ }"), builder=AstArena(), lazy=True)
@@ -0,0 +1,91 @@
+import io
+import os
+import shutil
+import subprocess
+import pytest
+from compiler.assembly import Mem, assemble_and_link, render
+from compiler.codegen import generate_assembly
+from compiler.interpreter import interpret
+from compiler.ir import lower
+from compiler.parser import parse
+from compiler.regalloc import CALLEE_SAVED, allocate_registers, live_intervals
+from compiler.tokenizer import tokenizer
+
+LOOP = """
+{
+    var i = 0;
+    var total = 0;
+    while i < 100 do {
+        var j = 0;
+        while j < 10 do {
+            total = total + i * j;
+            j = j + 1;
+        };
+        i = i + 1;
+    };
+    total
+}
+"""
+
+# Twenty values that are all needed at the end, more than there are registers,
+# around a loop and calls.
+PRESSURE = (
+    "{ "
+    + " ".join(f"var a{n} = read_int();" for n in range(20))
+    + " var i = 0; while i < 1000 do { i = i + 1; print_int(i % 300); };"
+    + " print_int(" + " + ".join(f"a{n} * {n + 1}" for n in range(20)) + ");"
+    + " i }"
+)
+
+
+def location(program, allocation, name):
+    return allocation.locations[program.register_names.index(name)]
+
+
+def test_loop_variables_are_in_registers():
+    program = lower(parse(tokenizer(LOOP)))
+    allocation = allocate_registers(program)
+    for name in ("i", "j", "total"):
+        assert isinstance(location(program, allocation, name), str)
+    assert allocation.frame_size == 0
+
+
+def test_cold_values_are_spilled_under_pressure():
+    program = lower(parse(tokenizer(PRESSURE)))
+    allocation = allocate_registers(program)
+    assert isinstance(location(program, allocation, "i"), str)
+    assert any(
+        isinstance(location(program, allocation, f"a{n}"), Mem) for n in range(20)
+    )
+    # Values live across the calls take the callee-saved registers first.
+    assert list(allocation.callee_saved) == list(CALLEE_SAVED)
+
+
+def test_intervals():
+    program = lower(parse(tokenizer("{ var x = 1; var y = x + 2; print_int(y); x }")))
+    intervals = {
+        program.register_names[i.register]: i for i in live_intervals(program)[0]
+    }
+    assert intervals["x"].crosses_call
+    assert not intervals["y"].crosses_call
+    assert intervals["y"].end < intervals["x"].end
+
+
+@pytest.mark.skipif(shutil.which("as") is None, reason="needs GNU binutils")
+@pytest.mark.parametrize("source_code", [LOOP, PRESSURE])
+@pytest.mark.parametrize("use_registers", [True, False])
+def test_same_output_with_and_without_registers(
+    source_code, use_registers, tmp_path, capsys, monkeypatch
+):
+    stdin = "".join(f"{n * 7 - 50}\n" for n in range(20))
+    monkeypatch.setattr("sys.stdin", io.StringIO(stdin))
+    expected = interpret(parse(tokenizer(source_code)))
+    expected_output = capsys.readouterr().out + f"{expected}\n"
+
+    program = lower(parse(tokenizer(source_code)))
+    path = os.path.join(tmp_path, "program")
+    with open(path, "wb") as f:
+        f.write(assemble_and_link(render(generate_assembly(program, use_registers))))
+    os.chmod(path, 0o755)
+    result = subprocess.run([path], input=stdin, capture_output=True, text=True, timeout=10)
+    assert result.stdout == expected_output
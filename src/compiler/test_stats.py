@@ -0,0 +1,81 @@
+import pytest
+import tracemalloc
+from compiler.__main__ import call_compiler
+from compiler.parser import parse
+from compiler.stats import CompileStats, DISABLED_PHASE, count_nodes, phase, run_with_stats
+from compiler.tokenizer import tokenizer
+
+
+def compile_with_phases(source_code):
+    with phase("first") as first:
+        data = [0] * 1000
+    first.counts["items"] = len(data)
+    with phase("second"):
+        pass
+    return source_code.encode()
+
+
+def test_phases_are_disabled_by_default():
+    assert phase("tokenize") is DISABLED_PHASE
+    assert not phase("tokenize").enabled
+
+
+def test_phases_are_recorded():
+    with CompileStats() as stats:
+        compile_with_phases("x")
+    assert phase("first") is DISABLED_PHASE
+    assert [p.name for p in stats.phases] == ["first", "second"]
+    first = stats.to_dict()["first"]
+    assert first["items"] == 1000
+    assert first["wall_seconds"] >= 0 and first["cpu_seconds"] >= 0
+    assert set(first) == {"wall_seconds", "cpu_seconds", "gc_collections", "items"}
+    lines = stats.format().splitlines()
+    assert lines[0].split() == [
+        "phase", "wall", "ms", "cpu", "ms", "alloc", "KiB", "kept", "KiB", "gc", "items"
+    ]
+    assert lines[1].startswith("first") and lines[1].endswith("items=1000")
+    assert lines[1].split()[3:5] == ["-", "-"]
+
+
+def test_phases_trace_memory():
+    with CompileStats(trace_memory=True) as stats:
+        assert tracemalloc.is_tracing()
+        with phase("keep"):
+            kept = [object() for _ in range(10000)]
+        with phase("drop"):
+            dropped = [object() for _ in range(10000)]
+            del dropped
+    assert not tracemalloc.is_tracing()
+    keep, drop = stats.phases
+    assert keep.allocated_bytes >= 10000 * 16 and keep.retained_bytes >= 10000 * 16
+    assert drop.allocated_bytes >= 10000 * 16 and drop.retained_bytes < 10000
+    assert "allocated_bytes" in stats.to_dict()["keep"]
+    assert len(kept) == 10000
+
+
+def test_run_with_stats():
+    result, stats = run_with_stats(compile_with_phases, "abc")
+    assert result == b"abc"
+    assert list(stats) == ["first", "second"]
+
+
+def test_compiler_phases():
+    with CompileStats() as stats:
+        with pytest.raises(Exception, match='Unknown function "f"'):
+            call_compiler("{ var x = 1; f(x + 2) }")
+    phases = stats.to_dict()
+    assert list(phases) == ["tokenize", "parse", "simplify", "lower"]
+    assert phases["tokenize"]["tokens"] == 13
+    assert phases["parse"]["nodes"] == 9
+
+
+def test_compiler_phases_of_successful_compile():
+    with CompileStats() as stats:
+        call_compiler("{ var x = 1; print_int(x + 2) }")
+    phases = stats.to_dict()
+    assert list(phases) == ["tokenize", "parse", "simplify", "lower", "codegen", "assemble"]
+    assert phases["lower"]["instructions"] > 0
+
+
+def test_count_nodes():
+    assert count_nodes(parse(tokenizer("if a then f(1, -b) else c"))) == 8
@@ -1,5 +1,7 @@
+import io
+import mmap
 import pytest
-from .tokenizer import tokenizer, Token, SourceLocation
+from .tokenizer import tokenizer, iter_tokens, tokenize_stream, match_brackets, LineCache, Token, TokenKind, SourceLocation
 
 def create_tokens(token_type: str, *values) -> list[Token]:
     lis: list[Token] = []
@@ -50,4 +52,136 @@ def test_tokenizer_ignores_comments():
     correct_result = create_tokens("int_literal", 1, 23, 45)
     assert tokenizer(
         "1//just a comment ignore\n 23 #ignore this but not next line\n45"
-        ) == correct_result
\ No newline at end of file
+        ) == correct_result
+
+def test_tokenizer_records_source_locations():
+    tokens = tokenizer("a = 1\n  # comment\n\t{ b }")
+    locations = [(t.text, t.location.line, t.location.column) for t in tokens]
+    assert locations == [
+        ("a", 1, 1), ("=", 1, 3), ("1", 1, 5), ("{", 3, 2), ("b", 3, 4), ("}", 3, 6)
+    ]
+
+def test_tokenizer_reports_the_invalid_line():
+    with pytest.raises(Exception, match="Invalid syntax. Could not tokenize   x 1y$"):
+        tokenizer("a\n  x 1y\nb")
+
+
+STREAMED_SOURCE = "{\n  var x = 12; // kommentti: äö\n  while x > 0 do x = x - 1;\n}\n f(x)"
+
+def test_iter_tokens_from_text_file():
+    tokens = list(iter_tokens(io.StringIO(STREAMED_SOURCE), chunk_size=3))
+    assert tokens == tokenizer(STREAMED_SOURCE)
+    assert [t.location for t in tokens] == [t.location for t in tokenizer(STREAMED_SOURCE)]
+
+def test_iter_tokens_from_bytes_split_inside_characters():
+    source = io.BytesIO(STREAMED_SOURCE.encode())
+    for chunk_size in [1, 2, 5, 64]:
+        source.seek(0)
+        assert list(iter_tokens(source, chunk_size)) == tokenizer(STREAMED_SOURCE)
+
+def test_iter_tokens_from_mmap(tmp_path):
+    path = tmp_path / "source.txt"
+    path.write_text(STREAMED_SOURCE)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        assert list(iter_tokens(m, chunk_size=7)) == tokenizer(STREAMED_SOURCE)
+
+def test_iter_tokens_is_lazy():
+    tokens = iter_tokens(io.StringIO("1 2\n3 $\n"), chunk_size=4)
+    assert next(tokens).text == "1"
+    assert next(tokens).text == "2"
+    assert next(tokens).text == "3"
+    with pytest.raises(Exception, match="Could not tokenize 3 \\$"):
+        next(tokens)
+
+
+def test_token_stream_matches_tokenizer():
+    stream = tokenize_stream(io.StringIO(STREAMED_SOURCE), chunk_size=5)
+    tokens = tokenizer(STREAMED_SOURCE)
+    assert len(stream) == len(tokens)
+    assert list(stream) == tokens
+    assert [t.location for t in stream] == [t.location for t in tokens]
+    assert stream[-1] == tokens[-1]
+
+def test_token_stream_interns_texts():
+    stream = tokenize_stream("x = x + x")
+    assert stream.texts == ["x", "=", "+"]
+    assert list(stream.text_ids) == [0, 1, 0, 2, 0]
+    assert list(stream.lengths) == [1, 1, 1, 1, 1]
+
+
+def test_tokens_get_integer_kinds():
+    kinds = [t.kind for t in tokenizer("if x1 then 2 else not(y) <= 3;")]
+    assert kinds == [
+        TokenKind.IF, TokenKind.IDENTIFIER, TokenKind.THEN, TokenKind.INT_LITERAL,
+        TokenKind.ELSE, TokenKind.NOT, TokenKind.LEFT_PAREN, TokenKind.IDENTIFIER,
+        TokenKind.RIGHT_PAREN, TokenKind.LESS_EQUAL, TokenKind.INT_LITERAL,
+        TokenKind.SEMICOLON,
+    ]
+    stream = tokenize_stream("if x1 then 2 else not(y) <= 3;")
+    assert list(stream.kinds) == kinds
+    assert [stream.type(i) for i in range(len(stream))] == [
+        t.type for t in tokenizer("if x1 then 2 else not(y) <= 3;")
+    ]
+
+
+def test_line_cache_reuses_lines_at_new_positions():
+    cache = LineCache()
+    first = tokenizer(STREAMED_SOURCE, cache)
+    assert first == tokenizer(STREAMED_SOURCE)
+    assert cache.stats()["hits"] == 0
+    # The same lines shifted down and in a different order.
+    source = "\n" + "\n".join(reversed(STREAMED_SOURCE.split("\n")))
+    tokens = tokenizer(source, cache)
+    assert tokens == tokenizer(source)
+    assert [t.kind for t in tokens] == [t.kind for t in tokenizer(source)]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (5, 5, 0.5)
+
+def test_token_stream_with_line_cache():
+    cache = LineCache()
+    for _ in range(2):
+        stream = tokenize_stream(io.StringIO(STREAMED_SOURCE), chunk_size=5, line_cache=cache)
+        expected = tokenize_stream(STREAMED_SOURCE)
+        assert list(stream) == list(expected)
+        assert stream.kinds == expected.kinds
+        assert stream.lengths == expected.lengths
+        assert stream.line_starts == expected.line_starts
+        assert stream.source_length == expected.source_length
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (5, 5)
+
+def test_line_cache_evicts_least_recently_used_lines():
+    cache = LineCache(max_lines=2)
+    tokenizer("a\nb", cache)
+    tokenizer("a\nc", cache)
+    assert list(cache.entries) == ["a", "c"]
+    assert cache.stats() == {
+        "hits": 1, "misses": 3, "hit_rate": 0.25, "entries": 2, "bytes": 2
+    }
+
+def test_line_cache_is_bounded_by_bytes():
+    cache = LineCache(max_bytes=8)
+    tokenizer("a + 1\nb + 2\nlong_name", cache)
+    assert list(cache.entries) == ["b + 2"]
+    tokenizer("x = 1 + 2 + 3\nb + 2", cache)
+    assert list(cache.entries) == ["b + 2"]
+    assert cache.stats()["bytes"] == 5
+    assert cache.stats()["hits"] == 1
+
+def test_line_cache_reports_the_invalid_line():
+    cache = LineCache()
+    with pytest.raises(Exception, match="Invalid syntax. Could not tokenize   x 1y$"):
+        tokenizer("a\n  x 1y\nb", cache)
+    with pytest.raises(Exception, match="Could not tokenize 3 \\$"):
+        tokenize_stream("1 2\n3 $\n", line_cache=cache)
+
+
+def test_token_stream_bracket_matches():
+    stream = tokenize_stream("{ f(x, (1)); { } }")
+    assert stream.bracket_matches() == {0: 12, 2: 8, 5: 7, 10: 11}
+    assert stream.bracket_matches() is stream.bracket_matches()
+    stream.extend("\n( )")
+    assert stream.bracket_matches()[13] == 14
+
+def test_match_brackets_leaves_out_mismatched_brackets():
+    kinds = tokenize_stream("{ ( } ) ( ) } ) {").kinds
+    assert match_brackets(kinds) == {4: 5}
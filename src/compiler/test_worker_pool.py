@@ -0,0 +1,101 @@
+import os
+import signal
+import socket
+import time
+from compiler.worker_pool import (
+    MAX_RESPAWN_DELAY,
+    MIN_RESPAWN_DELAY,
+    WorkerPool,
+    run_worker_pool,
+)
+
+
+def start_pool(handle, workers, max_requests):
+    listener = socket.create_server(("127.0.0.1", 0))
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_worker_pool(listener, handle, workers, max_requests)
+        finally:
+            os._exit(0)
+    address = listener.getsockname()
+    listener.close()
+    return pid, address
+
+
+def request(address, data=b""):
+    with socket.create_connection(address) as connection:
+        connection.sendall(data)
+        connection.shutdown(socket.SHUT_WR)
+        return b"".join(iter(lambda: connection.recv(65536), b""))
+
+
+def stop_pool(pid):
+    os.kill(pid, signal.SIGTERM)
+    _, status = os.waitpid(pid, 0)
+    return status
+
+
+def test_worker_handles_requests_and_is_recycled():
+    pid, address = start_pool(lambda data: [str(os.getpid()).encode(), data], 1, 2)
+    try:
+        first = request(address, b":a")
+        second = request(address, b":b")
+        third = request(address, b":c")
+    finally:
+        status = stop_pool(pid)
+    assert first.endswith(b":a") and second.endswith(b":b")
+    assert first.split(b":")[0] == second.split(b":")[0]
+    assert third.split(b":")[0] != first.split(b":")[0]
+    assert os.waitstatus_to_exitcode(status) == 0
+
+
+def test_workers_finish_requests_when_draining():
+    def slow_handle(data):
+        time.sleep(0.5)
+        return [b"done"]
+
+    pid, address = start_pool(slow_handle, 2, 100)
+    with socket.create_connection(address) as connection:
+        connection.shutdown(socket.SHUT_WR)
+        time.sleep(0.2)
+        os.kill(pid, signal.SIGTERM)
+        response = b"".join(iter(lambda: connection.recv(65536), b""))
+    _, status = os.waitpid(pid, 0)
+    assert response == b"done"
+    assert os.waitstatus_to_exitcode(status) == 0
+
+
+def test_zero_max_requests_keeps_workers():
+    pid, address = start_pool(lambda data: [str(os.getpid()).encode()], 1, 0)
+    try:
+        responses = {request(address) for _ in range(3)}
+    finally:
+        status = stop_pool(pid)
+    assert len(responses) == 1
+    assert os.waitstatus_to_exitcode(status) == 0
+
+
+def test_failing_workers_are_replaced_with_growing_delay():
+    def handle(data):
+        if data == b"crash":
+            raise Exception("Crash")
+        return [b"ok"]
+
+    pid, address = start_pool(handle, 1, 100)
+    try:
+        request(address, b"crash")
+        assert request(address) == b"ok"
+    finally:
+        stop_pool(pid)
+
+    pool = WorkerPool(socket.socket(), handle, 1, 100)
+    delays = []
+    for _ in range(8):
+        pool.worker_exited(1 << 8)
+        delays.append(pool.respawn_delay)
+    assert delays[:2] == [MIN_RESPAWN_DELAY, MIN_RESPAWN_DELAY * 2]
+    assert delays[-1] == MAX_RESPAWN_DELAY
+    pool.worker_exited(0)
+    assert pool.respawn_delay == 0
+    pool.listener.close()
@@ -1,7 +1,106 @@
+import codecs
+import multiprocessing
 import re
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from collections.abc import Iterator, Sequence
+from enum import IntEnum
+from mmap import mmap
+from typing import BinaryIO, NamedTuple, TextIO, overload
 from dataclasses import dataclass, field
 
 
+class TokenKind(IntEnum):
+    END = 0
+    IDENTIFIER = 1
+    INT_LITERAL = 2
+    IF = 3
+    THEN = 4
+    ELSE = 5
+    WHILE = 6
+    DO = 7
+    VAR = 8
+    AND = 9
+    OR = 10
+    NOT = 11
+    PLUS = 12
+    MINUS = 13
+    STAR = 14
+    SLASH = 15
+    BACKSLASH = 16
+    PERCENT = 17
+    EQUAL = 18
+    NOT_EQUAL = 19
+    ASSIGN = 20
+    LESS = 21
+    LESS_EQUAL = 22
+    GREATER = 23
+    GREATER_EQUAL = 24
+    LEFT_PAREN = 25
+    RIGHT_PAREN = 26
+    LEFT_BRACE = 27
+    RIGHT_BRACE = 28
+    COMMA = 29
+    SEMICOLON = 30
+    TRUE = 31
+    FALSE = 32
+
+
+KIND_BY_TEXT = {
+    "if": TokenKind.IF,
+    "then": TokenKind.THEN,
+    "else": TokenKind.ELSE,
+    "while": TokenKind.WHILE,
+    "do": TokenKind.DO,
+    "var": TokenKind.VAR,
+    "and": TokenKind.AND,
+    "or": TokenKind.OR,
+    "not": TokenKind.NOT,
+    "+": TokenKind.PLUS,
+    "-": TokenKind.MINUS,
+    "*": TokenKind.STAR,
+    "/": TokenKind.SLASH,
+    "\\": TokenKind.BACKSLASH,
+    "%": TokenKind.PERCENT,
+    "==": TokenKind.EQUAL,
+    "!=": TokenKind.NOT_EQUAL,
+    "=": TokenKind.ASSIGN,
+    "<": TokenKind.LESS,
+    "<=": TokenKind.LESS_EQUAL,
+    ">": TokenKind.GREATER,
+    ">=": TokenKind.GREATER_EQUAL,
+    "(": TokenKind.LEFT_PAREN,
+    ")": TokenKind.RIGHT_PAREN,
+    "{": TokenKind.LEFT_BRACE,
+    "}": TokenKind.RIGHT_BRACE,
+    ",": TokenKind.COMMA,
+    ";": TokenKind.SEMICOLON,
+    "true": TokenKind.TRUE,
+    "false": TokenKind.FALSE,
+}
+
+# Texts and token types of the kinds, indexed by kind.
+KIND_TEXTS = ["", "identifier", "integer literal"] + [
+    text for text, _ in sorted(KIND_BY_TEXT.items(), key=lambda item: item[1])
+]
+KIND_TYPES = ["end", "identifier", "int_literal"] + [
+    "identifier" if text.isalpha() else "punctuation" if text in "(){},;" else "operator"
+    for text in KIND_TEXTS[3:]
+]
+
+
+def token_kind(text: str, type: str) -> TokenKind:
+    kind = KIND_BY_TEXT.get(text)
+    if kind is not None:
+        return kind
+    if type == "int_literal":
+        return TokenKind.INT_LITERAL
+    if type == "end":
+        return TokenKind.END
+    return TokenKind.IDENTIFIER
+
+
 @dataclass
 class SourceLocation:
     line: int
@@ -19,104 +118,406 @@ class Token:
     text: str
     type: str
     location: SourceLocation
+    kind: TokenKind = field(init=False, repr=False, compare=False)
 
+    def __post_init__(self) -> None:
+        self.kind = token_kind(self.text, self.type)
 
-def tokenize_line(source_code: str, line_number: int) -> list[Token]:
-    identifier = get_regex_for_token("identifier")
-    int_literal = get_regex_for_token("int_literal")
-    white_space = get_regex_for_token("white_space")
-    operator = get_regex_for_token("operator")
-    punctuation = get_regex_for_token("punctuation")
-    comment = get_regex_for_token("comment")
-
-    identifier_re = re.compile(identifier)
-    int_literal_re = re.compile(int_literal)
-    white_space_re = re.compile(white_space)
-    operator_re = re.compile(operator)
-    punctuation_re = re.compile(punctuation)
-    comment_re = re.compile(comment)
-
-    regular_expressions = [
-        identifier_re,
-        int_literal_re,
-        white_space_re,
-        operator_re,
-        punctuation_re,
-        comment_re,
-    ]
-    previous_match_end = 0
-    tokens: list[str] = []
-    reqiure_non_identifier_char_after = False
-    while previous_match_end < len(source_code):
-        for regex in regular_expressions:
-            match = regex.search(source_code, previous_match_end)
-            if match and match.start() == previous_match_end:
-                previous_match_end = match.end()
-
-                if reqiure_non_identifier_char_after and regex in [
-                    identifier_re,
-                    int_literal_re,
-                ]:
-
-                    raise Exception(f"Invalid syntax. Could not tokenize {source_code}")
-                else:
-                    reqiure_non_identifier_char_after = False
-
-                if regex == identifier_re:
-                    token = Token(
-                        match[0],
-                        "identifier",
-                        SourceLocation(line_number, match.start() + 1),
-                    )
-                    tokens.append(token)
-                elif regex == operator_re:
-                    token = Token(
-                        match[0],
-                        "operator",
-                        SourceLocation(line_number, match.start() + 1),
-                    )
-                    tokens.append(token)
-                elif regex == punctuation_re:
-                    token = Token(
-                        match[0],
-                        "punctuation",
-                        SourceLocation(line_number, match.start() + 1),
-                    )
-                    tokens.append(token)
-
-                elif regex == int_literal_re:
-                    reqiure_non_identifier_char_after = True
-                    token = Token(
-                        match[0],
-                        "int_literal",
-                        SourceLocation(line_number, match.start() + 1),
-                    )
-                    tokens.append(token)
-                break
-        else:
-            raise Exception(f"Invalid syntax. Could not tokenize {source_code}")
 
-    return tokens
+TOKENIZER_REGEXES = {
+    "identifier": r"[a-zA-Z|_][a-zA-Z|_|0-9]*",
+    "int_literal": r"[0-9]+",
+    "white_space": r"[\n|\t| ]+",
+    "operator": r"\+|-|\*|\\|%|==|!=|=|<=|>=|<|>",
+    "punctuation": r"\(|\)|\{|\}|,|;",
+    "comment": r"(//|#)[^\n]*",
+}
+
+# One alternation of all token regexes, in priority order. At any position the
+# first alternative that matches wins, exactly like trying the regexes one by one.
+# Source is tokenized line by line, so newlines are matched on their own instead
+# of being merged into the surrounding white space.
+TOKEN_REGEX = re.compile(
+    "|".join(
+        f"(?P<{name}>{regex})"
+        for name, regex in {
+            **TOKENIZER_REGEXES,
+            "white_space": r"[|\t ]+",
+            "newline": r"\n",
+        }.items()
+    )
+)
+
+
+# Matches the bytes of bracket kinds in an array of token kinds.
+BRACKET_REGEX = re.compile(b"[%c-%c]" % (TokenKind.LEFT_PAREN, TokenKind.RIGHT_BRACE))
+
+
+def match_brackets(kinds: array) -> dict[int, int]:
+    """Maps the index of every "(" and "{" in an array of token kinds to the
+    index of its closing bracket, in one pass over the brackets.
+
+    Brackets that are never closed are left out. So are all brackets that are
+    open at a closing bracket of the wrong kind, so the brackets between a
+    matched pair are always balanced."""
+    matches = {}
+    open_brackets = []
+    for match in BRACKET_REGEX.finditer(kinds):
+        index = match.start()
+        kind = kinds[index]
+        if kind == TokenKind.LEFT_PAREN or kind == TokenKind.LEFT_BRACE:
+            open_brackets.append(index)
+        elif open_brackets and kinds[open_brackets[-1]] == kind - 1:
+            matches[open_brackets.pop()] = index
+        else:
+            open_brackets.clear()
+    return matches
 
 
 def get_regex_for_token(regex: str) -> str:
-    tokenizer_regexes = {
-        "identifier": r"[a-zA-Z|_][a-zA-Z|_|0-9]*",
-        "int_literal": r"[0-9]+",
-        "white_space": r"[\n|\t| ]+",
-        "operator": r"\+|-|\*|\\|%|==|!=|=|<=|>=|<|>",
-        "punctuation": r"\(|\)|\{|\}|,|;",
-        "comment": r"(//|#)[^\n]*",
-    }
-    return tokenizer_regexes[regex]
-
-def tokenizer(source_code: str=""):
+    return TOKENIZER_REGEXES[regex]
+
+
+def scan(source_code: str) -> Iterator[tuple[str, int, int, str]]:
+    """The tokenizer rules: yields `(type, start, length, text)` for each
+    token of `source_code` and for each newline, whose type is "newline",
+    skipping white space and comments. Raises an error naming the line if
+    part of the text is not a token."""
+    line_start = 0
+    position = 0
+    previous_was_int_literal = False
+    for match in TOKEN_REGEX.finditer(source_code):
+        start, end = match.span()
+        if start != position:
+            break
+        position = end
+        token_type = match.lastgroup or ""
+        if token_type == "white_space" or token_type == "comment":
+            previous_was_int_literal = False
+        elif token_type == "newline":
+            line_start = end
+            previous_was_int_literal = False
+            yield token_type, start, 1, "\n"
+        elif token_type == "int_literal":
+            if previous_was_int_literal:
+                raise invalid_syntax(source_code, line_start)
+            previous_was_int_literal = True
+            yield token_type, start, end - start, match[0]
+        else:
+            if previous_was_int_literal and token_type == "identifier":
+                raise invalid_syntax(source_code, line_start)
+            previous_was_int_literal = False
+            yield token_type, start, end - start, match[0]
+    if position != len(source_code):
+        raise invalid_syntax(source_code, line_start)
+
+
+def scan_tokens(source_code: str, line_number: int = 1) -> Iterator[Token]:
+    """Tokenizes `source_code` in a single pass over the whole text.
+
+    `line_number` is the line the text starts on."""
+    line_start = 0
+    for token_type, start, _, text in scan(source_code):
+        if token_type == "newline":
+            line_number += 1
+            line_start = start + 1
+        else:
+            yield Token(text, token_type, SourceLocation(line_number, start - line_start + 1))
+
+
+def invalid_syntax(source_code: str, line_start: int) -> Exception:
+    line_end = source_code.find("\n", line_start)
+    if line_end == -1:
+        line_end = len(source_code)
+    return Exception(
+        f"Invalid syntax. Could not tokenize {source_code[line_start:line_end]}"
+    )
+
+
+def tokenize_line(source_code: str, line_number: int) -> list[Token]:
+    return list(scan_tokens(source_code, line_number))
+
+
+def tokenizer(source_code: str = "", line_cache: "LineCache | None" = None) -> list[Token]:
+    """Tokenizes `source_code`. With `line_cache`, lines tokenized before are
+    taken from the cache."""
+    if line_cache is None:
+        return list(scan_tokens(source_code))
     tokens = []
     lines = source_code.split("\n")
-    for i, line in enumerate(lines):
-        line_tokens = tokenize_line(line, i + 1)
-        tokens.extend(line_tokens)
+    for line_number, line_tokens in enumerate(line_cache.tokenize_lines(lines), start=1):
+        for kind, column, text in zip(line_tokens.kinds, line_tokens.columns, line_tokens.texts):
+            tokens.append(
+                Token(text, KIND_TYPES[kind], SourceLocation(line_number, column + 1))
+            )
     return tokens
 
+
+class LineTokens(NamedTuple):
+    """The tokens of one line without its line number: their kinds, the
+    columns they start at counting from 0, their lengths as an array of
+    unsigned ints and their texts."""
+
+    kinds: bytes
+    columns: tuple[int, ...]
+    lengths: bytes
+    texts: tuple[str, ...]
+
+
+def scan_line(line: str) -> LineTokens:
+    """Tokenizes a line without a newline."""
+    kinds = array("B")
+    columns = []
+    lengths = array("I")
+    texts = []
+    for token_type, start, length, text in scan(line):
+        kinds.append(token_kind(text, token_type))
+        columns.append(start)
+        lengths.append(length)
+        texts.append(text)
+    return LineTokens(kinds.tobytes(), tuple(columns), lengths.tobytes(), tuple(texts))
+
+
+EMPTY_LINE = LineTokens(b"", (), b"", ())
+
+# Indices into the shared counter array of `LineCache`.
+LINE_HITS = 0
+LINE_MISSES = 1
+
+
+class LineCache:
+    """Bounded LRU cache of the tokens of single lines, keyed by the line text.
+
+    Entries do not depend on where the line is, so a line that occurs again,
+    in the same source or in a later one, is tokenized only once. Line
+    numbers and offsets are added when the tokens are used. At most
+    `max_lines` lines and `max_bytes` characters of line text are kept, and
+    longer lines are not cached at all.
+
+    The hit and miss counters live in shared memory, so they count the lookups
+    of all worker processes forked after the cache was created."""
+
+    def __init__(self, max_lines: int = 1 << 16, max_bytes: int = 16 << 20) -> None:
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[str, LineTokens] = OrderedDict()
+        self.bytes = 0
+        self.counters = multiprocessing.Array("q", 2)
+
+    def tokenize_lines(self, lines: Sequence[str]) -> list[LineTokens]:
+        """The tokens of each line in `lines`, from the cache where possible."""
+        entries = self.entries
+        result = []
+        hits = 0
+        misses = 0
+        for line in lines:
+            if not line:
+                # Not worth an entry or counting.
+                result.append(EMPTY_LINE)
+                continue
+            line_tokens = entries.get(line)
+            if line_tokens is not None:
+                entries.move_to_end(line)
+                hits += 1
+            else:
+                line_tokens = scan_line(line)
+                misses += 1
+                if len(line) <= self.max_bytes:
+                    entries[line] = line_tokens
+                    self.bytes += len(line)
+                    while len(entries) > self.max_lines or self.bytes > self.max_bytes:
+                        self.bytes -= len(entries.popitem(last=False)[0])
+            result.append(line_tokens)
+        with self.counters.get_lock():
+            self.counters[LINE_HITS] += hits
+            self.counters[LINE_MISSES] += misses
+        return result
+
+    def stats(self) -> dict[str, int | float]:
+        with self.counters.get_lock():
+            hits, misses = self.counters[:]
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+        }
+
+
+Source = str | TextIO | BinaryIO | mmap
+
+
+def read_complete_lines(source: Source, chunk_size: int = 1 << 16) -> Iterator[str]:
+    """Reads `source` in chunks and yields its text cut at line boundaries.
+
+    `source` can be a string, a text or binary file (binary input is decoded as
+    UTF-8) or an mmap. It is read `chunk_size` characters or bytes at a time.
+    Every yielded piece except the last one ends with a newline, so no token can
+    straddle two pieces."""
+    if isinstance(source, str):
+        yield source
+        return
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending: list[str] = []
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        text = decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+        last_newline = text.rfind("\n")
+        if last_newline == -1:
+            pending.append(text)
+            continue
+        pending.append(text[: last_newline + 1])
+        yield "".join(pending)
+        pending = [text[last_newline + 1 :]]
+    pending.append(decoder.decode(b"", final=True))
+    yield "".join(pending)
+
+
+def iter_tokens(source: Source, chunk_size: int = 1 << 16) -> Iterator[Token]:
+    """Yields the tokens of `source` lazily, see `read_complete_lines`."""
+    line_number = 1
+    for lines in read_complete_lines(source, chunk_size):
+        yield from scan_tokens(lines, line_number)
+        line_number += lines.count("\n")
+
+
+class TokenStream(Sequence[Token]):
+    """Token sequence stored as parallel arrays instead of `Token` objects.
+
+    Every token takes a `TokenKind`, a start offset into the source, a length and an
+    id into a table of interned token texts. Line starts are stored once per line
+    and `SourceLocation`s are computed from them only when a token is accessed.
+    Indexing returns a `Token` built on demand, so a `TokenStream` can be used
+    wherever a list of tokens is expected."""
+
+    def __init__(self) -> None:
+        self.kinds = array("B")
+        self.starts = array("q")
+        self.lengths = array("I")
+        self.text_ids = array("I")
+        self.texts: list[str] = []
+        self.text_kinds: list[TokenKind] = []
+        self.text_table: dict[str, int] = {}
+        self.line_starts = array("q", [0])
+        self.source_length = 0
+        self._bracket_matches: dict[int, int] | None = None
+        self._last_index = -1
+        self._last_token: Token | None = None
+
+    def extend(self, source_code: str, line_cache: LineCache | None = None) -> None:
+        """Tokenizes `source_code` and appends it to the stream.
+
+        The text continues the source seen so far, so it has to start on a new
+        line (see `read_complete_lines`). With `line_cache`, lines tokenized
+        before are taken from the cache."""
+        self._bracket_matches = None
+        if line_cache is not None:
+            self.extend_lines(source_code.split("\n"), line_cache)
+            return
+        kinds, starts, lengths, text_ids = (
+            self.kinds,
+            self.starts,
+            self.lengths,
+            self.text_ids,
+        )
+        texts, text_kinds, text_table = self.texts, self.text_kinds, self.text_table
+        line_starts = self.line_starts
+        offset = self.source_length
+        for token_type, start, length, text in scan(source_code):
+            if token_type == "newline":
+                line_starts.append(offset + start + 1)
+                continue
+            text_id = text_table.get(text)
+            if text_id is None:
+                text_id = text_table[text] = len(texts)
+                texts.append(text)
+                text_kinds.append(token_kind(text, token_type))
+            kinds.append(text_kinds[text_id])
+            starts.append(offset + start)
+            lengths.append(length)
+            text_ids.append(text_id)
+        self.source_length += len(source_code)
+
+    def extend_lines(self, lines: list[str], line_cache: LineCache) -> None:
+        kinds, starts, lengths, text_ids = (
+            self.kinds,
+            self.starts,
+            self.lengths,
+            self.text_ids,
+        )
+        texts, text_kinds, text_table = self.texts, self.text_kinds, self.text_table
+        line_start = self.source_length
+        for i, line_tokens in enumerate(line_cache.tokenize_lines(lines)):
+            if i:
+                self.line_starts.append(line_start)
+            kinds.frombytes(line_tokens.kinds)
+            starts.extend([line_start + column for column in line_tokens.columns])
+            lengths.frombytes(line_tokens.lengths)
+            for kind, text in zip(line_tokens.kinds, line_tokens.texts):
+                text_id = text_table.get(text)
+                if text_id is None:
+                    text_id = text_table[text] = len(texts)
+                    texts.append(text)
+                    text_kinds.append(TokenKind(kind))
+                text_ids.append(text_id)
+            line_start += len(lines[i]) + 1
+        self.source_length = line_start - 1
+
+    def bracket_matches(self) -> dict[int, int]:
+        """See `match_brackets`. Computed once for the tokens so far."""
+        if self._bracket_matches is None:
+            self._bracket_matches = match_brackets(self.kinds)
+        return self._bracket_matches
+
+    def text(self, index: int) -> str:
+        return self.texts[self.text_ids[index]]
+
+    def type(self, index: int) -> str:
+        return KIND_TYPES[self.kinds[index]]
+
+    def location(self, index: int) -> SourceLocation:
+        start = self.starts[index]
+        line = bisect_right(self.line_starts, start)
+        return SourceLocation(line, start - self.line_starts[line - 1] + 1)
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    @overload
+    def __getitem__(self, index: int) -> Token: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[Token]: ...
+
+    def __getitem__(self, index: int | slice) -> Token | list[Token]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        # The parser looks at the same token many times before consuming it.
+        if index == self._last_index and self._last_token is not None:
+            return self._last_token
+        token = Token(self.text(index), self.type(index), self.location(index))
+        self._last_index = index
+        self._last_token = token
+        return token
+
+
+def tokenize_stream(
+    source: Source, chunk_size: int = 1 << 16, line_cache: LineCache | None = None
+) -> TokenStream:
+    """Tokenizes `source` into a compact `TokenStream`.
+
+    `source` can be anything `read_complete_lines` accepts. With `line_cache`,
+    lines tokenized before are taken from the cache."""
+    stream = TokenStream()
+    for lines in read_complete_lines(source, chunk_size):
+        stream.extend(lines, line_cache)
+    return stream
+
+
 if __name__ == "__main__":
     print(tokenizer())
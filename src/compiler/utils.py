@@ -1,2 +1,5 @@
+from compiler.tokenizer import KIND_BY_TEXT
+
+
 def get_keywords() -> list[str]:
-    return ["if", "while", "var"]
+    return [text for text in KIND_BY_TEXT if text.isalpha()]
@@ -0,0 +1,164 @@
+from collections.abc import Callable
+
+from compiler.interpreter import (
+    BUILTINS,
+    INT_MAX,
+    INT_MIN,
+    Value,
+    divide,
+    remainder,
+    wrap_int,
+)
+from compiler.ir import COMPARISON_OPS, JUMP_OPS, IrProgram, Op
+
+# Python source of the operations that write `dst`, with `a` and `b` for the
+# source registers.
+EXPRESSIONS = {
+    Op.COPY: "{a}",
+    Op.ADD: "{a} + {b}",
+    Op.SUB: "{a} - {b}",
+    Op.MUL: "{a} * {b}",
+    Op.DIV: "divide({a}, {b})",
+    Op.MOD: "remainder({a}, {b})",
+    Op.EQ: "{a} == {b}",
+    Op.NE: "{a} != {b}",
+    Op.LT: "{a} < {b}",
+    Op.LE: "{a} <= {b}",
+    Op.GT: "{a} > {b}",
+    Op.GE: "{a} >= {b}",
+    Op.NEG: "-{a}",
+    Op.NOT: "not {a}",
+}
+assert set(EXPRESSIONS) | JUMP_OPS | {Op.CONST, Op.CALL, Op.RETURN} == set(Op)
+# Operations whose result can leave the range of an Int and must be wrapped.
+OVERFLOWING_OPS = frozenset([Op.ADD, Op.SUB, Op.MUL, Op.NEG])
+
+
+def constant_source(value: Value) -> str:
+    return repr(wrap_int(value) if type(value) is int else value)
+
+
+class Translator:
+    """Translates an `IrProgram` into the source of a Python function.
+
+    Registers become local variables, and every basic block becomes straight
+    line code. Control flow goes through a `pc` variable holding the index
+    of the next block's first instruction, which the loop finds with a
+    binary search of nested `if`s. A comparison whose only use is the
+    conditional jump after it is fused into that jump."""
+
+    def __init__(self, program: IrProgram) -> None:
+        self.program = program
+        self.lines: list[str] = []
+        self.reads = program.read_counts()
+        # Instructions that start a basic block.
+        leaders = {0, *program.jump_targets()}
+        for i in range(len(program)):
+            if program.ops[i] in JUMP_OPS or program.ops[i] == Op.RETURN:
+                leaders.add(i + 1)
+        leaders.discard(len(program))
+        self.leader_set = leaders
+        self.leaders = sorted(leaders)
+
+    def emit(self, indent: int, line: str) -> None:
+        self.lines.append("    " * indent + line)
+
+    def translate(self) -> str:
+        program = self.program
+        self.emit(0, "def run(functions, divide, remainder, wrap_int):")
+        names = [f"r{register}" for register in range(len(program.register_names))]
+        for start in range(0, len(names), 64):
+            self.emit(1, " = ".join([*names[start : start + 64], "None"]))
+        for register, constant in program.constant_registers:
+            self.emit(1, f"r{register} = {constant_source(program.constants[constant])}")
+        self.emit(1, "pc = 0")
+        self.emit(1, "while True:")
+        if self.leaders:
+            self.dispatch(0, len(self.leaders), 2)
+        else:
+            self.emit(2, "return None")
+        return "\n".join(self.lines) + "\n"
+
+    def dispatch(self, low: int, high: int, indent: int) -> None:
+        """Code that runs the block starting at `pc`, one of the leaders
+        `self.leaders[low:high]`."""
+        if high - low == 1:
+            self.block(self.leaders[low], indent)
+            return
+        middle = (low + high) // 2
+        self.emit(indent, f"if pc < {self.leaders[middle]}:")
+        self.dispatch(low, middle, indent + 1)
+        self.emit(indent, "else:")
+        self.dispatch(middle, high, indent + 1)
+
+    def block(self, start: int, indent: int) -> None:
+        program = self.program
+        i = start
+        while True:
+            if i == len(program):
+                self.emit(indent, "return None")
+                return
+            if i != start and i in self.leader_set:
+                self.emit(indent, f"pc = {i}")
+                return
+            op, dst, a, b = program.instruction(i)
+            if op == Op.CONST:
+                self.emit(indent, f"r{dst} = {constant_source(program.constants[a])}")
+            elif op == Op.CALL:
+                args = ", ".join(f"r{r}" for r in program.arguments[b])
+                self.emit(indent, f"r{dst} = functions[{a}]({args})")
+            elif op == Op.RETURN:
+                self.emit(indent, f"return r{a}")
+                return
+            elif op == Op.JUMP:
+                self.emit(indent, f"pc = {a}")
+                return
+            elif op == Op.JUMP_IF_FALSE or op == Op.JUMP_IF_TRUE:
+                condition = f"not r{a}" if op == Op.JUMP_IF_FALSE else f"r{a}"
+                self.branch(condition, b, i + 1, indent)
+                return
+            elif (
+                op in COMPARISON_OPS
+                and i + 1 < len(program)
+                and i + 1 not in self.leader_set
+                and program.ops[i + 1] == Op.JUMP_IF_FALSE
+                and program.srcs_a[i + 1] == dst
+                and self.reads[dst] == 1
+            ):
+                condition = EXPRESSIONS[op].format(a=f"r{a}", b=f"r{b}")
+                self.branch(condition, i + 2, program.srcs_b[i + 1], indent)
+                return
+            else:
+                expression = EXPRESSIONS[op].format(a=f"r{a}", b=f"r{b}")
+                self.emit(indent, f"r{dst} = {expression}")
+                if op in OVERFLOWING_OPS:
+                    self.emit(indent, f"if not {INT_MIN} <= r{dst} <= {INT_MAX}:")
+                    self.emit(indent + 1, f"r{dst} = wrap_int(r{dst})")
+            i += 1
+
+    def branch(self, condition: str, target: int, otherwise: int, indent: int) -> None:
+        self.emit(indent, f"if {condition}:")
+        self.emit(indent + 1, f"pc = {target}")
+        self.emit(indent, "else:")
+        self.emit(indent + 1, f"pc = {otherwise}")
+
+
+def translate(program: IrProgram) -> str:
+    """The source of a function running `program`, see `Translator`."""
+    return Translator(program).translate()
+
+
+def run_ir(
+    program: IrProgram, builtins: dict[str, Callable[..., Value]] = BUILTINS
+) -> Value:
+    """Executes `program` and returns its result.
+
+    The program is translated into a Python function once, so the
+    instructions of a block run as plain Python statements on local
+    variables, without dispatching on every instruction. Values and
+    arithmetic, including Ints wrapping at 64 bits, are the same as in the
+    interpreter."""
+    namespace: dict[str, Callable[..., Value]] = {}
+    exec(compile(translate(program), "<ir>", "exec"), namespace)
+    functions = [builtins[name] for name in program.functions]
+    return namespace["run"](functions, divide, remainder, wrap_int)
@@ -0,0 +1,160 @@
+import os
+import selectors
+import signal
+import socket
+import sys
+import time
+from collections.abc import Callable, Iterable
+from traceback import print_exc
+from types import FrameType
+
+# Delays before replacing a worker that failed, doubling while workers keep
+# failing, so a worker that crashes on start does not make the pool fork in a
+# tight loop.
+MIN_RESPAWN_DELAY = 0.1
+MAX_RESPAWN_DELAY = 5.0
+
+
+def run_worker_pool(
+    listener: socket.socket,
+    handle: Callable[[bytes], Iterable[bytes]],
+    workers: int | None = None,
+    max_requests: int = 1000,
+) -> None:
+    """Serves requests on `listener` with a fixed pool of forked workers.
+
+    Each worker is a long-lived process that accepts connections from the shared
+    listening socket, so the kernel's accept queue works as the request queue
+    and whatever a worker has warmed up (imports, caches) is kept between
+    requests. A connection carries one request: everything the client sends
+    before shutting down its side is passed to `handle`, and the chunks it
+    returns are sent back as they are produced.
+
+    `workers` defaults to the number of CPUs. A worker exits after
+    `max_requests` requests and is replaced by a fresh one; with 0, workers
+    are never recycled. Workers that fail are replaced after a delay that
+    grows while they keep failing. On SIGTERM or
+    SIGINT the pool drains: workers finish the request they are handling, then
+    exit, and this function returns once all of them are gone."""
+    WorkerPool(listener, handle, workers or os.cpu_count() or 1, max_requests).run()
+
+
+class WorkerPool:
+    def __init__(
+        self,
+        listener: socket.socket,
+        handle: Callable[[bytes], Iterable[bytes]],
+        workers: int,
+        max_requests: int,
+    ) -> None:
+        self.listener = listener
+        self.handle = handle
+        self.workers = workers
+        self.max_requests = max_requests
+        self.children: set[int] = set()
+        self.draining = False
+        self.respawn_delay = 0.0
+
+    def run(self) -> None:
+        previous_handlers = {
+            signum: signal.signal(signum, self.drain)
+            for signum in [signal.SIGTERM, signal.SIGINT]
+        }
+        try:
+            for _ in range(self.workers):
+                self.spawn()
+            while self.children:
+                try:
+                    pid, status = os.wait()
+                except ChildProcessError:
+                    break
+                self.children.discard(pid)
+                self.worker_exited(status)
+                if self.respawn_delay and not self.draining:
+                    time.sleep(self.respawn_delay)
+                if not self.draining:
+                    self.spawn()
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+
+    def worker_exited(self, status: int) -> None:
+        """Updates `respawn_delay` for the exit `status` of a worker."""
+        if os.waitstatus_to_exitcode(status) == 0:
+            self.respawn_delay = 0.0
+        else:
+            self.respawn_delay = min(
+                max(self.respawn_delay * 2, MIN_RESPAWN_DELAY), MAX_RESPAWN_DELAY
+            )
+
+    def drain(self, signum: int, frame: FrameType | None) -> None:
+        self.draining = True
+        for pid in list(self.children):
+            stop_worker(pid)
+
+    def spawn(self) -> None:
+        pid = os.fork()
+        if pid != 0:
+            self.children.add(pid)
+            if self.draining:
+                # The drain signal arrived while forking.
+                stop_worker(pid)
+            return
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        exit_code = 0
+        try:
+            serve_requests(self.listener, self.handle, self.max_requests)
+        except BaseException:
+            print_exc()
+            exit_code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)
+
+
+def stop_worker(pid: int) -> None:
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+
+
+def serve_requests(
+    listener: socket.socket, handle: Callable[[bytes], Iterable[bytes]], max_requests: int
+) -> None:
+    """Worker loop: handles up to `max_requests` connections, any number if it
+    is 0, or fewer if told to stop with SIGTERM."""
+    # SIGTERM only wakes up the select below, so a request that is being
+    # handled when it arrives is finished first. Ctrl-C reaches the whole
+    # process group, but it is the parent that decides when workers stop.
+    stop_reader, stop_writer = os.pipe()
+    os.set_blocking(stop_writer, False)
+    signal.set_wakeup_fd(stop_writer)
+    signal.signal(signal.SIGTERM, lambda signum, frame: None)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    listener.setblocking(False)
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ)
+    selector.register(stop_reader, selectors.EVENT_READ)
+
+    handled = 0
+    while max_requests == 0 or handled < max_requests:
+        events = selector.select()
+        if any(key.fileobj == stop_reader for key, _ in events):
+            return
+        try:
+            connection, _ = listener.accept()
+        except BlockingIOError:
+            # Another worker accepted the connection first.
+            continue
+        with connection:
+            connection.setblocking(True)
+            try:
+                request = b"".join(iter(lambda: connection.recv(65536), b""))
+                for chunk in handle(request):
+                    connection.sendall(chunk)
+            except OSError:
+                print_exc()
+        handled += 1